@@ -1,11 +1,5 @@
 import streamlit as st
-import pandas as pd
-import plotly.express as px
-import os
-from datetime import datetime, timedelta
-import shutil
-import json
-import dropbox
+# Keep this file to navigation only: anything imported here is paid for on every page's cold start
 
 
 # ---- App Config ----
@@ -0,0 +1,276 @@
+"""Timing and peak memory of the observation data paths at growing data sizes.
+
+For every size a synthetic observations frame is generated (benchmarks/synthetic.py) and each
+path below runs against it, with Dropbox replaced by utils.storage.MemoryBackend so only our own
+code is measured (network time comes on top in production, or pass --latency to simulate it per
+storage call). Every case runs in a scratch working directory,
+so the local mirror, snapshots and observations.csv of the checkout are never touched.
+
+    load_authoritative (cold)   first load after a restart: snapshot download + Parquet read
+    load_authoritative (warm)   later loads: a metadata check against the local snapshot
+    hotel_shard_load (cold)     what the portal loads for one hotel: its shard + pending segments
+    photo_catalog_refresh       first listing of the photos folder (one photo per submission)
+    gallery_page                gallery index of every submission plus links for one page
+    leaderboard                 daily activity, streaks and the table for every window
+    build_aggregates            the dashboard counters, from scratch
+    observation_db_rebuild      the local SQLite observation database rebuilt from the frame
+    observation_db_upsert       one submission upserted into that database
+    latest_by_hole (db)         one hotel's latest observation per hole, by SQLite index
+    prefill_hotel               the portal's form prefill from the latest-per-hole index
+    leaderboard (db)            daily activity from the database, streaks and every window
+
+Time is the best of --repeat runs; peak memory comes from one more run under tracemalloc, which
+sees Python and NumPy allocations but not Arrow's (Parquet reads are under-reported).
+
+Usage (from the repo root):
+    python benchmarks/run.py [--sizes 1000,10000,100000,1000000] [--only NAME,...] [--repeat N]
+                             [--latency MS] [--json FILE]
+"""
+import argparse
+import itertools
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+from synthetic import generate_observations, photo_names, submission_rows  # noqa: E402
+from utils import data_utils  # noqa: E402
+from utils.aggregates import build_aggregates  # noqa: E402
+from utils.data_utils import (  # noqa: E402
+    CACHE_DIR,
+    PHOTOS_FOLDER,
+    load_authoritative_observations,
+    load_hotel_observations,
+    normalize_observations,
+    upload_master,
+    write_shards,
+)
+from utils.latest_observations import LatestObservationIndex  # noqa: E402
+from utils.leaderboard import LEADERBOARD_WINDOWS, activity_runs, daily_submissions, leaderboard_table  # noqa: E402
+from utils.observation_db import ObservationDB  # noqa: E402
+from utils.photo_catalog import PhotoCatalog, build_gallery_index  # noqa: E402
+from utils.storage import MemoryBackend  # noqa: E402
+
+DEFAULT_SIZES = (1_000, 10_000, 100_000, 1_000_000)
+GALLERY_PAGE_SIZE = 12
+
+
+def _seeded_storage(data):
+    storage = MemoryBackend()
+    upload_master(storage, data["typed"])
+    return storage
+
+
+def _reset_cache():
+    shutil.rmtree(CACHE_DIR, ignore_errors=True)
+
+
+def prepare_load_cold(data):
+    storage = _seeded_storage(data)
+    return _reset_cache, lambda: load_authoritative_observations(storage), storage
+
+
+def prepare_load_warm(data):
+    storage = _seeded_storage(data)
+    load_authoritative_observations(storage)
+    return None, lambda: load_authoritative_observations(storage), storage
+
+
+def prepare_hotel_load(data):
+    storage = _seeded_storage(data)
+    write_shards(storage, data["typed"])
+    hotels = itertools.cycle(data["typed"]["hotel_code"].astype(str).unique())
+    return _reset_cache, lambda: load_hotel_observations(storage, next(hotels)), storage
+
+
+def _photo_storage(data):
+    storage = MemoryBackend()
+    storage.upload_many([(f"{PHOTOS_FOLDER}/{name}", b"") for name in photo_names(data["raw"])])
+    return storage
+
+
+def prepare_catalog_refresh(data):
+    storage = _photo_storage(data)
+    state_file = os.path.join(CACHE_DIR, "bench_photo_catalog.json")
+
+    def _setup():
+        if os.path.exists(state_file):
+            os.remove(state_file)
+
+    return _setup, lambda: PhotoCatalog(storage, state_file=state_file).refresh(force=True), storage
+
+
+def prepare_gallery_page(data):
+    storage = _photo_storage(data)
+    catalog = PhotoCatalog(storage, state_file=os.path.join(CACHE_DIR, "bench_photo_catalog.json"))
+    catalog.refresh(force=True)
+
+    def _run():
+        index, _ = build_gallery_index(data["typed"], catalog.ids())
+        catalog._links.clear()
+        catalog.resolve_photo_links(index.head(GALLERY_PAGE_SIZE))
+
+    return None, _run, storage
+
+
+def prepare_leaderboard(data):
+    today = data["typed"]["obs_date"].max().date()
+
+    def _run():
+        daily = daily_submissions(data["typed"])
+        runs = activity_runs(daily)
+        for window_days in LEADERBOARD_WINDOWS.values():
+            leaderboard_table(daily, runs, window_days, today)
+
+    return None, _run, None
+
+
+def prepare_aggregates(data):
+    return None, lambda: build_aggregates(data["typed"]), None
+
+
+def _filled_db(data):
+    db = ObservationDB(os.path.join(CACHE_DIR, "bench_observations.sqlite"))
+    db.replace(data["typed"], "bench@1")
+    return db
+
+
+def prepare_db_rebuild(data):
+    db = ObservationDB(os.path.join(CACHE_DIR, "bench_observations.sqlite"))
+    return None, lambda: db.replace(data["typed"], "bench@1"), None
+
+
+def prepare_db_upsert(data):
+    db = _filled_db(data)
+    submissions = itertools.cycle([submission_rows(seed=i) for i in range(16)])
+    return None, lambda: db.upsert(next(submissions)), None
+
+
+def prepare_db_latest_by_hole(data):
+    db = _filled_db(data)
+    hotels = itertools.cycle(data["typed"]["hotel_code"].astype(str).unique())
+    return None, lambda: db.latest_by_hole(next(hotels)), None
+
+
+def prepare_prefill(data):
+    db = _filled_db(data)
+    index = LatestObservationIndex()
+    hotels = data["typed"]["hotel_code"].astype(str).unique()
+    for hotel in hotels:
+        index._install(hotel, db.latest_by_hole(hotel), ("bench@1", db.revision))
+    hotels = itertools.cycle(hotels)
+    return None, lambda: index.for_hotel(next(hotels), sync=False), None
+
+
+def prepare_db_leaderboard(data):
+    db = _filled_db(data)
+    today = data["typed"]["obs_date"].max().date()
+
+    def _run():
+        daily = db.daily_submissions()
+        runs = activity_runs(daily)
+        for window_days in LEADERBOARD_WINDOWS.values():
+            leaderboard_table(daily, runs, window_days, today)
+
+    return None, _run, None
+
+
+# name -> prepare(data), which returns (setup or None, run, MemoryBackend or None); setup runs
+# before every measured run, run is what gets timed
+CASES = {
+    "load_authoritative (cold)": prepare_load_cold,
+    "load_authoritative (warm)": prepare_load_warm,
+    "hotel_shard_load (cold)": prepare_hotel_load,
+    "photo_catalog_refresh": prepare_catalog_refresh,
+    "gallery_page": prepare_gallery_page,
+    "leaderboard": prepare_leaderboard,
+    "build_aggregates": prepare_aggregates,
+    "observation_db_rebuild": prepare_db_rebuild,
+    "observation_db_upsert": prepare_db_upsert,
+    "latest_by_hole (db)": prepare_db_latest_by_hole,
+    "prefill_hotel": prepare_prefill,
+    "leaderboard (db)": prepare_db_leaderboard,
+}
+
+
+def measure(setup, run, repeat):
+    """Return (best seconds, peak MB under tracemalloc)."""
+    best = None
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        run()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    if setup:
+        setup()
+    tracemalloc.start()
+    try:
+        run()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return best, peak / 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the observation data paths on synthetic data.")
+    parser.add_argument("--sizes", default=",".join(str(s) for s in DEFAULT_SIZES), help="comma-separated row counts")
+    parser.add_argument("--only", default="", help="comma-separated case names (substring match)")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per case; the fastest is kept")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the synthetic data")
+    parser.add_argument("--latency", type=float, default=0.0, help="simulated latency of every storage call, in ms")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    wanted = [w.strip() for w in args.only.split(",") if w.strip()]
+    cases = [name for name in CASES if not wanted or any(w in name for w in wanted)]
+    # Nothing should start background piece compaction against the in-memory client mid-measurement
+    data_utils._LAST_PIECES_RUN = float("inf")
+
+    results = []
+    print(f"{'case':30} {'rows':>9} {'best s':>9} {'peak MB':>9}  storage calls per run")
+    for size in sizes:
+        start = time.perf_counter()
+        raw = generate_observations(size, seed=args.seed)
+        data = {"raw": raw, "typed": normalize_observations(raw)}
+        print(f"-- {size:,} rows ({data['raw']['submission_id'].nunique():,} submissions, generated in {time.perf_counter() - start:.1f} s)")
+        for name in cases:
+            workdir = tempfile.mkdtemp(prefix="bee-bench-")
+            cwd = os.getcwd()
+            os.chdir(workdir)
+            try:
+                setup, run, storage = CASES[name](data)
+                if storage is not None:
+                    storage.latency = args.latency / 1000
+                    storage.calls.clear()
+                seconds, peak_mb = measure(setup, run, args.repeat)
+                calls = dict(storage.calls) if storage is not None else {}
+                runs = args.repeat + 1
+                per_run = ", ".join(f"{call} {count / runs:g}" for call, count in sorted(calls.items()))
+                print(f"{name:30} {size:9,} {seconds:9.3f} {peak_mb:9.1f}  {per_run}")
+                results.append({"case": name, "rows": size, "seconds": seconds, "peak_mb": peak_mb, "storage_calls_per_run": {k: v / runs for k, v in calls.items()}})
+            except Exception as e:
+                print(f"{name:30} {size:9,} failed: {e!r}")
+                results.append({"case": name, "rows": size, "error": repr(e)})
+            finally:
+                os.chdir(cwd)
+                shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"seed": args.seed, "repeat": args.repeat, "latency_ms": args.latency, "results": results}, f, indent=1)
+            f.write("\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""Seeded generator of realistic observation rows for the benchmarks.
+
+Rows look like what the portal writes: every submission is one observer visiting one of their
+hotels (from data/observer_hotel_holes.csv) on a day in the season and filling in some of its
+holes, each with a species from data/species_names.csv ("Empty" being the most common). A small
+share of observations is re-submitted later under the same obs_id, so deduplication has work to do.
+The same seed and size always give the same frame.
+"""
+import os
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HOTELS_CSV = os.path.join(ROOT, "data", "observer_hotel_holes.csv")
+SPECIES_CSV = os.path.join(ROOT, "data", "species_names.csv")
+
+COLUMNS = [
+    "obs_id", "observer", "hotel_code", "obs_date", "obs_time", "nest_hole", "scientific_name",
+    "num_males", "num_females", "num_cells", "num_unknowns", "social_behaviour", "notes",
+    "submission_notes", "submission_id", "photo_link", "submission_time", "manually_checked",
+]
+SOCIAL_BEHAVIOURS = ["", "Solitary", "Social", "Parasitic", "Trophallaxis", "Solitary, Parasitic"]
+SOCIAL_WEIGHTS = [0.7, 0.15, 0.06, 0.04, 0.02, 0.03]
+
+EMPTY_SHARE = 0.45        # share of filled holes recorded as "Empty"
+HOLE_FILL_RATE = 0.6      # chance that a hole is filled in on a visit
+RESUBMIT_RATE = 0.01      # share of rows that are later corrections of an earlier obs_id
+PHOTO_RATE = 0.6          # share of submissions with a photo
+SEASON_DAYS = 365
+
+
+def load_reference():
+    """(observer/hotel pairs, holes per hotel, species names) from the data/ CSVs."""
+    holes = pd.read_csv(HOTELS_CSV, dtype=str)
+    pairs = holes[["observer", "hotel"]].drop_duplicates().reset_index(drop=True)
+    holes_by_hotel = {hotel: group["hole"].tolist() for hotel, group in holes.groupby("hotel", sort=False)}
+    species = pd.read_csv(SPECIES_CSV, dtype=str)["scientific_name"].dropna().tolist()
+    return pairs, holes_by_hotel, species
+
+
+def _uuids(rng, n):
+    """`n` random version-4 UUID strings (formatted from one hex dump; uuid.UUID is slow at 1M)."""
+    raw = rng.integers(0, 256, size=(n, 16), dtype=np.uint8)
+    raw[:, 6] = (raw[:, 6] & 0x0F) | 0x40
+    raw[:, 8] = (raw[:, 8] & 0x3F) | 0x80
+    h = raw.tobytes().hex()
+    return [f"{h[i:i + 8]}-{h[i + 8:i + 12]}-{h[i + 12:i + 16]}-{h[i + 16:i + 20]}-{h[i + 20:i + 32]}" for i in range(0, 32 * n, 32)]
+
+
+def _species(rng, species, n):
+    others = [s for s in species if s != "Empty"]
+    picked = np.array(others, dtype=object)[rng.integers(0, len(others), n)]
+    return np.where(rng.random(n) < EMPTY_SHARE, "Empty", picked)
+
+
+def generate_observations(n_rows, seed=0, season_start=date(2025, 7, 1)):
+    """Return a raw (text-valued, like the master CSV) observations frame of exactly `n_rows` rows."""
+    rng = np.random.default_rng(seed)
+    pairs, holes_by_hotel, species = load_reference()
+    hole_counts = np.array([len(holes_by_hotel[h]) for h in pairs["hotel"]])
+
+    # Enough submissions for n_rows filled holes, then trimmed to size
+    expected_rows = (hole_counts.mean() * HOLE_FILL_RATE) or 1
+    n_submissions = int(n_rows / expected_rows * 1.1) + 10
+    pair_idx = rng.integers(0, len(pairs), n_submissions)
+
+    # One candidate row per hole of the visited hotel, kept with HOLE_FILL_RATE
+    per_sub = hole_counts[pair_idx]
+    sub_of_row = np.repeat(np.arange(n_submissions), per_sub)
+    starts = np.repeat(np.cumsum(per_sub) - per_sub, per_sub)
+    hole_pos = np.arange(len(sub_of_row)) - starts
+    keep = rng.random(len(sub_of_row)) < HOLE_FILL_RATE
+    sub_of_row, hole_pos = sub_of_row[keep][:n_rows], hole_pos[keep][:n_rows]
+    n = len(sub_of_row)
+
+    hotels = pairs["hotel"].to_numpy()[pair_idx]
+    observers = pairs["observer"].to_numpy()[pair_idx]
+    row_hotels = hotels[sub_of_row]
+    holes = np.empty(n, dtype=object)
+    for hotel in np.unique(row_hotels):
+        mask = row_hotels == hotel
+        holes[mask] = np.array(holes_by_hotel[hotel], dtype=object)[hole_pos[mask]]
+
+    # Visits spread over the season, during daylight; submitted minutes to days later
+    day = rng.integers(0, SEASON_DAYS, n_submissions)
+    obs_seconds = rng.integers(7 * 3600, 18 * 3600, n_submissions)
+    obs_dates = pd.Timestamp(season_start) + pd.to_timedelta(day, unit="D")
+    observed_at = obs_dates + pd.to_timedelta(obs_seconds, unit="s")
+    submitted_at = observed_at + pd.to_timedelta(rng.exponential(6 * 3600, n_submissions).astype("int64"), unit="s")
+
+    names = _species(rng, species, n)
+    empty = names == "Empty"
+
+    def _counts(lam):
+        return np.where(empty, 0, rng.poisson(lam, n))
+
+    submission_ids = np.array(_uuids(rng, n_submissions), dtype=object)
+    df = pd.DataFrame({
+        "obs_id": _uuids(rng, n),
+        "observer": observers[sub_of_row],
+        "hotel_code": row_hotels,
+        "obs_date": obs_dates.strftime("%Y-%m-%d").to_numpy()[sub_of_row],
+        "obs_time": observed_at.strftime("%H:%M:%S").to_numpy()[sub_of_row],
+        "nest_hole": holes,
+        "scientific_name": names,
+        "num_males": _counts(0.8),
+        "num_females": _counts(1.2),
+        "num_cells": _counts(3.0),
+        "num_unknowns": _counts(0.3),
+        "social_behaviour": np.where(empty, "", rng.choice(SOCIAL_BEHAVIOURS, n, p=SOCIAL_WEIGHTS)),
+        "notes": np.where(rng.random(n) < 0.05, "Mud cap partly broken", ""),
+        "submission_notes": np.where(rng.random(n_submissions) < 0.1, "Hot day, lots of activity", "")[sub_of_row],
+        "submission_id": submission_ids[sub_of_row],
+        "photo_link": "",
+        "submission_time": submitted_at.strftime("%Y-%m-%d %H:%M:%S").to_numpy()[sub_of_row],
+        "manually_checked": "",
+    }, columns=COLUMNS)
+
+    # Corrections: the last rows become copies of earlier observations (same obs_id, hotel and
+    # hole) re-submitted a day later with another species
+    resubmitted = np.flatnonzero(rng.random(n) < RESUBMIT_RATE)
+    resubmitted = resubmitted[resubmitted < n - len(resubmitted)]
+    if len(resubmitted):
+        corrections = df.iloc[resubmitted].copy()
+        later = pd.to_datetime(corrections["submission_time"]) + pd.Timedelta(days=1)
+        corrections["submission_time"] = later.dt.strftime("%Y-%m-%d %H:%M:%S")
+        corrections["scientific_name"] = _species(rng, species, len(corrections))
+        df.iloc[n - len(corrections):] = corrections.to_numpy()
+    return df
+
+
+def photo_names(df, seed=0):
+    """File names in the photos folder for the submissions of `df` that have a photo."""
+    rng = np.random.default_rng(seed + 1)
+    ids = pd.unique(df["submission_id"])
+    with_photo = ids[rng.random(len(ids)) < PHOTO_RATE]
+    return [f"{sid}_nest.jpg" for sid in with_photo]
+
+
+def submission_rows(seed=0, n_holes=6):
+    """One new portal submission (a few holes of one hotel), as `save_observation` builds it."""
+    df = generate_observations(200, seed=seed + 7)
+    first = df[df["submission_id"] == df["submission_id"].iloc[0]].head(n_holes).copy()
+    first["submission_time"] = pd.Timestamp.now().strftime("%Y-%m-%d %H:%M:%S")
+    return first.reset_index(drop=True)
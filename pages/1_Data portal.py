@@ -1,57 +1,27 @@
 import streamlit as st
 import pandas as pd
 from datetime import date, datetime
-import shutil
-import csv
 import uuid
-import dropbox
-import json
 import os
-import requests
-from io import StringIO
 from streamlit_javascript import st_javascript
-import pytz
+from utils.lazy import LazyModule
+from utils.config import get_config
+from utils.observation_db import get_observation_db
+from utils.images import PHOTO_UPLOAD_TYPES
+from utils.latest_observations import get_latest_index
+from utils.reference import load_reference_data
+from utils.remote_files import read_remote_csv
+from utils.outbox import enqueue_submission, outbox_status, retry_failed, start_outbox_worker
+from utils.static_images import responsive_image
+from utils.storage import get_storage
 
+# Imported on first use: pytz only for the form
+pytz = LazyModule("pytz")
 
 
-# --- Load secrets: prefer Streamlit secrets, then environment, then local secrets.json ---
-def load_secrets():
-    # Try Streamlit secrets (works on Streamlit Community Cloud)
-    try:
-        ss = {}
-        # st.secrets behaves like a dict; use .get to avoid KeyError
-        ss_keys = ["DROPBOX_APP_KEY", "DROPBOX_APP_SECRET", "DROPBOX_REFRESH_TOKEN", "OBSERVER_PASSPHRASES"]
-        for k in ss_keys:
-            try:
-                ss[k] = st.secrets.get(k)
-            except Exception:
-                ss[k] = None
-        # If at least the Dropbox keys are present, return
-        if ss.get("DROPBOX_APP_KEY") and ss.get("DROPBOX_APP_SECRET") and ss.get("DROPBOX_REFRESH_TOKEN"):
-            return ss
-    except Exception:
-        pass
-
-    # Next, try environment variables
-    env_keys = ["DROPBOX_APP_KEY", "DROPBOX_APP_SECRET", "DROPBOX_REFRESH_TOKEN", "OBSERVER_PASSPHRASES"]
-    env = {k: os.environ.get(k) for k in env_keys}
-    if env.get("DROPBOX_APP_KEY") and env.get("DROPBOX_APP_SECRET") and env.get("DROPBOX_REFRESH_TOKEN"):
-        return env
-
-    # Fallback: local secrets.json (for local dev only)
-    if os.path.exists("secrets.json"):
-        try:
-            with open("secrets.json") as f:
-                return json.load(f)
-        except Exception:
-            pass
-
-    # Nothing found
-    return {}
-
 
 # Define the save and upload function
-def save_observation(rows_to_save, hotel_code, DATA_FILE, dbx):
+def save_observation(rows_to_save, hotel_code, submission_id, photo_bytes=None, photo_name=None):
     # Build long-form DataFrame with requested columns and linkage fields
             cols = [
                 "obs_id",
@@ -80,44 +50,16 @@ def save_observation(rows_to_save, hotel_code, DATA_FILE, dbx):
                     all_df[c] = ""
             all_df = all_df[cols]
 
-            # Preparing to save rows
-
-            # Read existing file (if any) and overwrite with combined data for atomicity
+            # Commit the submission to the local outbox and acknowledge straight away; the
+            # background uploader sends the photo and rows to Dropbox (with retries)
             try:
-                if os.path.exists(DATA_FILE):
-                    existing_df = safe_read_csv(DATA_FILE)
-                    # If safe_read_csv returned empty (malformed file was backed up), just write new data
-                    if existing_df.empty:
-                        all_df.to_csv(DATA_FILE, index=False, quoting=csv.QUOTE_MINIMAL)
-                    else:
-                        combined = pd.concat([existing_df, all_df], ignore_index=True)
-                        combined.to_csv(DATA_FILE, index=False, quoting=csv.QUOTE_MINIMAL)
-                else:
-                    all_df.to_csv(DATA_FILE, index=False, quoting=csv.QUOTE_MINIMAL)
-                # Reconcile local and remote pieces and upload authoritative master
-                try:
-                    # Use a lighter-weight incremental update on submit to avoid listing/downloading many files
-                    authoritative = incremental_master_update(dbx, all_df, local_path=DATA_FILE)
-                    if isinstance(authoritative, pd.DataFrame) and not authoritative.empty:
-                        df = authoritative.copy()
-                    else:
-                        try:
-                            df = safe_read_csv(DATA_FILE)
-                        except Exception:
-                            df = df
-                except Exception as e:
-                    st.warning(f"Incremental upload failed: {e}")
-
+                enqueue_submission(all_df.to_dict(orient="records"), hotel_code, submission_id, photo_bytes, photo_name)
+                # Prefill the next visit from this submission without waiting for the upload
+                get_latest_index().apply_submission(all_df)
                 st.success(f"✅ Recorded {len(rows_to_save)} observation(s) for hotel {hotel_code}")
                 st.json(all_df.to_dict(orient="records")[0] if len(all_df) == 1 else all_df.to_dict(orient="records"))
             except Exception as e:
-                st.error(f"Failed to write observations to {DATA_FILE}: {e}")
-
-secrets = load_secrets()
-
-APP_KEY = secrets.get("DROPBOX_APP_KEY")
-APP_SECRET = secrets.get("DROPBOX_APP_SECRET")
-REFRESH_TOKEN = secrets.get("DROPBOX_REFRESH_TOKEN")
+                st.error(f"Failed to record observations: {e}")
 
 timezone = st_javascript("""await (async () => {
             const userTimezone = Intl.DateTimeFormat().resolvedOptions().timeZone;
@@ -126,21 +68,18 @@ timezone = st_javascript("""await (async () => {
             })().then(returnValue => returnValue)""")
 
 
-# Initialize Dropbox client only if credentials are available
-dbx = None
-if APP_KEY and APP_SECRET and REFRESH_TOKEN:
-    try:
-        dbx = dropbox.Dropbox(
-            app_key=APP_KEY,
-            app_secret=APP_SECRET,
-            oauth2_refresh_token=REFRESH_TOKEN
-        )
-    except Exception as e:
-        st.warning(f"Failed to initialize Dropbox client: {e}")
-        dbx = None
-else:
+# Deployment settings shared with the other pages (resolved once, reloaded when secrets.json or
+# the passphrase CSV change)
+config = get_config()
+
+# Shared storage backend (Dropbox unless STORAGE_BACKEND says otherwise); None if not configured
+storage = get_storage()
+if storage is None:
     st.warning("Dropbox credentials not found in Streamlit secrets or environment; photo uploads will be disabled.")
 
+# Process-wide background uploader for the submission outbox (resumes jobs left by a previous run)
+start_outbox_worker()
+
 # --- Observer → Hotel mapping ---
 # Default fallbacks (used if no CSV is provided or CSV is malformed)
     # I don't belive that this will get used again, unless everything disappears from the dropbox/GitHub :) 
@@ -157,360 +96,27 @@ DEFAULT_HOTEL_HOLES = {
     "H005": ["Alpha", "Beta"]
 }
 
-# Attempt to load a single long-form CSV with columns (observer, hotel, hole).
-# Expected path: data/observer_hotel_holes.csv (case-insensitive column names accepted).
-OBSERVER_HOTELS = DEFAULT_OBSERVER_HOTELS.copy()
-HOTEL_HOLES = DEFAULT_HOTEL_HOLES.copy()
-oh_path = os.path.join("data", "observer_hotel_holes.csv")
-
-# Try remote URL first (st.secrets or env), then local file, then defaults
-@st.cache_data(show_spinner=False)
-def fetch_csv_from_url(url: str, token: str = None):
-    if not url:
-        return None
-    try:
-        headers = {}
-        if token:
-            headers["Authorization"] = f"token {token}"
-        resp = requests.get(url, headers=headers, timeout=15)
-        resp.raise_for_status()
-        return pd.read_csv(StringIO(resp.text))
-    except Exception:
-        return None
-
-# Look for a configured remote URL in st.secrets or environment
-oh_url = None
+# Observer → hotel → hole mapping from a remote CSV (OBSERVER_HOTEL_CSV_URL; cached on disk), else
+# data/observer_hotel_holes.csv, else the defaults above. It is parsed once per revision of its
+# source (see utils/reference.py); reruns only look it up.
+reference = None
 try:
-    oh_url = st.secrets.get("OBSERVER_HOTEL_CSV_URL") or st.secrets.get("OBSERVER_HOTELS_URL")
-except Exception:
-    oh_url = None
-if not oh_url:
-    oh_url = os.environ.get("OBSERVER_HOTEL_CSV_URL") or os.environ.get("OBSERVER_HOTELS_URL")
-
-# Optional GitHub token for private raw URLs
-GITHUB_TOKEN = None
-try:
-    GITHUB_TOKEN = st.secrets.get("GITHUB_TOKEN")
-except Exception:
-    GITHUB_TOKEN = os.environ.get("GITHUB_TOKEN")
-
-oh_df = None
-if oh_url:
-    oh_df = fetch_csv_from_url(oh_url, token=GITHUB_TOKEN)
-if oh_df is None and os.path.exists(oh_path):
-    try:
-        oh_df = pd.read_csv(oh_path)
-    except Exception as e:
-        st.warning(f"Failed to read {oh_path}: {e}. Using defaults.")
+    reference = load_reference_data(config.observer_hotel_csv_url, token=config.github_token)
+except Exception as e:
+    st.warning(f"Failed to load the observer/hotel CSV: {e}. Using defaults.")
+OBSERVER_HOTELS = reference.observer_hotels if reference is not None else DEFAULT_OBSERVER_HOTELS
+HOTEL_HOLES = reference.hotel_holes if reference is not None else DEFAULT_HOTEL_HOLES
 
-if oh_df is not None:
-    try:
-        # Normalize column names to lowercase for detection
-        col_map = {c.lower(): c for c in oh_df.columns}
-        # find best matches for observer, hotel, hole
-        obs_col = next((col_map[k] for k in col_map if "observer" in k or "observer" == k), None)
-        hotel_col = next((col_map[k] for k in col_map if "hotel" in k or "hotel_code" in k), None)
-        hole_col = next((col_map[k] for k in col_map if "hole" in k or "nest" in k), None)
-
-        if not (obs_col and hotel_col and hole_col):
-            st.warning("Observer/hotel CSV is missing required columns (observer, hotel, hole). Using defaults.")
-        else:
-            OBSERVER_HOTELS = {}
-            HOTEL_HOLES = {}
-            for _, row in oh_df.iterrows():
-                obs = str(row.get(obs_col, "")).strip()
-                hotel = str(row.get(hotel_col, "")).strip()
-                hole = str(row.get(hole_col, "")).strip()
-                if not obs or not hotel:
-                    continue
-                OBSERVER_HOTELS.setdefault(obs, [])
-                if hotel not in OBSERVER_HOTELS[obs]:
-                    OBSERVER_HOTELS[obs].append(hotel)
-                HOTEL_HOLES.setdefault(hotel, [])
-                if hole and hole not in HOTEL_HOLES[hotel]:
-                    HOTEL_HOLES[hotel].append(hole)
-            # sort lists for deterministic ordering
-            for k in OBSERVER_HOTELS:
-                try:
-                    OBSERVER_HOTELS[k] = sorted(OBSERVER_HOTELS[k])
-                except Exception:
-                    pass
-            for k in HOTEL_HOLES:
-                try:
-                    HOTEL_HOLES[k] = sorted(HOTEL_HOLES[k], key=lambda x: (len(x), x))
-                except Exception:
-                    pass
-    except Exception as e:
-        st.warning(f"Failed to process observer/hotel CSV: {e}. Using defaults.")
-
-DATA_FILE = "observations.csv"
-
-# Load existing local data
-def safe_read_csv(path):
-    """Read a CSV path safely. If a ParserError occurs, move the broken file to a backup and return empty DataFrame."""
-    if not os.path.exists(path):
-        return pd.DataFrame()
-    try:
-        return pd.read_csv(path)
-    except pd.errors.ParserError as e:
-        # Backup the malformed file and continue with empty DataFrame
-        ts = datetime.now().strftime("%Y%m%d_%H%M%S")
-        backup = f"{path}.broken_{ts}.bak"
-        try:
-            shutil.move(path, backup)
-            st.warning(f"Existing {path} was malformed and moved to {backup}. Starting fresh.")
-        except Exception as mv_err:
-            st.error(f"Failed to move malformed {path}: {mv_err}")
-        return pd.DataFrame()
-    except Exception as e:
-        st.warning(f"Failed to read {path}: {e}")
-        return pd.DataFrame()
-
-df = safe_read_csv(DATA_FILE)
-
-
-def reconcile_and_upload_master(dbx_client, local_path=DATA_FILE):
-    """Reconcile local observations file with per-observation CSVs stored in Dropbox.
-    This function:
-    - Reads the local `local_path` safely
-    - Attempts to list and download all CSVs under `/observations/csv/` on Dropbox
-    - Optionally reads existing remote master `/observations/observations.csv`
-    - Concatenates all available rows, deduplicates by `obs_id` preferring the latest by `submission_time`,
-      writes the authoritative local file, and uploads it to Dropbox as `/observations/observations.csv`.
-    Returns the authoritative DataFrame (may be empty DataFrame if nothing available).
-    """
-    # Start with local data
-    local_df = safe_read_csv(local_path)
-
-    remote_rows = []
-    if dbx_client is not None:
-        try:
-            # Gather per-observation CSVs
-            folder_path = '/observations/csv'
-            has_more = True
-            cursor = None
-            entries = []
-            try:
-                res = dbx_client.files_list_folder(folder_path)
-                entries.extend(res.entries)
-                cursor = getattr(res, 'cursor', None)
-                has_more = getattr(res, 'has_more', False)
-                while has_more:
-                    res = dbx_client.files_list_folder_continue(cursor)
-                    entries.extend(res.entries)
-                    cursor = getattr(res, 'cursor', None)
-                    has_more = getattr(res, 'has_more', False)
-            except dropbox.exceptions.ApiError:
-                # Folder may not exist; that's fine
-                entries = []
-
-            for e in entries:
-                try:
-                    name = getattr(e, 'name', '')
-                    if name.lower().endswith('.csv'):
-                        md, resp = dbx_client.files_download(f"{folder_path}/{name}")
-                        txt = resp.content.decode('utf-8')
-                        try:
-                            df_piece = pd.read_csv(StringIO(txt))
-                            remote_rows.append(df_piece)
-                        except Exception:
-                            # skip malformed remote pieces
-                            continue
-                except Exception:
-                    continue
-
-            # Also try to read existing remote master (if present) to be extra-safe
-            try:
-                md_meta, md_res = dbx_client.files_download('/observations/observations.csv')
-                try:
-                    master_remote = pd.read_csv(StringIO(md_res.content.decode('utf-8')))
-                    remote_rows.append(master_remote)
-                except Exception:
-                    pass
-            except Exception:
-                pass
-        except Exception:
-            # Any Dropbox error should not crash reconciliation — continue with what we have
-            pass
 
-    # Combine available frames
-    pieces = [df for df in ([local_df] + remote_rows) if isinstance(df, pd.DataFrame) and not df.empty]
-    if pieces:
-        try:
-            combined = pd.concat(pieces, ignore_index=True, sort=False)
-        except Exception:
-            # Fallback: use local only
-            combined = local_df.copy() if isinstance(local_df, pd.DataFrame) else pd.DataFrame()
-    else:
-        combined = local_df.copy() if isinstance(local_df, pd.DataFrame) else pd.DataFrame()
-
-    # Normalize columns and dedupe by obs_id, preferring latest submission_time
-    if not combined.empty and 'obs_id' in combined.columns:
-        # parse submission_time where possible
-        if 'submission_time' in combined.columns:
-            try:
-                combined['__st'] = pd.to_datetime(combined['submission_time'], errors='coerce')
-            except Exception:
-                combined['__st'] = pd.NaT
-            # sort ascending so drop_duplicates(keep='last') keeps the most recent
-            try:
-                combined = combined.sort_values('__st', na_position='first')
-            except Exception:
-                pass
-        try:
-            combined = combined.drop_duplicates(subset=['obs_id'], keep='last').reset_index(drop=True)
-        except Exception:
-            combined = combined.drop_duplicates(subset=['obs_id']).reset_index(drop=True)
-        # clean up temporary column
-        if '__st' in combined.columns:
-            try:
-                combined = combined.drop(columns=['__st'])
-            except Exception:
-                pass
-
-    # Ensure we have a local file written as authoritative
-    try:
-        combined.to_csv(local_path, index=False, quoting=csv.QUOTE_MINIMAL)
-    except Exception:
-        try:
-            if isinstance(local_df, pd.DataFrame) and not local_df.empty:
-                local_df.to_csv(local_path, index=False, quoting=csv.QUOTE_MINIMAL)
-        except Exception:
-            pass
-
-    # Upload the authoritative master to Dropbox
-    if dbx_client is not None and not combined.empty:
-        try:
-            csv_bytes = combined.to_csv(index=False, quoting=csv.QUOTE_MINIMAL).encode('utf-8')
-            dbx_client.files_upload(csv_bytes, '/observations/observations.csv', mode=dropbox.files.WriteMode.overwrite)
-        except Exception:
-            # If upload fails, do not raise — UI should already have saved local file
-            pass
-
-    return combined
-
-
-def incremental_master_update(dbx_client, new_rows_df, local_path=DATA_FILE):
-    """A lighter-weight update for submit-time:
-    - Downloads the remote master `/observations/observations.csv` if present (single file only)
-    - Concatenates `new_rows_df` with the remote master (or local file if remote missing)
-    - Deduplicates by `obs_id`, preferring latest `submission_time`
-    - Writes local authoritative file and uploads it to Dropbox
-    Returns the authoritative DataFrame
-    """
-    # Start with existing local
-    local_df = safe_read_csv(local_path)
-
-    # Attempt to download remote master (single file) — cheaper than listing folder
-    remote_master = None
-    if dbx_client is not None:
-        try:
-            md_meta, md_res = dbx_client.files_download('/observations/observations.csv')
-            try:
-                remote_master = pd.read_csv(StringIO(md_res.content.decode('utf-8')))
-            except Exception:
-                remote_master = None
-        except Exception:
-            remote_master = None
-
-    # Determine base to combine with: prefer remote_master, then local_df, else empty
-    base = remote_master if (isinstance(remote_master, pd.DataFrame) and not remote_master.empty) else (local_df if not local_df.empty else pd.DataFrame())
-
-    pieces = [p for p in [base, new_rows_df] if isinstance(p, pd.DataFrame) and not p.empty]
-    if pieces:
-        try:
-            combined = pd.concat(pieces, ignore_index=True, sort=False)
-        except Exception:
-            combined = new_rows_df.copy()
-    else:
-        combined = new_rows_df.copy() if isinstance(new_rows_df, pd.DataFrame) else pd.DataFrame()
-
-    # Dedupe by obs_id preferring latest submission_time
-    if not combined.empty and 'obs_id' in combined.columns:
-        if 'submission_time' in combined.columns:
-            try:
-                combined['__st'] = pd.to_datetime(combined['submission_time'], errors='coerce')
-                combined = combined.sort_values('__st', na_position='first')
-            except Exception:
-                pass
-        try:
-            combined = combined.drop_duplicates(subset=['obs_id'], keep='last').reset_index(drop=True)
-        except Exception:
-            combined = combined.drop_duplicates(subset=['obs_id']).reset_index(drop=True)
-        if '__st' in combined.columns:
-            try:
-                combined = combined.drop(columns=['__st'])
-            except Exception:
-                pass
-
-    # Write local authoritative file
-    try:
-        combined.to_csv(local_path, index=False, quoting=csv.QUOTE_MINIMAL)
-    except Exception:
-        pass
-
-    # Upload authoritative master
-    if dbx_client is not None and not combined.empty:
-        try:
-            csv_bytes = combined.to_csv(index=False, quoting=csv.QUOTE_MINIMAL).encode('utf-8')
-            dbx_client.files_upload(csv_bytes, '/observations/observations.csv', mode=dropbox.files.WriteMode.overwrite)
-        except Exception:
-            pass
-
-    return combined
-# If Dropbox is configured in this environment, prefer the master CSV stored in Dropbox
-if dbx is not None:
-    try:
-        # Attempt to download the master observations.csv from Dropbox
-        md_path = "/observations/observations.csv"
-        remote_master_found = False
-        try:
-            md_meta, md_res = dbx.files_download(md_path)
-            content = md_res.content.decode("utf-8")
-            try:
-                remote_df = pd.read_csv(StringIO(content))
-                if not remote_df.empty:
-                    df = remote_df
-                    remote_master_found = True
-            except Exception as e:
-                st.warning(f"Failed to parse remote master CSV from Dropbox: {e}")
-        except Exception:
-            # No remote master CSV found or download failed; keep local df
-            pass
-    except Exception:
-        # Any error with Dropbox should not break the app — keep local df
-        pass
-
-    # Run a full reconciliation on startup only if no remote master exists
-    try:
-        if not globals().get('remote_master_found', False):
-            reconciled = reconcile_and_upload_master(dbx, local_path=DATA_FILE)
-            if isinstance(reconciled, pd.DataFrame) and not reconciled.empty:
-                df = reconciled
-    except Exception:
-        # If reconciliation fails, keep whatever df we already loaded
-        pass
-
-# Build species list from data/species_names.csv if present, otherwise fall back to historical data
+# Build species list from the remote species CSV (SPECIES_CSV_URL; cached on disk and
+# revalidated in the background), else data/species_names.csv, else the historical data
 species_file = os.path.join("data", "species_names.csv")
 species_list = []
-# Try remote URL first (st.secrets or env), then local file, then fallback to historical data
-species_url = None
-try:
-    species_url = st.secrets.get("SPECIES_CSV_URL") or st.secrets.get("SPECIES_LIST_URL")
-except Exception:
-    species_url = None
-if not species_url:
-    species_url = os.environ.get("SPECIES_CSV_URL") or os.environ.get("SPECIES_LIST_URL")
-
 sp_df = None
-if species_url:
-    sp_df = fetch_csv_from_url(species_url, token=GITHUB_TOKEN)
-if sp_df is None and os.path.exists(species_file):
-    try:
-        sp_df = pd.read_csv(species_file)
-    except Exception as e:
-        st.warning(f"Failed to read {species_file}: {e}")
+try:
+    sp_df = read_remote_csv(config.species_csv_url, token=config.github_token, fallback_path=species_file)
+except Exception as e:
+    st.warning(f"Failed to read {species_file}: {e}")
 
 if sp_df is not None:
     try:
@@ -519,73 +125,32 @@ if sp_df is not None:
     except Exception as e:
         st.warning(f"Failed to parse species CSV: {e}")
 
-if not species_list and not df.empty and "scientific_name" in df.columns:
+# Only when no species list is available are the species recorded so far read from the
+# observation database's scientific_name index (which brings the database up to date with the
+# store shared with the dashboard); the form itself works from the selected hotel's shard
+if not species_list:
     try:
-        species_list = sorted(df["scientific_name"].dropna().astype(str).str.strip().unique().tolist())
+        species_list = get_observation_db().species()
     except Exception:
         species_list = []
 
 st.title("📝 Bee Hotel Observation Portal")
 
+# Submissions waiting in the local outbox (uploaded to Dropbox in the background)
+outbox_counts = outbox_status()
+if outbox_counts["pending"] or outbox_counts["failed"]:
+    st.info(f"⏳ {outbox_counts['pending']} submission(s) waiting to upload, {outbox_counts['failed']} failed.")
+    if outbox_counts["failed"] and st.button("Retry failed uploads"):
+        retry_failed()
+
 # --- Top-level observer selection and passphrase gate ---
 observer = st.selectbox("Recorded by*", list(OBSERVER_HOTELS.keys()), key="observer")
 
-# Load observer passphrases (prefer Streamlit secrets, then environment variable, fall back to CSV)
-passphrases = {}
-
-# 1) Try Streamlit secrets
-try:
-    raw = None
-    try:
-        raw = st.secrets.get("OBSERVER_PASSPHRASES")
-    except Exception:
-        raw = None
-
-    if raw:
-        if isinstance(raw, dict):
-            passphrases = {str(k): str(v) for k, v in raw.items()}
-        else:
-            try:
-                import json as _json
-                parsed = _json.loads(str(raw))
-                if isinstance(parsed, dict):
-                    passphrases = {str(k): str(v) for k, v in parsed.items()}
-            except Exception:
-                pass
-except Exception:
-    pass
-
-# 2) Environment variable (JSON string)
-if not passphrases:
-    env_val = os.environ.get("OBSERVER_PASSPHRASES")
-    if env_val:
-        try:
-            import json as _json
-            parsed = _json.loads(env_val)
-            if isinstance(parsed, dict):
-                passphrases = {str(k): str(v) for k, v in parsed.items()}
-        except Exception:
-            st.warning("Environment variable OBSERVER_PASSPHRASES is not valid JSON. Falling back to CSV.")
-
-# 3) CSV fallback
-if not passphrases:
-    pass_file = os.path.join("data", "observer_passphrases.csv")
-    if os.path.exists(pass_file):
-        try:
-            pf = pd.read_csv(pass_file)
-            col_map = {c.lower(): c for c in pf.columns}
-            pass_col = next((col_map[k] for k in col_map if "pass" in k or "phrase" in k), None)
-            obs_col = next((col_map[k] for k in col_map if "observer" in k or "observer" == k), None)
-            if pass_col and obs_col:
-                for _, row in pf.iterrows():
-                    obs = str(row.get(obs_col, "")).strip()
-                    pw = str(row.get(pass_col, "")).strip()
-                    if obs:
-                        passphrases[obs] = pw
-            else:
-                st.info(f"{pass_file} found but missing expected columns (observer, passphrase). Passphrase gating disabled.")
-        except Exception as e:
-            st.warning(f"Failed to read {pass_file}: {e}. Passphrase gating disabled.")
+# Observer passphrases (Streamlit secrets, then the OBSERVER_PASSPHRASES environment variable,
+# then data/observer_passphrases.csv), resolved with the rest of the config
+passphrases = config.observer_passphrases
+for message in config.warnings:
+    st.warning(message)
 
 # Prepare gating state
 hotel_code = None
@@ -636,7 +201,7 @@ if hotel_code:
             obs_date = st.date_input("Obs. date*", value=datetime.now(pytz.timezone(timezone)), key="obs_date")
             obs_time = st.time_input("Obs. time (24-hour)*", value=datetime.now(pytz.timezone(timezone)), key="obs_time")
             # Image uploader now sits under date/time in the left column
-            photo = st.file_uploader("Image*", type=["jpg", "jpeg", "png"], key="photo")
+            photo = st.file_uploader("Image*", type=PHOTO_UPLOAD_TYPES, key="photo")
         with col_mid:
             # Submission-level notes (standalone, before nest holes)
             notes_submission = st.text_area("Overall notes", value="", key="notes_submission")
@@ -678,7 +243,8 @@ if hotel_code:
                     else:
                         # Caption 'Logo' for generic logo, otherwise show filename/hotel
                         caption = 'Logo' if 'logo' in os.path.basename(found).lower() else f'Hotel {hotel_code}'
-                        st.image(found, caption=caption, width=IMAGE_DISPLAY_WIDTH)
+                        # Served as a pre-built 220/440 px variant when one exists (see tools/build_image_variants.py)
+                        responsive_image(found, caption=caption, width=IMAGE_DISPLAY_WIDTH)
                 else:
                     st.info("No logo found in data/ or assets/ (checked data/logo.png, assets/logo.png, and hotel images).")
             except Exception:
@@ -730,23 +296,13 @@ if hotel_code:
         if not holes_for_hotel:
             holes_for_hotel = [chr(i) for i in range(ord('A'), ord('K')+1)]
 
-        # Precompute latest observation per (hotel_code, nest_hole) to avoid repeated filtering and datetime parsing
-        latest_by_hotel_hole = {}
+        # Latest observation of every hole of this hotel, looked up in the observation database by
+        # the (hotel_code, nest_hole, submission_time) index after the hotel's shard is upserted
+        # (only that hotel's file is ever read for it, not the whole master)
         try:
-            if not df.empty:
-                tmp = df.copy()
-                if 'submission_time' in tmp.columns:
-                    try:
-                        tmp['__st'] = pd.to_datetime(tmp['submission_time'], errors='coerce')
-                    except Exception:
-                        tmp['__st'] = pd.NaT
-                    tmp = tmp.sort_values('__st', na_position='first')
-                # Keep last occurrence per obs_id after sorting ensures latest by submission_time wins when deduped
-                for _, r in tmp.iterrows():
-                    key = (str(r.get('hotel_code', '')), str(r.get('nest_hole', '')))
-                    latest_by_hotel_hole[key] = r
+            latest_by_hole = get_latest_index().for_hotel(hotel_code) if hotel_code else {}
         except Exception:
-            latest_by_hotel_hole = {}
+            latest_by_hole = {}
 
         for hole_label in holes_for_hotel:
             # split counts into four small columns: cells, males, females, unknowns
@@ -757,26 +313,36 @@ if hotel_code:
             # inside the social/notes column, create two sub-columns for social_behaviour and notes
             sb_col, hole_notes_col = c_sb_notes.columns([2, 2])
 
-            # Prepopulate defaults if possible (use authoritative df and pick most recent by submission_time)
+            # Prepopulate defaults from the most recent observation of this hole, if any
             defaults = {"scientific_name": "", "num_cells": 0, "num_males": 0, "num_females": 0, "num_unknowns": 0, "social_behaviour": []}
             try:
                 if hotel_code:
-                    key = (str(hotel_code), str(hole_label))
-                    last_entry = latest_by_hotel_hole.get(key)
+                    last_entry = latest_by_hole.get(str(hole_label))
                     if last_entry is not None:
+                        # counts may be missing (NULL in the database) rather than 0
+                        def _count(col):
+                            v = last_entry.get(col, 0)
+                            return 0 if pd.isna(v) else int(v)
+                        sci_prev = last_entry.get("scientific_name", "")
+                        sb_prev = last_entry.get("social_behaviour", "")
                         defaults = {
-                            "scientific_name": last_entry.get("scientific_name", ""),
-                            "num_cells": int(last_entry.get("num_cells", 0) or 0),
-                            "num_males": int(last_entry.get("num_males", 0) or 0),
-                            "num_females": int(last_entry.get("num_females", 0) or 0),
-                            "num_unknowns": int(last_entry.get("num_unknowns", 0) or 0),
-                            "social_behaviour": last_entry.get("social_behaviour", "").split(", ") if last_entry.get("social_behaviour") else []
+                            "scientific_name": "" if pd.isna(sci_prev) else str(sci_prev),
+                            "num_cells": _count("num_cells"),
+                            "num_males": _count("num_males"),
+                            "num_females": _count("num_females"),
+                            "num_unknowns": _count("num_unknowns"),
+                            "social_behaviour": str(sb_prev).split(", ") if isinstance(sb_prev, str) and sb_prev else []
                         }
             except Exception:
                 pass
 
             with c0:
                 st.markdown(f"**{hole_label}**")
+                # Hole diameter and shape, where the reference data records them
+                info = reference.hole(hotel_code, str(hole_label)) if reference is not None else None
+                details = [f"{info.size} mm" if info and info.size else "", info.shape if info and info.shape else ""]
+                if any(details):
+                    st.caption(" ".join(d for d in details if d))
             with c1:
                 # Use species dropdown sourced from data/species_names.csv (fallback to historical species)
                 local_species = species_list.copy() if species_list else []
@@ -830,16 +396,27 @@ if submitted:
             st.error("⚠️ No photo uploaded. This is required, please go up and upload one!")
             st.stop()
         else:
+            # The reference data may have been reloaded since the form was drawn: make sure the
+            # observer still has this hotel and (where the hotel's holes are listed) these holes
+            if reference is not None:
+                listed_holes = reference.holes_for(hotel_code)
+                unknown = [h for h in hole_values if listed_holes and not reference.is_known(observer, hotel_code, str(h))]
+                if not reference.is_known(observer, hotel_code):
+                    st.error(f"⚠️ Hotel {hotel_code} is not assigned to {observer} in the reference list. Reload the page and try again.")
+                    st.stop()
+                if unknown:
+                    st.error(f"⚠️ Hole(s) {', '.join(map(str, unknown))} are not listed for hotel {hotel_code}. Reload the page and try again.")
+                    st.stop()
             submission_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
-            # --- Upload photo to Dropbox once (if provided) ---
-            photo_link = None
+            # --- Photo is uploaded once per submission by the outbox worker ---
             photo_bytes = None
             if photo:
                 photo_bytes = photo.read()
 
             rows_to_save = []
-            uploaded_csvs = []
+            # One submission_id for this form submit; every filled hole shares it and the photo
+            submission_id = str(uuid.uuid4())
 
             # Read fresh values from st.session_state to avoid using potentially stale captured dict
             for hole_label in list(hole_values.keys()):
@@ -853,29 +430,8 @@ if submitted:
 
                 # Consider a hole 'filled' if it has a scientific name, counts, social behaviour, or notes
                 if sci or nm > 0 or nf > 0 or sb or notes_text or nc > 0 or nu > 0:
-                        # Create a single submission_id for this form submit (used below)
-                        # We'll create submission_id outside the loop once; if not present, create it now
-                        if "submission_id" not in locals():
-                            submission_id = str(uuid.uuid4())
-
-                            # Upload photo once and reuse photo_link
-                            if photo_bytes:
-                                try:
-                                    photo_filename = f"{submission_id}_{photo.name}"
-                                    dropbox_path = f"/observations/photos/{photo_filename}"
-                                    dbx.files_upload(photo_bytes, dropbox_path, mode=dropbox.files.WriteMode.overwrite)
-                                    shared_link = dbx.sharing_create_shared_link_with_settings(dropbox_path)
-                                    photo_link = shared_link.url.replace("?dl=0", "?raw=1")
-                                except Exception as e:
-                                    st.warning(f"Photo upload failed: {e}")
-                                    photo_link = None
-                            else:
-                                photo_link = None
-
-                        obs_id = str(uuid.uuid4())
-
                         obs_data = {
-                            "obs_id": obs_id,
+                            "obs_id": str(uuid.uuid4()),
                             "submission_id": submission_id,
                             "observer": observer,
                             "hotel_code": hotel_code,
@@ -890,26 +446,15 @@ if submitted:
                             "social_behaviour": ", ".join(sb),
                             "notes": notes_text,
                             "submission_notes": notes_submission,
-                            "photo_link": photo_link,
+                            "photo_link": None,
                             "submission_time": submission_time
                         }
-
                         rows_to_save.append(obs_data)
 
-                        # Upload per-observation CSV (optional)
-                        try:
-                            new_df = pd.DataFrame([obs_data])
-                            obs_csv_filename = f"{obs_id}.csv"
-                            csv_buffer = new_df.to_csv(index=False, quoting=csv.QUOTE_MINIMAL).encode("utf-8")
-                            dbx.files_upload(csv_buffer, f"/observations/csv/{obs_csv_filename}", mode=dropbox.files.WriteMode.overwrite)
-                            uploaded_csvs.append(obs_csv_filename)
-                        except Exception as e:
-                            st.warning(f"CSV upload failed for hole {hole_label}: {e}")
-
             # Save all rows locally at once
             if rows_to_save:
                 # Save all rows locally at once
-                save_observation(rows_to_save, hotel_code, DATA_FILE, dbx)
+                save_observation(rows_to_save, hotel_code, submission_id, photo_bytes, photo.name)
             else:
 
                 # If NO DATA ARE PROVIDED, CHECK WITH THE USER
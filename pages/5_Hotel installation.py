@@ -1,4 +1,5 @@
 import streamlit as st
+from utils.static_images import responsive_image
 
 st.title("Bee hotel installation ")
 st.write("""
@@ -10,17 +11,15 @@ st.write("""
 For the JBD hotels, I have provided a mounting solution in the form of an L-bracket on either side of the hotel. You can feel free to remove these if you’d like and come up with your own, but I think that these will work in most situations. I have also provided some wood screws for you to use. 
 """)
 
-st.image("pageAssets/MountPhoto.jpg", 
-caption= "A black spray-painted L bracket pre-attached to the bee hotel wit htwo remaining holes to attach to the post/wall/substrate.", 
-clamp=False)
+responsive_image("pageAssets/MountPhoto.jpg", 
+caption= "A black spray-painted L bracket pre-attached to the bee hotel wit htwo remaining holes to attach to the post/wall/substrate.")
 
 st.write("""
 You will also have a piece of black curtain stretchy cord that can hook over the top of the hotel to keep it closed tightly. One side will have a zip-tie on it to help you to close the hotel easier and the other side will not. I would recommend using a pair of pliers to close the non-zip-tie side over the bottom (downward-facing) loop of your hotel. This way you can easily take it off by pulling it forward over the lip of the hotel and the whole thing won’t fly off into the dark. 
 """)
 
-st.image("pageAssets/cord.jpg", 
-caption= "An installed bee hotel example (in this case screwed to some wood and then zip-tied to a metal post. The top of the cord is not bent closed and can be removed while the bottom of the cord is bent using pliers and cannot be removed (or fall off).", 
-clamp=False)
+responsive_image("pageAssets/cord.jpg", 
+caption= "An installed bee hotel example (in this case screwed to some wood and then zip-tied to a metal post. The top of the cord is not bent closed and can be removed while the bottom of the cord is bent using pliers and cannot be removed (or fall off).")
 
 st.write("""
 I have also provided a small handful of vials and tear-off label sheets. Put these aside somewhere that you won’t lose them and, if the need arises, you can collect some specimens to send to us for identification. We will talk about this on an individual basis, but the idea would be to collect bees into them and immediately freeze them to reduce stress and help to preserve DNA.
@@ -85,9 +84,8 @@ st.markdown("""
 5.	Let us know the materials that were used in the construction of the hotel (the type of wood if you know, and the material for the clear cover).
 """)
 
-st.image("pageAssets/nestCode.jpg", 
-caption= "Bee hotels showing the overall nest codes and the individual nest hole letters on the top and the front of the hotel.", 
-clamp=False)
+responsive_image("pageAssets/nestCode.jpg", 
+caption= "Bee hotels showing the overall nest codes and the individual nest hole letters on the top and the front of the hotel.")
 
 
 
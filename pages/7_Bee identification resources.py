@@ -1,4 +1,5 @@
 import streamlit as st
+from utils.static_images import responsive_image
 
 st.title("Bee identification resources")
 st.write("""
@@ -10,9 +11,8 @@ Alternatively, it is often easier to identify bees from specimens and we did sen
 
 """)
 
-st.image("pageAssets/Hylaeus (Macrohylaeus) alcyoneus Male_JamesDorey_Hylaeus (Macrohylaeus) alcyoneus male 39p 2x MPE-Edit.jpg", 
-caption= "A *Hylaeus alcyoneus* showing some regions of the bee. From Bees of Australia: A Photographic Exploration by James Dorey.", 
-clamp=False)
+responsive_image("pageAssets/Hylaeus (Macrohylaeus) alcyoneus Male_JamesDorey_Hylaeus (Macrohylaeus) alcyoneus male 39p 2x MPE-Edit.jpg", 
+caption= "A *Hylaeus alcyoneus* showing some regions of the bee. From Bees of Australia: A Photographic Exploration by James Dorey.")
 
 
 st.subheader("Free identification resources")
@@ -50,47 +50,37 @@ There's a lot out there in terms of scientific literature and bee taxonomy as we
 """)
 
 st.subheader("Helpful diagrams from Michener's 'Bees of the World' book")
-st.image("pageAssets/Head.png", 
-caption= "Bee head anatomy from Michener's 'Bees of the World'", 
-clamp=False)
+responsive_image("pageAssets/Head.png", 
+caption= "Bee head anatomy from Michener's 'Bees of the World'")
 
-st.image("pageAssets/HeadSide.png", 
-caption= "Bee head anatomy (side-view) from Michener's 'Bees of the World'", 
-clamp=False)
+responsive_image("pageAssets/HeadSide.png", 
+caption= "Bee head anatomy (side-view) from Michener's 'Bees of the World'")
 
-st.image("pageAssets/HeadMeasures.png", 
-caption= "Bee head and antennal anatomy from Michener's 'Bees of the World'", 
-clamp=False)
+responsive_image("pageAssets/HeadMeasures.png", 
+caption= "Bee head and antennal anatomy from Michener's 'Bees of the World'")
 
-st.image("pageAssets/BeeTongues.png", 
-caption= "Bee tongue anatomy from Michener's 'Bees of the World'", 
-clamp=False)
+responsive_image("pageAssets/BeeTongues.png", 
+caption= "Bee tongue anatomy from Michener's 'Bees of the World'")
 
-st.image("pageAssets/BeeThorax.png", 
-caption= "Bee thorax anatomy from Michener's 'Bees of the World'", 
-clamp=False)
+responsive_image("pageAssets/BeeThorax.png", 
+caption= "Bee thorax anatomy from Michener's 'Bees of the World'")
 
-st.image("pageAssets/WingVeins.png", 
-caption= "Bee wing **vein** anatomy from Michener's 'Bees of the World'", 
-clamp=False)
+responsive_image("pageAssets/WingVeins.png", 
+caption= "Bee wing **vein** anatomy from Michener's 'Bees of the World'")
 
-st.image("pageAssets/WingCells.png", 
-caption= "Bee wing **cells** anatomy from Michener's 'Bees of the World'", 
-clamp=False)
+responsive_image("pageAssets/WingCells.png", 
+caption= "Bee wing **cells** anatomy from Michener's 'Bees of the World'")
 
-st.image("pageAssets/BeeLeg.png", 
-caption= "Bee leg anatomy from Michener's 'Bees of the World'", 
-clamp=False)
+responsive_image("pageAssets/BeeLeg.png", 
+caption= "Bee leg anatomy from Michener's 'Bees of the World'")
 
-st.image("pageAssets/BeeAbdomen.png", 
-caption= "Bee abdomen anatomy from Michener's 'Bees of the World'", 
-clamp=False)
+responsive_image("pageAssets/BeeAbdomen.png", 
+caption= "Bee abdomen anatomy from Michener's 'Bees of the World'")
 
 st.subheader("Bee sculpturing and punctation by Terry Houston")
 
-st.image("pageAssets/Houston1975_sculpturing.png", 
-caption= "Bee sculpturing and punctation from Houston's 1975 'A Revision of the Australian Hylaeine Bees (Hymenoptera : Colletidae)", 
-clamp=False)
+responsive_image("pageAssets/Houston1975_sculpturing.png", 
+caption= "Bee sculpturing and punctation from Houston's 1975 'A Revision of the Australian Hylaeine Bees (Hymenoptera : Colletidae)")
 
 
 
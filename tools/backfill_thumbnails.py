@@ -0,0 +1,71 @@
+"""Generate gallery thumbnails for photos uploaded before thumbnails were made at ingest.
+
+Finds every photo in the photos folder that is missing one of its thumbnails and
+uploads the missing widths. Safe to re-run; photos that already have all thumbnails are skipped.
+
+Usage (from the repo root, with Dropbox credentials (or STORAGE_BACKEND) in the environment or secrets.json):
+    python tools/backfill_thumbnails.py [--limit N] [--batch-size N]
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.data_utils import PHOTOS_FOLDER, download_many, list_folder_entries  # noqa: E402
+from utils.images import THUMB_WIDTHS, THUMBS_FOLDER, make_thumbnails, thumbnail_path  # noqa: E402
+from utils.storage import FileInfo, init_storage  # noqa: E402
+
+
+def existing_thumbnails(storage):
+    paths = set()
+    for width in THUMB_WIDTHS:
+        try:
+            paths.update(e.path_lower for e in list_folder_entries(storage, f"{THUMBS_FOLDER}/w{width}"))
+        except Exception:
+            pass  # folder not created yet
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--limit", type=int, default=None, help="process at most N photos")
+    parser.add_argument("--batch-size", type=int, default=20, help="photos downloaded/uploaded per batch")
+    args = parser.parse_args()
+
+    storage = init_storage()
+    if storage is None:
+        sys.exit("Storage is not configured")
+
+    have = existing_thumbnails(storage)
+    photos = [e for e in list_folder_entries(storage, PHOTOS_FOLDER) if isinstance(e, FileInfo)]
+    todo = [e for e in photos if any(thumbnail_path(e.name, w).lower() not in have for w in THUMB_WIDTHS)]
+    if args.limit is not None:
+        todo = todo[:args.limit]
+    print(f"{len(photos)} photos, {len(todo)} missing thumbnails")
+
+    done = failed = 0
+    for start in range(0, len(todo), args.batch_size):
+        batch = todo[start:start + args.batch_size]
+        names = {e.path_lower: e.name for e in batch}
+        files = []
+        for path, content in download_many(storage, list(names)):
+            try:
+                if content is None:
+                    raise ValueError("download failed")
+                thumbs = make_thumbnails(content)
+            except Exception as e:
+                failed += 1
+                print(f"  skipped {names[path]}: {e}")
+                continue
+            files += [(thumbnail_path(names[path], w), data) for w, data in thumbs.items()
+                      if thumbnail_path(names[path], w).lower() not in have]
+            done += 1
+        if files:
+            storage.upload_many(files)
+        print(f"  {done}/{len(todo)} done")
+    print(f"finished: {done} photos thumbnailed, {failed} skipped")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""Build the responsive image variants served from static/img/ (see utils/static_images.py).
+
+Every JPEG/PNG under assets/ and pageAssets/ is re-encoded as WebP and JPEG at each of its
+folder's VARIANT_WIDTHS that is not larger than the original. Output names carry a hash of their
+content, so they can be cached forever. Images whose source and settings are unchanged are
+skipped; variants no longer listed in the manifest are deleted. Commit static/img/ after running.
+
+Usage (from the repo root):
+    python tools/build_image_variants.py [--force]
+"""
+import argparse
+import hashlib
+import io
+import json
+import os
+import re
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.images import _open_upright, _pillow  # noqa: E402
+from utils.static_images import MANIFEST_FILE, VARIANTS_DIR  # noqa: E402
+
+
+SOURCE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+# Widths per source folder: hotel pictures are shown at the portal's 220 px (1x/2x), resource
+# page images at up to full column width
+VARIANT_WIDTHS = {
+    "assets": (220, 440),
+    "pageAssets": (400, 800, 1200),
+}
+WEBP_QUALITY = 80
+JPEG_QUALITY = 82
+# Part of every image's fingerprint, so changing the settings rebuilds everything
+SETTINGS = f"w={VARIANT_WIDTHS};webp={WEBP_QUALITY};jpeg={JPEG_QUALITY}"
+
+
+def _slug(path):
+    stem = os.path.splitext(path)[0]
+    return re.sub(r"[^A-Za-z0-9]+", "-", stem).strip("-")
+
+
+def _fingerprint(data):
+    return hashlib.sha256(SETTINGS.encode() + data).hexdigest()
+
+
+def build_variants(source_path, data, widths):
+    """Write the variants of one image and return its manifest entry."""
+    Image, _ = _pillow()
+    img = _open_upright(data)
+    entry = {"width": img.width, "height": img.height, "variants": []}
+    for width in [w for w in widths if w <= img.width] or [img.width]:
+        resized = img if width == img.width else img.resize((width, round(img.height * width / img.width)), Image.LANCZOS)
+        variant = {"width": width}
+        for fmt, ext, kwargs in (
+            ("WEBP", "webp", {"quality": WEBP_QUALITY, "method": 6}),
+            ("JPEG", "jpeg", {"quality": JPEG_QUALITY, "optimize": True, "progressive": True}),
+        ):
+            buf = io.BytesIO()
+            resized.save(buf, format=fmt, **kwargs)
+            out = buf.getvalue()
+            name = f"{_slug(source_path)}-{width}w-{hashlib.sha256(out).hexdigest()[:10]}.{ext}"
+            with open(os.path.join(VARIANTS_DIR, name), "wb") as f:
+                f.write(out)
+            variant[ext] = name
+        entry["variants"].append(variant)
+    return entry
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build WebP/JPEG variants of the app's images.")
+    parser.add_argument("--force", action="store_true", help="rebuild every image")
+    args = parser.parse_args()
+    if _pillow() is None:
+        sys.exit("Pillow is required to build image variants")
+
+    os.makedirs(VARIANTS_DIR, exist_ok=True)
+    try:
+        with open(MANIFEST_FILE, encoding="utf-8") as f:
+            old = json.load(f).get("images", {})
+    except Exception:
+        old = {}
+
+    images = {}
+    built = 0
+    for folder, widths in VARIANT_WIDTHS.items():
+        for name in sorted(os.listdir(folder)):
+            if not name.lower().endswith(SOURCE_EXTENSIONS):
+                continue
+            source_path = f"{folder}/{name}"
+            with open(source_path, "rb") as f:
+                data = f.read()
+            fingerprint = _fingerprint(data)
+            previous = old.get(source_path)
+            if (
+                not args.force
+                and previous
+                and previous.get("source") == fingerprint
+                and all(os.path.exists(os.path.join(VARIANTS_DIR, v[ext])) for v in previous["variants"] for ext in ("webp", "jpeg"))
+            ):
+                images[source_path] = previous
+                continue
+            entry = build_variants(source_path, data, widths)
+            entry["source"] = fingerprint
+            images[source_path] = entry
+            built += 1
+            sizes = sum(os.path.getsize(os.path.join(VARIANTS_DIR, v["webp"])) for v in entry["variants"])
+            print(f"{source_path}: {len(data) / 1e6:.1f} MB -> {len(entry['variants'])} widths, {sizes / 1e6:.2f} MB of WebP")
+
+    keep = {v[ext] for entry in images.values() for v in entry["variants"] for ext in ("webp", "jpeg")}
+    removed = 0
+    for name in os.listdir(VARIANTS_DIR):
+        if name != os.path.basename(MANIFEST_FILE) and name not in keep:
+            os.remove(os.path.join(VARIANTS_DIR, name))
+            removed += 1
+
+    with open(MANIFEST_FILE, "w", encoding="utf-8") as f:
+        json.dump({"images": images}, f, indent=1, sort_keys=True)
+        f.write("\n")
+    print(f"{built} image(s) built, {len(images) - built} unchanged, {removed} stale variant(s) removed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""Cold-start import cost of each page, `python -X importtime` style.
+
+For every page registered in Dashboard.py, the module-level imports of Dashboard.py plus that page
+are run in a fresh interpreter with `-X importtime`, which is what a first visit after the app
+wakes up pays before anything is drawn. Imports deferred to first use (utils.lazy) are, by design,
+not counted. Costs are reported on top of a bare `import streamlit` and compared with a per-page
+budget.
+
+Usage (from the repo root):
+    python tools/importtime_report.py [--repeat N] [--top N] [--check]
+"""
+import argparse
+import ast
+import os
+import re
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ENTRYPOINT = "Dashboard.py"
+
+# Import budget (ms, on top of `import streamlit`) per page; pages not listed get DEFAULT_BUDGET_MS.
+# The data pages need pandas; the resource pages should stay close to zero.
+DEFAULT_BUDGET_MS = 50
+BUDGETS_MS = {
+    "pages/0_landingPage.py": 1200,
+    "pages/1_Data portal.py": 1200,
+}
+
+
+def registered_pages(entrypoint=ENTRYPOINT):
+    with open(os.path.join(ROOT, entrypoint), encoding="utf-8") as f:
+        return re.findall(r"st\.Page\(\s*[\"']([^\"']+)[\"']", f.read())
+
+
+def module_imports(path):
+    """Source of the imports a script runs at module level (including inside top-level try/if)."""
+    with open(os.path.join(ROOT, path), encoding="utf-8") as f:
+        tree = ast.parse(f.read(), filename=path)
+    found = []
+
+    def _walk(nodes):
+        for node in nodes:
+            if isinstance(node, (ast.Import, ast.ImportFrom)):
+                found.append(ast.unparse(node))
+            elif isinstance(node, ast.Try):
+                _walk(node.body)
+            elif isinstance(node, ast.If):
+                _walk(node.body)
+                _walk(node.orelse)
+
+    _walk(tree.body)
+    return found
+
+
+def measure(code, repeat):
+    """Return {top-level module: cumulative µs} for `code`, keeping the fastest of `repeat` runs."""
+    best = None
+    for _ in range(repeat):
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", code],
+            cwd=ROOT, capture_output=True, text=True,
+        )
+        if proc.returncode != 0:
+            raise RuntimeError(proc.stderr.strip().splitlines()[-1] if proc.stderr else "import failed")
+        modules = {}
+        for line in proc.stderr.splitlines():
+            if not line.startswith("import time:") or "cumulative" in line:
+                continue
+            _, self_us, cumulative_us, name = (part for part in re.split(r":|\|", line, maxsplit=3))
+            if not name.startswith("  "):  # top-level imports only (nested ones are included)
+                modules[name.strip()] = int(cumulative_us)
+        if best is None or sum(modules.values()) < sum(best.values()):
+            best = modules
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report the cold-start import cost of each page.")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per page; the fastest is kept")
+    parser.add_argument("--top", type=int, default=5, help="heaviest imports listed per page")
+    parser.add_argument("--check", action="store_true", help="exit with status 1 if a page is over budget")
+    args = parser.parse_args()
+
+    baseline = measure("import streamlit", args.repeat)
+    baseline_ms = sum(baseline.values()) / 1000
+    print(f"baseline `import streamlit`: {baseline_ms:.0f} ms\n")
+    print(f"{'page':45} {'total ms':>9} {'page ms':>8} {'budget':>7}")
+
+    entry_imports = module_imports(ENTRYPOINT)
+    over = []
+    for page in registered_pages():
+        code = "\n".join(["import sys", f"sys.path.insert(0, {ROOT!r})"] + entry_imports + module_imports(page))
+        try:
+            modules = measure(code, args.repeat)
+        except RuntimeError as e:
+            print(f"{page:45} failed: {e}")
+            continue
+        own = {name: us for name, us in modules.items() if name not in baseline}
+        total_ms = sum(modules.values()) / 1000
+        own_ms = sum(own.values()) / 1000
+        budget = BUDGETS_MS.get(page, DEFAULT_BUDGET_MS)
+        flag = "" if own_ms <= budget else "  OVER"
+        if flag:
+            over.append(page)
+        print(f"{page:45} {total_ms:9.0f} {own_ms:8.0f} {budget:7d}{flag}")
+        for name, us in sorted(own.items(), key=lambda kv: -kv[1])[:args.top]:
+            print(f"    {us / 1000:8.1f} ms  {name}")
+
+    if over:
+        print(f"\n{len(over)} page(s) over budget: {', '.join(over)}")
+        if args.check:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
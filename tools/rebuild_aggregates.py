@@ -0,0 +1,32 @@
+"""Recompute the dashboard aggregates (/observations/aggregates.json) from all observations.
+
+Use after editing the master by hand, or if the aggregates look wrong: they are normally kept up
+to date one submission at a time by the data portal's upload worker.
+
+Usage (from the repo root, with Dropbox credentials (or STORAGE_BACKEND) in the environment or secrets.json):
+    python tools/rebuild_aggregates.py
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.aggregates import kpis, rebuild_aggregates  # noqa: E402
+from utils.data_utils import load_authoritative_observations  # noqa: E402
+from utils.storage import init_storage  # noqa: E402
+
+
+def main():
+    storage = init_storage()
+    if storage is None:
+        sys.exit("Storage is not configured")
+    df = load_authoritative_observations(storage)
+    if df is None or df.empty:
+        sys.exit("No observations found; nothing to aggregate")
+    # Reloaded inside the rebuild, after the aggregates' rev was read (see rebuild_aggregates)
+    agg = rebuild_aggregates(storage, load=lambda: load_authoritative_observations(storage))
+    print(f"Rebuilt aggregates from {len(df)} rows: {kpis(agg)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+"""Pre-aggregated dashboard tables.
+
+The dashboard's species, observer and social-behaviour charts and its KPI cards only need a few
+counters, so they are kept in a small JSON document on Dropbox instead of being recomputed from
+every observation on every page load. Each delivered submission adds just its own rows, so the
+document's size and the cost of an update do not grow with the data. Applying a submission again
+is a no-op as long as it is among the last RECENT_SUBMISSIONS applied, which covers the outbox's
+retries; `rebuild_aggregates` recomputes everything from the observations and is the recovery
+path (see tools/rebuild_aggregates.py).
+"""
+import json
+import threading
+import time
+
+import pandas as pd
+
+from utils.data_utils import (
+    OBSERVATION_TTL_SECONDS,
+    _record_mirror,
+    get_observation_store,
+    sync_file,
+    update_remote_json,
+)
+from utils.storage import Conflict, NotFound, get_storage
+
+
+AGGREGATES_PATH = "/observations/aggregates.json"
+AGGREGATES_VERSION = 2
+# How many applied submission ids are remembered to make re-applying one a no-op
+RECENT_SUBMISSIONS = 1000
+REBUILD_ATTEMPTS = 5
+
+
+def empty_aggregates():
+    return {
+        "version": AGGREGATES_VERSION,
+        "species": {},           # scientific_name -> rows
+        "observers": {},         # observer -> distinct submissions
+        "social_behaviour": {},  # social_behaviour value -> rows
+        "total_bees": 0,         # sum of num_males + num_females
+        "total_submissions": 0,  # distinct submissions
+        "recent_submissions": [],  # ids of the last RECENT_SUBMISSIONS applied, oldest first
+    }
+
+
+def _upgrade(agg):
+    """Bring a version 1 document (which listed every applied submission id) up to date in place."""
+    if agg.get("version") == 1:
+        submissions = agg.pop("submissions", [])
+        agg["total_submissions"] = len(submissions)
+        agg["recent_submissions"] = submissions[-RECENT_SUBMISSIONS:]
+        agg["version"] = AGGREGATES_VERSION
+    return agg
+
+
+def _labels(series):
+    # Missing and empty values are reported as "Unknown", as the charts always have
+    return series.astype(object).where(series.notna() & (series.astype(str).str.strip() != ""), "Unknown").astype(str)
+
+
+def _submission_ids(rows):
+    ids = rows["submission_id"] if "submission_id" in rows.columns else pd.Series(None, index=rows.index, dtype=object)
+    if "obs_id" in rows.columns:
+        ids = ids.where(ids.notna() & (ids.astype(str) != ""), rows["obs_id"])
+    return ids.astype(object)
+
+
+def _add_counts(target, counts):
+    for key, value in counts.items():
+        target[key] = target.get(key, 0) + int(value)
+
+
+def apply_rows(agg, rows, recent=None):
+    """Add observation rows to `agg` in place, skipping submissions among the recently applied.
+    Returns the number of rows applied. `recent` overrides which ids are remembered as the
+    recently applied ones (by default the new ids in the order they appear in `rows`).
+    """
+    _upgrade(agg)
+    if rows.empty:
+        return 0
+    ids = _submission_ids(rows)
+    new = ids.notna() & ~ids.isin(agg["recent_submissions"])
+    rows, ids = rows[new], ids[new]
+    if rows.empty:
+        return 0
+
+    if "scientific_name" in rows.columns:
+        _add_counts(agg["species"], _labels(rows["scientific_name"]).value_counts())
+    if "social_behaviour" in rows.columns:
+        _add_counts(agg["social_behaviour"], _labels(rows["social_behaviour"]).value_counts())
+    if "observer" in rows.columns:
+        per_submission = pd.DataFrame({"observer": _labels(rows["observer"]), "id": ids}).drop_duplicates("id")
+        _add_counts(agg["observers"], per_submission["observer"].value_counts())
+    for c in ("num_males", "num_females"):
+        if c in rows.columns:
+            agg["total_bees"] += int(pd.to_numeric(rows[c], errors="coerce").fillna(0).sum())
+    new_ids = ids.unique().tolist()
+    agg["total_submissions"] += len(new_ids)
+    agg["recent_submissions"] = (agg["recent_submissions"] + (new_ids if recent is None else list(recent)))[-RECENT_SUBMISSIONS:]
+    return len(rows)
+
+
+def _latest_submission_ids(df, limit=RECENT_SUBMISSIONS):
+    """Ids of the `limit` most recently submitted submissions in `df`, oldest first."""
+    ids = _submission_ids(df)
+    if "submission_time" not in df.columns:
+        return ids.dropna().unique().tolist()[-limit:]
+    times = pd.to_datetime(df["submission_time"], errors="coerce")
+    latest = times.groupby(ids, dropna=True).max().dropna()
+    return latest.nlargest(limit).sort_values(kind="stable").index.tolist()
+
+
+def build_aggregates(df):
+    """Aggregates of a full observations frame."""
+    agg = empty_aggregates()
+    apply_rows(agg, df, recent=_latest_submission_ids(df) if not df.empty else [])
+    return agg
+
+
+def kpis(agg):
+    """The dashboard's KPI cards: total submissions, unique observers, bees observed."""
+    return {
+        "total_submissions": agg["total_submissions"],
+        "unique_observers": len(agg["observers"]),
+        "total_bees": agg["total_bees"],
+    }
+
+
+def count_table(agg, name, key_label, value_label):
+    """One of the count tables as a DataFrame sorted by count (largest first)."""
+    counts = pd.Series(agg.get(name, {}), dtype="int64").sort_values(ascending=False)
+    return pd.DataFrame({key_label: counts.index.astype(str), value_label: counts.to_numpy()})
+
+
+class _NoAggregates(Exception):
+    """The remote aggregates are missing or unreadable, so there is nothing to add rows to."""
+
+
+def _no_aggregates():
+    raise _NoAggregates()
+
+
+def apply_submission(storage, rows):
+    """Fold one delivered submission's rows into the remote aggregates (safe to repeat).
+
+    Without a usable remote document the aggregates are rebuilt from all observations instead
+    (the submission's segment is already published, so its rows are counted too); starting from
+    an empty document would count only this submission from then on.
+    """
+    try:
+        update_remote_json(storage, AGGREGATES_PATH, lambda agg: apply_rows(agg, rows), _no_aggregates)
+    except _NoAggregates:
+        rebuild_aggregates(storage)
+    invalidate_aggregates()
+
+
+def _reload_store():
+    store = get_observation_store()
+    store.invalidate()
+    return store.get()
+
+
+def rebuild_aggregates(storage, load=None, attempts=REBUILD_ATTEMPTS):
+    """Recompute the aggregates from all observations, upload them and return them.
+
+    `load()` returns the observations (by default a fresh load of the shared store). It is called
+    after the aggregates' rev was read and the upload is conditional on that rev, so a submission
+    applied meanwhile is never counted out: on a conflict everything is loaded and recomputed again.
+    """
+    for _ in range(attempts):
+        rev = None
+        if storage is not None:
+            try:
+                rev = storage.get_metadata(AGGREGATES_PATH).rev
+            except NotFound:
+                rev = None
+        rows = load() if load is not None else _reload_store()
+        agg = build_aggregates(rows)
+        if storage is not None:
+            data = json.dumps(agg, indent=1).encode("utf-8")
+            try:
+                md = storage.upload(AGGREGATES_PATH, data, rev=rev, add=rev is None)
+            except Conflict:
+                # A submission was applied meanwhile
+                continue
+            _record_mirror(AGGREGATES_PATH, data, md.rev, md.content_hash)
+        invalidate_aggregates()
+        return agg
+    raise RuntimeError(f"Could not update {AGGREGATES_PATH} (too many concurrent writers)")
+
+
+# ---- Process-wide cached copy ----
+
+_CACHE = {"value": None, "revision": None, "checked_at": None}
+_CACHE_LOCK = threading.Lock()
+_REBUILDING = threading.Lock()
+
+
+def _rebuild_in_background(storage):
+    if not _REBUILDING.acquire(blocking=False):
+        return
+
+    def _run():
+        try:
+            rebuild_aggregates(storage)
+        except Exception:
+            pass
+        finally:
+            _REBUILDING.release()
+
+    threading.Thread(target=_run, name="aggregates-rebuild", daemon=True).start()
+
+
+def invalidate_aggregates():
+    """Make the next `get_aggregates` re-check Dropbox instead of waiting for the TTL."""
+    with _CACHE_LOCK:
+        _CACHE["checked_at"] = None
+
+
+def get_aggregates(ttl=OBSERVATION_TTL_SECONDS):
+    """Return (aggregates, revision). The remote rev is checked at most once per `ttl`; the JSON is
+    only downloaded when it changed. Without a remote copy the aggregates are computed from the
+    observations once and uploaded in the background.
+    """
+    storage = get_storage()
+    with _CACHE_LOCK:
+        now = time.monotonic()
+        if _CACHE["value"] is not None and _CACHE["checked_at"] is not None and now - _CACHE["checked_at"] < ttl:
+            return _CACHE["value"], _CACHE["revision"]
+        value, revision = None, None
+        if storage is not None:
+            try:
+                local_path, rev, changed = sync_file(storage, AGGREGATES_PATH)
+                if not changed and _CACHE["value"] is not None and _CACHE["revision"] == f"aggregates@{rev}":
+                    value, revision = _CACHE["value"], _CACHE["revision"]
+                else:
+                    with open(local_path) as f:
+                        value = json.load(f)
+                    revision = f"aggregates@{rev}"
+                if _upgrade(value).get("version") != AGGREGATES_VERSION:
+                    value = None
+            except Exception:
+                value = None
+        if value is None:
+            # No (usable) remote aggregates: compute them here and publish them off-thread
+            store = get_observation_store()
+            value, revision = build_aggregates(store.get()), f"observations@{store.revision}"
+            if storage is not None:
+                _rebuild_in_background(storage)
+        _CACHE.update(value=value, revision=revision, checked_at=now)
+        return value, revision
@@ -0,0 +1,163 @@
+"""Deployment configuration, resolved once per process and shared by every page.
+
+Settings come from Streamlit secrets first, then the environment, then secrets.json; observer
+passphrases from the OBSERVER_PASSPHRASES secret (a table or a JSON string), then the
+OBSERVER_PASSPHRASES environment variable (JSON), then data/observer_passphrases.csv.
+`get_config()` only stats the files behind those sources on each call and resolves everything
+again when one of them changed, so editing secrets.json or the passphrase CSV takes effect on the
+next rerun without a restart (and without re-reading anything on the reruns in between).
+"""
+import json
+import os
+import threading
+from collections.abc import Mapping
+
+import streamlit as st
+
+from utils.lazy import LazyModule
+
+# Only needed for the passphrase CSV fallback
+pd = LazyModule("pandas")
+
+
+SECRETS_JSON = "secrets.json"
+STREAMLIT_SECRETS_TOML = os.path.join(".streamlit", "secrets.toml")
+OBSERVER_PASSPHRASES_CSV = os.path.join("data", "observer_passphrases.csv")
+# Files whose change triggers a reload
+WATCHED_FILES = (SECRETS_JSON, STREAMLIT_SECRETS_TOML, OBSERVER_PASSPHRASES_CSV)
+
+
+def _read_secrets_json(path=SECRETS_JSON):
+    try:
+        with open(path) as f:
+            values = json.load(f)
+        return values if isinstance(values, dict) else {}
+    except Exception:
+        return {}
+
+
+def _passphrase_map(raw):
+    """{observer: passphrase} from a mapping or a JSON object string; {} if it is neither."""
+    if isinstance(raw, Mapping):
+        return {str(k): str(v) for k, v in raw.items()}
+    parsed = json.loads(str(raw))
+    if not isinstance(parsed, dict):
+        return {}
+    return {str(k): str(v) for k, v in parsed.items()}
+
+
+def _read_passphrase_csv(path):
+    """({observer: passphrase}, warning or None) from the CSV. Rows without a passphrase are
+    skipped, so those observers count as having none configured."""
+    pf = pd.read_csv(path, dtype=str)
+    col_map = {c.lower(): c for c in pf.columns}
+    pass_col = next((col_map[k] for k in col_map if "pass" in k or "phrase" in k), None)
+    obs_col = next((col_map[k] for k in col_map if "observer" in k), None)
+    if not (pass_col and obs_col):
+        return {}, f"{path} found but missing expected columns (observer, passphrase). Passphrase gating disabled."
+    observers = pf[obs_col].fillna("").str.strip()
+    phrases = pf[pass_col].fillna("").str.strip()
+    keep = (observers != "") & (phrases != "")
+    # later rows win, as before
+    return dict(zip(observers[keep].tolist(), phrases[keep].tolist())), None
+
+
+class Config:
+    """Resolved deployment settings. Typed fields for what the app uses; `setting(name)` for
+    anything else (same source order)."""
+
+    def __init__(self, secrets_json=None, revision=0, passphrase_csv=OBSERVER_PASSPHRASES_CSV):
+        self._secrets_json = secrets_json if secrets_json is not None else {}
+        self._settings = {}
+        self.revision = revision
+        # messages for the pages to show (e.g. malformed passphrase sources)
+        self.warnings = []
+
+        self.storage_backend = (self.setting("STORAGE_BACKEND") or "dropbox").strip().lower()
+        self.storage_dir = self.setting("STORAGE_DIR")
+        self.dropbox_app_key = self.setting("DROPBOX_APP_KEY")
+        self.dropbox_app_secret = self.setting("DROPBOX_APP_SECRET")
+        self.dropbox_refresh_token = self.setting("DROPBOX_REFRESH_TOKEN")
+        self.github_token = self.setting("GITHUB_TOKEN")
+        self.observer_hotel_csv_url = self.setting("OBSERVER_HOTEL_CSV_URL", "OBSERVER_HOTELS_URL")
+        self.species_csv_url = self.setting("SPECIES_CSV_URL", "SPECIES_LIST_URL")
+        self.observer_passphrases = self._resolve_passphrases(passphrase_csv)
+
+    def _from_secrets(self, name):
+        try:
+            return st.secrets.get(name)
+        except Exception:
+            # no secrets.toml
+            return None
+
+    def setting(self, *names):
+        """The first value of any of `names`: Streamlit secrets first, then the environment, then
+        secrets.json (None if unset)."""
+        key = names
+        if key in self._settings:
+            return self._settings[key]
+        value = None
+        for source in (self._from_secrets, os.environ.get, self._secrets_json.get):
+            value = next((v for v in map(source, names) if v), None)
+            if value:
+                break
+        self._settings[key] = value
+        return value
+
+    def _resolve_passphrases(self, csv_path):
+        # 1) Streamlit secrets (a table, or a JSON string)
+        raw = self._from_secrets("OBSERVER_PASSPHRASES")
+        if raw:
+            try:
+                passphrases = _passphrase_map(raw)
+                if passphrases:
+                    return passphrases
+            except Exception:
+                pass
+        # 2) Environment variable (JSON string)
+        env_val = os.environ.get("OBSERVER_PASSPHRASES")
+        if env_val:
+            try:
+                passphrases = _passphrase_map(env_val)
+                if passphrases:
+                    return passphrases
+            except Exception:
+                self.warnings.append("Environment variable OBSERVER_PASSPHRASES is not valid JSON. Falling back to CSV.")
+        # 3) CSV fallback
+        if os.path.exists(csv_path):
+            try:
+                passphrases, warning = _read_passphrase_csv(csv_path)
+                if warning:
+                    self.warnings.append(warning)
+                return passphrases
+            except Exception as e:
+                self.warnings.append(f"Failed to read {csv_path}: {e}. Passphrase gating disabled.")
+        return {}
+
+
+def _files_signature(paths=WATCHED_FILES):
+    signature = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            signature.append((stat.st_mtime_ns, stat.st_size))
+        except OSError:
+            signature.append(None)
+    return tuple(signature)
+
+
+_CONFIG = None
+_CONFIG_SIGNATURE = None
+_CONFIG_LOCK = threading.Lock()
+
+
+def get_config():
+    """Return the process-wide Config, resolved again if a watched file changed since."""
+    global _CONFIG, _CONFIG_SIGNATURE
+    signature = _files_signature()
+    with _CONFIG_LOCK:
+        if _CONFIG is None or signature != _CONFIG_SIGNATURE:
+            revision = _CONFIG.revision + 1 if _CONFIG is not None else 0
+            _CONFIG = Config(_read_secrets_json(), revision)
+            _CONFIG_SIGNATURE = signature
+        return _CONFIG
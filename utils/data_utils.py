@@ -0,0 +1,1238 @@
+import os
+import csv
+import json
+import re
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, time as dt_time
+from io import BytesIO, StringIO
+
+import pandas as pd
+import streamlit as st
+
+from utils.lazy import LazyModule
+from utils.storage import Conflict, FileInfo, NotFound, StorageError, dropbox_content_hash, get_storage
+
+# Only needed when reading or writing Parquet snapshots
+pa = LazyModule("pyarrow")
+pq = LazyModule("pyarrow.parquet")
+
+
+# ---- Paths ----
+MASTER_PATH = "/observations/observations.csv"
+MASTER_CANDIDATES = [MASTER_PATH, "/observations.csv", "/observations/observations_master.csv"]
+PIECES_FOLDER = "/observations/csv"
+PHOTOS_FOLDER = "/observations/photos"
+LOCAL_DATA_FILE = "observations.csv"
+
+# Local cache area (never committed); MIRROR_DIR mirrors remote Dropbox paths
+CACHE_DIR = ".cache"
+MIRROR_DIR = os.path.join(CACHE_DIR, "mirror")
+
+# Parquet snapshot of the master (typed, column-projectable); the CSV stays the export format
+SNAPSHOT_PATH = "/observations/observations.parquet"
+SNAPSHOT_DIR = os.path.join(CACHE_DIR, "snapshots")
+SNAPSHOT_HASH_KEY = b"bee_business.master_content_hash"
+CATEGORY_COLUMNS = ["observer", "hotel_code", "nest_hole", "scientific_name"]
+COUNT_COLUMNS = ["num_males", "num_females", "num_cells", "num_unknowns"]
+
+# Append-only submission log (see "Append-only segment log" below)
+SEGMENTS_FOLDER = "/observations/segments"
+SEGMENT_MANIFEST_PATH = f"{SEGMENTS_FOLDER}/manifest.json"
+LOCAL_SEGMENTS_DIR = "observations_segments"
+# Compact once this many segments are pending, or the oldest pending one is this old
+SEGMENT_COMPACT_THRESHOLD = 25
+SEGMENT_COMPACT_MAX_AGE_SECONDS = 3600
+
+# One CSV per hotel ("shard"), each with its own rev; the master is derived from them
+SHARDS_FOLDER = "/observations/hotels"
+SHARD_MANIFEST_PATH = f"{SHARDS_FOLDER}/manifest.json"
+
+# Background folding of the legacy /observations/csv pieces (cursor + folded names persisted here)
+PIECES_STATE_PATH = "/observations/pieces_state.json"
+PIECES_COMPACT_INTERVAL_SECONDS = 900
+# Maximum simultaneous downloads when fetching many small files (pieces, segments)
+PIECE_FETCH_CONCURRENCY = 8
+
+# How long (seconds) a loaded copy of the master is served before its rev is checked again.
+# A check is one metadata call; the master is only downloaded when the rev has changed.
+OBSERVATION_TTL_SECONDS = 60
+
+
+def safe_read_csv(path):
+    """Read a CSV path safely. If a ParserError occurs, move the broken file to a backup and return empty DataFrame."""
+    if not os.path.exists(path):
+        return pd.DataFrame()
+    try:
+        return pd.read_csv(path)
+    except pd.errors.ParserError:
+        # Backup the malformed file and continue with empty DataFrame
+        ts = datetime.now().strftime("%Y%m%d_%H%M%S")
+        backup = f"{path}.broken_{ts}.bak"
+        try:
+            shutil.move(path, backup)
+            st.warning(f"Existing {path} was malformed and moved to {backup}. Starting fresh.")
+        except Exception as mv_err:
+            st.error(f"Failed to move malformed {path}: {mv_err}")
+        return pd.DataFrame()
+    except Exception as e:
+        st.warning(f"Failed to read {path}: {e}")
+        return pd.DataFrame()
+
+
+_SEGMENT_LOCK = threading.Lock()
+_COMPACT_LOCK = threading.Lock()
+_PIECES_LOCK = threading.Lock()
+_LAST_PIECES_RUN = None
+
+
+def list_folder_entries(storage, folder_path):
+    """Return every entry in a storage folder, following `has_more` pagination."""
+    res = storage.list_folder(folder_path)
+    entries = list(res.entries)
+    while res.has_more:
+        res = storage.list_folder_continue(res.cursor)
+        entries.extend(res.entries)
+    return entries
+
+
+# ---- Local mirror of remote files (keyed by Dropbox rev / content_hash) ----
+
+def _mirror_paths(remote_path):
+    local_path = os.path.join(MIRROR_DIR, *remote_path.strip("/").split("/"))
+    return local_path, f"{local_path}.meta.json"
+
+
+def read_mirror_meta(remote_path):
+    """Return the recorded {"rev", "content_hash"} of the local mirror of `remote_path` ({} if none)."""
+    _, meta_path = _mirror_paths(remote_path)
+    try:
+        with open(meta_path) as f:
+            return json.load(f)
+    except Exception:
+        return {}
+
+
+def _write_atomic(path, data):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def _record_mirror(remote_path, data, rev, content_hash):
+    local_path, meta_path = _mirror_paths(remote_path)
+    if data is not None:
+        _write_atomic(local_path, data)
+    _write_atomic(meta_path, json.dumps({"rev": rev, "content_hash": content_hash}).encode("utf-8"))
+
+
+def _local_content_hash(local_path):
+    try:
+        with open(local_path, "rb") as f:
+            return dropbox_content_hash(f.read())
+    except Exception:
+        return None
+
+
+def sync_file(storage, remote_path, md=None):
+    """Make the local mirror of `remote_path` match Dropbox, downloading only when it changed.
+
+    A metadata call is compared against the mirror's recorded rev (and, failing that,
+    the content hash of the mirrored bytes). Returns (local_path, rev, changed); raises if the
+    remote file is missing or unreachable. Pass `md` if the metadata was already fetched.
+    """
+    md = md or storage.get_metadata(remote_path)
+    rev = md.rev
+    remote_hash = md.content_hash
+    local_path, _ = _mirror_paths(remote_path)
+    meta = read_mirror_meta(remote_path)
+
+    if os.path.exists(local_path):
+        if rev and meta.get("rev") == rev:
+            return local_path, rev, False
+        # Same bytes under a new rev (e.g. a no-op overwrite elsewhere): just record the rev
+        if remote_hash and _local_content_hash(local_path) == remote_hash:
+            _record_mirror(remote_path, None, rev, remote_hash)
+            return local_path, rev, False
+
+    _, data = storage.download(remote_path)
+    _record_mirror(remote_path, data, rev, remote_hash)
+    return local_path, rev, True
+
+
+def upload_file(storage, remote_path, data, rev=None, add=False):
+    """Overwrite `remote_path` with `data` unless Dropbox already holds identical content.
+    Returns True if an upload happened. The local mirror is kept in step either way.
+    If `rev` is given the upload only succeeds while the remote file is still at that rev;
+    with `add` only if the file does not exist yet.
+    """
+    content_hash = dropbox_content_hash(data)
+    try:
+        md = storage.get_metadata(remote_path)
+        if md.content_hash == content_hash:
+            _record_mirror(remote_path, data, md.rev, content_hash)
+            return False
+    except Exception:
+        # Missing remote file (or metadata unavailable): upload below
+        pass
+    md = storage.upload(remote_path, data, rev=rev, add=add)
+    _record_mirror(remote_path, data, md.rev, content_hash)
+    return True
+
+
+# ---- Typed schema & Parquet snapshot ----
+
+def _is_datetime(series):
+    return pd.api.types.is_datetime64_any_dtype(series)
+
+
+def _parse_time(value):
+    if isinstance(value, dt_time):
+        return value
+    if value is None or (isinstance(value, float) and pd.isna(value)):
+        return None
+    try:
+        return dt_time.fromisoformat(str(value).strip())
+    except Exception:
+        return None
+
+
+def normalize_observations(df):
+    """Coerce an observations frame to the canonical typed schema (safe to call repeatedly):
+    - `obs_date` and `submission_time` as datetimes, `obs_time` as `datetime.time`
+    - count columns as nullable integers
+    - observer / hotel_code / nest_hole / scientific_name as categoricals
+    """
+    if df.empty:
+        return df
+    out = df.copy()
+    if "obs_date" in out.columns and not _is_datetime(out["obs_date"]):
+        out["obs_date"] = pd.to_datetime(out["obs_date"], errors="coerce").dt.normalize()
+    if "submission_time" in out.columns and not _is_datetime(out["submission_time"]):
+        out["submission_time"] = pd.to_datetime(out["submission_time"], errors="coerce")
+    if "obs_time" in out.columns:
+        # parse each distinct value once; there are far fewer distinct times than rows
+        mapping = {v: _parse_time(v) for v in out["obs_time"].dropna().unique()}
+        out["obs_time"] = out["obs_time"].map(mapping).astype(object)
+    for c in COUNT_COLUMNS:
+        if c in out.columns and str(out[c].dtype) != "Int64":
+            out[c] = pd.to_numeric(out[c], errors="coerce").round().astype("Int64")
+    for c in CATEGORY_COLUMNS:
+        if c in out.columns and not isinstance(out[c].dtype, pd.CategoricalDtype):
+            col = out[c]
+            out[c] = col.where(col.isna(), col.astype(str)).astype("category")
+    return out
+
+
+def observations_to_csv_bytes(df):
+    """Export a (typed or raw) observations frame in the CSV layout used by the master."""
+    out = df.copy()
+    if "obs_date" in out.columns and _is_datetime(out["obs_date"]):
+        out["obs_date"] = out["obs_date"].dt.strftime("%Y-%m-%d")
+    if "submission_time" in out.columns and _is_datetime(out["submission_time"]):
+        out["submission_time"] = out["submission_time"].dt.strftime("%Y-%m-%d %H:%M:%S")
+    return out.to_csv(index=False, quoting=csv.QUOTE_MINIMAL).encode("utf-8")
+
+
+def observations_to_parquet_bytes(df, master_hash=None):
+    """Serialise `df` to Parquet using the typed schema. `master_hash` records the content
+    hash of the CSV the snapshot was built from, so readers can tell whether it is current.
+    """
+    out = normalize_observations(df)
+    # Free-text columns may mix types across seasons (e.g. True and ""); store them as strings
+    for c in out.columns:
+        if out[c].dtype == object and c != "obs_time":
+            out[c] = out[c].where(out[c].isna(), out[c].astype(str))
+    table = pa.Table.from_pandas(out, preserve_index=False)
+    if master_hash:
+        metadata = dict(table.schema.metadata or {})
+        metadata[SNAPSHOT_HASH_KEY] = master_hash.encode("utf-8")
+        table = table.replace_schema_metadata(metadata)
+    sink = pa.BufferOutputStream()
+    pq.write_table(table, sink)
+    return sink.getvalue().to_pybytes()
+
+
+def read_snapshot(path, columns=None, expected_hash=None):
+    """Read a Parquet snapshot, loading only `columns` when given.
+    Returns None if the file is missing, unreadable, or was not built from `expected_hash`.
+    """
+    try:
+        schema = pq.read_schema(path)
+        if expected_hash is not None:
+            built_from = (schema.metadata or {}).get(SNAPSHOT_HASH_KEY, b"").decode("utf-8")
+            if built_from != expected_hash:
+                return None
+        if columns is not None:
+            columns = [c for c in columns if c in schema.names]
+        return pq.read_table(path, columns=columns).to_pandas()
+    except Exception:
+        return None
+
+
+def _local_snapshot_path(master_path):
+    name = os.path.splitext(master_path.strip("/").replace("/", "__"))[0]
+    return os.path.join(SNAPSHOT_DIR, f"{name}.parquet")
+
+
+def load_master_snapshot(storage, master_path=MASTER_PATH, columns=None, md=None):
+    """Return (typed DataFrame, rev) for a remote master without text parsing where possible:
+    1. the local snapshot, if it was built from the master's current content hash
+    2. the remote snapshot next to the master, if it was built from the same content
+    3. otherwise the CSV (via the mirror), parsed once and re-snapshotted locally
+    """
+    md = md or storage.get_metadata(master_path)
+    rev = md.rev
+    master_hash = md.content_hash
+
+    local_snapshot = _local_snapshot_path(master_path)
+    df = read_snapshot(local_snapshot, columns, expected_hash=master_hash) if master_hash else None
+    if df is None and master_hash and master_path == MASTER_PATH:
+        try:
+            remote_local, _, _ = sync_file(storage, SNAPSHOT_PATH)
+            df = read_snapshot(remote_local, columns, expected_hash=master_hash)
+        except Exception:
+            df = None
+    if df is not None:
+        return df, rev
+
+    local_csv, rev, _ = sync_file(storage, master_path, md=md)
+    full = normalize_observations(pd.read_csv(local_csv))
+    try:
+        _write_atomic(local_snapshot, observations_to_parquet_bytes(full, master_hash or _local_content_hash(local_csv)))
+    except Exception:
+        pass
+    if columns is not None:
+        full = full[[c for c in columns if c in full.columns]]
+    return full, rev
+
+
+def read_remote_master(storage, master_path=MASTER_PATH):
+    """Return the typed master at `master_path` (snapshot or mirror), or None if unavailable."""
+    try:
+        df, _ = load_master_snapshot(storage, master_path)
+        return df
+    except Exception:
+        return None
+
+
+def upload_master(storage, df, rev=None, add=False):
+    """Upload `df` as the authoritative master CSV plus its Parquet snapshot.
+    Either upload is skipped when the remote copy is identical. With `rev`, the master upload
+    fails (raises) if someone else replaced the master since that rev was read; with `add`, if a
+    master exists at all.
+    """
+    csv_bytes = observations_to_csv_bytes(df)
+    uploaded = upload_file(storage, MASTER_PATH, csv_bytes, rev=rev, add=add)
+    try:
+        parquet_bytes = observations_to_parquet_bytes(df, dropbox_content_hash(csv_bytes))
+        _write_atomic(_local_snapshot_path(MASTER_PATH), parquet_bytes)
+        upload_file(storage, SNAPSHOT_PATH, parquet_bytes)
+    except Exception:
+        # The CSV is authoritative; a missing snapshot only costs readers a text parse
+        pass
+    return uploaded
+
+
+# ---- Parallel fetching of many small files ----
+
+def download_many(storage, paths, max_workers=PIECE_FETCH_CONCURRENCY):
+    """Download `paths` through a bounded thread pool. Yields (path, bytes) in input order;
+    bytes is None for files that could not be downloaded.
+    """
+    def _fetch(path):
+        try:
+            _, data = storage.download(path)
+            return data
+        except Exception:
+            return None
+
+    with ThreadPoolExecutor(max_workers=max(1, int(max_workers))) as pool:
+        yield from zip(paths, pool.map(_fetch, paths))
+
+
+def fetch_pieces(storage, names, folder=PIECES_FOLDER, max_workers=PIECE_FETCH_CONCURRENCY):
+    """Fetch the named CSV pieces concurrently and parse them straight into column buffers,
+    building one DataFrame at the end rather than one tiny frame per piece.
+    Values are kept as text (empty cells become missing); `normalize_observations` types them.
+    """
+    columns = {}
+    n_rows = 0
+    paths = [f"{folder}/{name}" for name in names]
+    for _, content in download_many(storage, paths, max_workers):
+        if not content:
+            continue
+        try:
+            reader = csv.DictReader(StringIO(content.decode("utf-8")))
+            for row in reader:
+                for key, value in row.items():
+                    if key is None:
+                        # surplus fields on a malformed line
+                        continue
+                    col = columns.get(key)
+                    if col is None:
+                        col = columns[key] = [None] * n_rows
+                    col.append(value if value != "" else None)
+                n_rows += 1
+                for col in columns.values():
+                    if len(col) < n_rows:
+                        col.append(None)
+        except Exception:
+            # skip malformed remote pieces
+            continue
+    return pd.DataFrame(columns)
+
+
+def dedupe_observations(df):
+    """Deduplicate by `obs_id`, keeping the row with the latest `submission_time`."""
+    if df.empty or "obs_id" not in df.columns:
+        return df
+    combined = df
+    if "submission_time" in combined.columns:
+        try:
+            st_col = combined["submission_time"]
+            # typed frames already carry datetimes; only raw text needs parsing
+            if not _is_datetime(st_col):
+                st_col = pd.to_datetime(st_col, errors="coerce")
+            combined = combined.assign(__st=st_col)
+            # sort ascending so drop_duplicates(keep='last') keeps the most recent
+            combined = combined.sort_values("__st", na_position="first", kind="stable")
+        except Exception:
+            pass
+    try:
+        combined = combined.drop_duplicates(subset=["obs_id"], keep="last").reset_index(drop=True)
+    except Exception:
+        combined = combined.drop_duplicates(subset=["obs_id"]).reset_index(drop=True)
+    if "__st" in combined.columns:
+        combined = combined.drop(columns=["__st"])
+    return combined
+
+
+def upsert_observations(base_df, new_df):
+    """Merge `new_df` into an already deduplicated `base_df` by `obs_id` (latest `submission_time`
+    wins, as in `dedupe_observations`). Only base rows sharing an obs_id with the new rows take part
+    in the deduplication; the rest are kept as they are, so a few new rows cost O(len(base)) rather
+    than a sort of everything.
+    """
+    new_df = normalize_observations(new_df)
+    if new_df.empty:
+        return base_df
+    if base_df.empty or "obs_id" not in base_df.columns or "obs_id" not in new_df.columns:
+        parts = [p for p in (base_df, new_df) if not p.empty]
+        return dedupe_observations(normalize_observations(pd.concat(parts, ignore_index=True, sort=False)))
+    overlap = base_df["obs_id"].isin(new_df["obs_id"])
+    merged = dedupe_observations(_concat_typed([base_df[overlap], new_df]))
+    return normalize_observations(_concat_typed([base_df[~overlap], merged]))
+
+
+def _concat_typed(frames):
+    """Concatenate typed frames, widening categoricals to their shared categories first so they
+    stay categorical instead of decaying to object (which would mean re-typing every row).
+    """
+    frames = [f for f in frames if not f.empty]
+    for c in CATEGORY_COLUMNS:
+        if len(frames) > 1 and all(isinstance(f[c].dtype, pd.CategoricalDtype) for f in frames if c in f.columns):
+            categories = frames[0][c].cat.categories if c in frames[0].columns else pd.Index([])
+            for f in frames[1:]:
+                if c in f.columns:
+                    categories = categories.append(f[c].cat.categories.difference(categories))
+            frames = [f.assign(**{c: f[c].cat.set_categories(categories)}) if c in f.columns else f for f in frames]
+    return pd.concat(frames, ignore_index=True, sort=False) if frames else pd.DataFrame()
+
+
+def load_observations_with_source(storage, known_revision=None):
+    """Like `load_authoritative_observations`, but for the shared store.
+
+    Returns (df, source, revision) where source is "master" or "local" and revision
+    identifies the data that was read. If the master's rev equals `known_revision`, df is None:
+    the caller's copy is still current and nothing was downloaded or parsed.
+    """
+    # If no Dropbox, fall back to local file plus the local segment log
+    if storage is None:
+        local_manifest = _read_json(os.path.join(LOCAL_SEGMENTS_DIR, "manifest.json"), _empty_manifest())
+        base = normalize_observations(safe_read_csv(LOCAL_DATA_FILE))
+        return _with_segments(base, read_segments(None, _pending_names(local_manifest))), "local", None
+
+    # Pending segments are part of the data, so their manifest rev is part of the revision
+    try:
+        manifest_md = storage.get_metadata(SEGMENT_MANIFEST_PATH)
+        manifest_rev = manifest_md.rev
+    except Exception:
+        manifest_md, manifest_rev = None, None
+
+    def _pending_segments():
+        if manifest_md is None:
+            return pd.DataFrame()
+        manifest, _ = read_remote_manifest(storage, md=manifest_md)
+        return read_segments(storage, _pending_names(manifest))
+
+    # Try master locations first (a metadata call, plus a snapshot/download only when the rev changed)
+    for p in MASTER_CANDIDATES:
+        try:
+            md = storage.get_metadata(p)
+            revision = f"{p}@{md.rev}+segments@{manifest_rev}"
+            if known_revision is not None and revision == known_revision:
+                return None, "master", revision
+            df, _ = load_master_snapshot(storage, p, md=md)
+            if not df.empty:
+                # Pick up pieces written by older clients, at most every few minutes, off-thread
+                start_piece_compaction(storage)
+                return _with_segments(df, _pending_segments()), "master", revision
+        except Exception:
+            continue
+
+    # No usable master: rebuild it from the per-observation pieces in the background and serve
+    # what is available locally meanwhile; the store is invalidated once the rebuild lands
+    start_piece_compaction(storage, force=True)
+    base = normalize_observations(safe_read_csv(LOCAL_DATA_FILE))
+    return _with_segments(base, _pending_segments()), "local", None
+
+
+def load_authoritative_observations(storage):
+    """Return authoritative observations DataFrame:
+    - If a remote master exists (preferred), return it (downloaded only if its rev changed).
+    - Otherwise, start a background rebuild from the CSVs under `/observations/csv/`.
+    - Meanwhile (or if Dropbox not available) fall back to local `observations.csv`.
+    Pending segments from the submission log are included in every case.
+    """
+    df, _, _ = load_observations_with_source(storage)
+    return df
+
+
+def raw_link(url):
+    """Turn a Dropbox share link into one that serves the file itself (raw=1)."""
+    if not isinstance(url, str) or not url:
+        return url
+    return url.replace('?dl=0', '?raw=1').replace('?dl=1', '?raw=1').replace('&dl=0', '&raw=1').replace('&dl=1', '&raw=1')
+
+
+def upload_submission_photo(storage, submission_id, file_name, photo_bytes, extra_files=()):
+    """Upload the photo for a submission (once, however many holes it covers) and return a
+    raw share link to it. Photos are named `{submission_id}_{file_name}` so they can also be
+    found again by submission_id. `extra_files` ((path, bytes) pairs, e.g. the original of a
+    recompressed photo) are committed in the same batch.
+    """
+    photo_path = f"{PHOTOS_FOLDER}/{submission_id}_{file_name}"
+    storage.upload_many([(photo_path, photo_bytes)] + list(extra_files))
+    return raw_link(storage.shared_link(photo_path))
+
+
+# ---- Append-only segment log ----
+# Each submission is written once as a small immutable CSV segment plus a manifest entry.
+# Readers combine the master with the pending segments; compaction folds them into the master.
+
+def _empty_manifest():
+    return {"segments": []}
+
+
+def _read_json(path, default):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except Exception:
+        return default
+
+
+def segment_name(hotel_code, submission_id, when=None):
+    """Segment file name: sortable timestamp, then the hotel and submission it holds."""
+    when = when or datetime.now()
+    return f"{when:%Y%m%dT%H%M%S%f}_{hotel_code}_{submission_id}.csv"
+
+
+def _manifest_entry(name, rows):
+    return {"name": name, "rows": int(rows), "created": datetime.now().isoformat(timespec="seconds")}
+
+
+def _pending_names(manifest):
+    return [s.get("name") for s in manifest.get("segments", []) if s.get("name")]
+
+
+def write_local_segment(rows_df, hotel_code, submission_id, local_dir=LOCAL_SEGMENTS_DIR, name=None):
+    """Write `rows_df` as a new local segment and list it in the local manifest. Returns its name.
+    Pass a previously chosen `name` to make retries rewrite the same segment instead of adding one.
+    """
+    name = name or segment_name(hotel_code, submission_id)
+    _write_atomic(os.path.join(local_dir, name), observations_to_csv_bytes(rows_df))
+    manifest_path = os.path.join(local_dir, "manifest.json")
+    with _SEGMENT_LOCK:
+        manifest = _read_json(manifest_path, _empty_manifest())
+        if name not in _pending_names(manifest):
+            manifest["segments"].append(_manifest_entry(name, len(rows_df)))
+            _write_atomic(manifest_path, json.dumps(manifest, indent=1).encode("utf-8"))
+    return name
+
+
+def read_remote_manifest(storage, md=None):
+    """Return (manifest, rev) of the remote segment manifest, via the local mirror."""
+    try:
+        local_path, rev, _ = sync_file(storage, SEGMENT_MANIFEST_PATH, md=md)
+        with open(local_path) as f:
+            return json.load(f), rev
+    except Exception:
+        return _empty_manifest(), None
+
+
+def update_remote_json(storage, remote_path, mutate, empty, attempts=5):
+    """Read-modify-write a small JSON file on Dropbox. Uploads are conditional on the rev that was
+    read, so concurrent writers never overwrite each other's changes; on a conflict we re-read and
+    retry. `empty()` supplies the document when the file does not exist yet.
+    """
+    for _ in range(attempts):
+        try:
+            md = storage.get_metadata(remote_path)
+        except Exception:
+            doc, rev = empty(), None
+        else:
+            rev = md.rev
+            try:
+                local_path, _, _ = sync_file(storage, remote_path, md=md)
+                with open(local_path) as f:
+                    doc = json.load(f)
+            except Exception:
+                # unreadable: replace it
+                doc = empty()
+        mutate(doc)
+        data = json.dumps(doc, indent=1).encode("utf-8")
+        try:
+            md = storage.upload(remote_path, data, rev=rev, add=rev is None)
+        except Conflict:
+            # Someone else updated the file first
+            continue
+        _record_mirror(remote_path, data, md.rev, md.content_hash)
+        return doc
+    raise RuntimeError(f"Could not update {remote_path} (too many concurrent writers)")
+
+
+def update_remote_manifest(storage, mutate, attempts=5):
+    """Read-modify-write the remote segment manifest (see `update_remote_json`)."""
+    return update_remote_json(storage, SEGMENT_MANIFEST_PATH, mutate, _empty_manifest, attempts)
+
+
+def publish_segment(storage, name, local_dir=LOCAL_SEGMENTS_DIR):
+    """Upload a local segment to Dropbox and list it in the remote manifest (safe to repeat)."""
+    with open(os.path.join(local_dir, name), "rb") as f:
+        data = f.read()
+    remote_path = f"{SEGMENTS_FOLDER}/{name}"
+    md = storage.upload(remote_path, data)
+    _record_mirror(remote_path, data, md.rev, md.content_hash)
+    rows = max(data.count(b"\n") - 1, 0)
+
+    def _add(manifest):
+        if name not in _pending_names(manifest):
+            manifest.setdefault("segments", []).append(_manifest_entry(name, rows))
+
+    update_remote_manifest(storage, _add)
+
+
+def read_segments(storage, names, local_dir=LOCAL_SEGMENTS_DIR):
+    """Return the rows of the named segments as one frame. Segments never change once written,
+    so each is downloaded at most once and then served from the mirror (or the local log).
+    """
+    local_paths = {}
+    missing = []
+    for name in names:
+        remote_path = f"{SEGMENTS_FOLDER}/{name}"
+        mirror_path, _ = _mirror_paths(remote_path)
+        own_copy = os.path.join(local_dir, name)
+        if os.path.exists(mirror_path):
+            local_paths[name] = mirror_path
+        elif os.path.exists(own_copy):
+            local_paths[name] = own_copy
+        elif storage is not None:
+            missing.append(remote_path)
+    # Fetch everything not cached yet in parallel
+    for remote_path, content in download_many(storage, missing) if missing else ():
+        if content is not None:
+            _record_mirror(remote_path, content, None, None)
+            local_paths[remote_path.rsplit("/", 1)[-1]] = _mirror_paths(remote_path)[0]
+
+    frames = []
+    for name in names:
+        if name not in local_paths:
+            continue
+        try:
+            frames.append(pd.read_csv(local_paths[name]))
+        except Exception:
+            continue
+    if not frames:
+        return pd.DataFrame()
+    return pd.concat(frames, ignore_index=True, sort=False)
+
+
+def _with_segments(base_df, segments_df):
+    if segments_df.empty:
+        return base_df
+    return upsert_observations(base_df, segments_df)
+
+
+def _drop_from_local_manifest(names, local_dir=LOCAL_SEGMENTS_DIR):
+    manifest_path = os.path.join(local_dir, "manifest.json")
+    folded = set(names)
+    with _SEGMENT_LOCK:
+        manifest = _read_json(manifest_path, None)
+        if not manifest:
+            return
+        manifest["segments"] = [s for s in manifest.get("segments", []) if s.get("name") not in folded]
+        _write_atomic(manifest_path, json.dumps(manifest, indent=1).encode("utf-8"))
+
+
+def compact_segments(storage, local_path=LOCAL_DATA_FILE, local_dir=LOCAL_SEGMENTS_DIR):
+    """Fold pending segments into the hotel shards and the master and remove them from the manifest.
+
+    With Dropbox, shard and master uploads are conditional on the revs that were read, so a
+    concurrent compaction cannot silently drop rows; the loser simply tries again later.
+    Without Dropbox, the local log is folded into `local_path`. Returns the number of segments folded.
+    """
+    if not _COMPACT_LOCK.acquire(blocking=False):
+        # Another compaction is already running in this process
+        return 0
+    try:
+        if storage is None:
+            names = _pending_names(_read_json(os.path.join(local_dir, "manifest.json"), _empty_manifest()))
+            if not names:
+                return 0
+            base = normalize_observations(safe_read_csv(local_path))
+            combined = _with_segments(base, read_segments(None, names, local_dir))
+            _write_atomic(local_path, observations_to_csv_bytes(combined))
+            _drop_from_local_manifest(names, local_dir)
+            return len(names)
+
+        manifest, _ = read_remote_manifest(storage)
+        names = _pending_names(manifest)
+        if not names:
+            return 0
+        try:
+            master_md = storage.get_metadata(MASTER_PATH)
+            base, master_rev = load_master_snapshot(storage, MASTER_PATH, md=master_md)
+        except Exception:
+            # No readable master: it has to be rebuilt by reconciliation (which includes the
+            # legacy per-observation pieces) before segments can be folded into it
+            return 0
+        segments_df = read_segments(storage, names, local_dir)
+        if read_shard_manifest(storage) is None:
+            # First compaction with shards: split the whole master into them
+            combined = _with_segments(base, segments_df)
+            write_shards(storage, combined)
+        else:
+            # Upsert the rows into the shards of the hotels they belong to, then derive the
+            # master from those shards and the unchanged rows of every other hotel
+            combined = derive_master(base, update_shards(storage, segments_df), segments_df)
+        upload_master(storage, combined, rev=master_rev)
+
+        folded = set(names)
+
+        def _drop(m):
+            m["segments"] = [s for s in m.get("segments", []) if s.get("name") not in folded]
+
+        update_remote_manifest(storage, _drop)
+        try:
+            _write_atomic(local_path, observations_to_csv_bytes(combined))
+        except Exception:
+            pass
+        _drop_from_local_manifest(names, local_dir)
+        return len(names)
+    finally:
+        _COMPACT_LOCK.release()
+
+
+def _compaction_due(manifest):
+    segments = manifest.get("segments", [])
+    if len(segments) >= SEGMENT_COMPACT_THRESHOLD:
+        return True
+    try:
+        oldest = min(datetime.fromisoformat(s["created"]) for s in segments if s.get("created"))
+    except ValueError:
+        # no dated segments
+        return False
+    return (datetime.now() - oldest).total_seconds() >= SEGMENT_COMPACT_MAX_AGE_SECONDS
+
+
+def maybe_compact_segments(storage, local_dir=LOCAL_SEGMENTS_DIR):
+    """Start a background compaction if enough segments (or old enough ones) are pending.
+    Returns True if a compaction was started.
+    """
+    if storage is None:
+        manifest = _read_json(os.path.join(local_dir, "manifest.json"), _empty_manifest())
+    else:
+        manifest, _ = read_remote_manifest(storage)
+    if not _compaction_due(manifest):
+        return False
+
+    def _run():
+        try:
+            if compact_segments(storage, local_dir=local_dir):
+                invalidate_observation_stores()
+        except Exception:
+            # Pending segments stay readable; the next submission retries compaction
+            pass
+
+    threading.Thread(target=_run, name="segment-compaction", daemon=True).start()
+    return True
+
+
+# ---- Per-hotel shards ----
+# Every hotel's observations are also kept in their own CSV under SHARDS_FOLDER, so reading one
+# hotel (the portal's prefill, a hotel's history or export) touches only that file. Segment
+# compaction upserts new rows into the shards of the hotels they belong to and derives the master
+# from them. The shard manifest lists the hotels; until it exists the master is the only copy.
+
+def shard_path(hotel_code):
+    """Remote path of a hotel's shard (characters unsafe in file names become '-')."""
+    safe = re.sub(r"[^A-Za-z0-9._-]", "-", str(hotel_code)).strip(".") or "-"
+    return f"{SHARDS_FOLDER}/{safe}.csv"
+
+
+def segment_hotel(name):
+    """Hotel code recorded in a segment name (see `segment_name`), or None."""
+    parts = name[:-len(".csv")].split("_") if name.endswith(".csv") else []
+    if len(parts) < 3:
+        return None
+    # the timestamp and submission_id never contain "_", the hotel code might
+    return "_".join(parts[1:-1]) or None
+
+
+def _empty_shard_manifest():
+    return {"hotels": {}}
+
+
+def read_shard_manifest(storage, md=None):
+    """Return the shard manifest ({"hotels": {hotel_code: {"path", "rows"}}}), or None if the
+    observations have not been sharded yet."""
+    try:
+        local_path, _, _ = sync_file(storage, SHARD_MANIFEST_PATH, md=md)
+        with open(local_path) as f:
+            manifest = json.load(f)
+        return manifest if isinstance(manifest.get("hotels"), dict) else None
+    except Exception:
+        return None
+
+
+def _hotel_groups(df):
+    if df.empty or "hotel_code" not in df.columns:
+        return {}
+    return {str(h): g for h, g in df.groupby(df["hotel_code"].astype(object), sort=False, dropna=True)}
+
+
+def _record_shards(storage, counts):
+    def _update(manifest):
+        hotels = manifest.setdefault("hotels", {})
+        for hotel, rows in counts.items():
+            hotels[hotel] = {"path": shard_path(hotel), "rows": int(rows)}
+
+    update_remote_json(storage, SHARD_MANIFEST_PATH, _update, _empty_shard_manifest)
+
+
+def write_shards(storage, df, hotels=None):
+    """Write the shards of `hotels` (all hotels in `df` if None) from `df` and list them in the
+    shard manifest. Shards whose content is unchanged are not uploaded again.
+    """
+    groups = _hotel_groups(df)
+    if hotels is not None:
+        groups = {h: groups.get(h, df.iloc[0:0]) for h in map(str, hotels)}
+    for hotel, rows in groups.items():
+        upload_file(storage, shard_path(hotel), observations_to_csv_bytes(rows))
+    _record_shards(storage, {h: len(rows) for h, rows in groups.items()})
+
+
+def read_shard(storage, hotel_code, md=None):
+    """Return (typed DataFrame, rev) of one hotel's shard; empty with rev None if it does not exist."""
+    try:
+        local_path, rev, _ = sync_file(storage, shard_path(hotel_code), md=md)
+    except Exception:
+        return pd.DataFrame(), None
+    return normalize_observations(pd.read_csv(local_path)), rev
+
+
+def update_shards(storage, rows_df):
+    """Upsert `rows_df` into the shards of the hotels it covers. Each upload is conditional on the
+    shard's rev that was read (raises Conflict if another writer got there first). Returns
+    {hotel_code: new shard DataFrame}.
+    """
+    updated = {}
+    for hotel, rows in _hotel_groups(normalize_observations(rows_df)).items():
+        base, rev = read_shard(storage, hotel)
+        shard = upsert_observations(base, rows)
+        data = observations_to_csv_bytes(shard)
+        md = storage.upload(shard_path(hotel), data, rev=rev, add=rev is None)
+        _record_mirror(shard_path(hotel), data, md.rev, md.content_hash)
+        updated[hotel] = shard
+    if updated:
+        _record_shards(storage, {h: len(df) for h, df in updated.items()})
+    return updated
+
+
+def derive_master(base_df, shards, rows_df=None):
+    """The master: every hotel in `shards` ({hotel_code: DataFrame}) taken from its shard, every
+    other row from `base_df`; rows of `rows_df` without a hotel_code are upserted directly.
+    """
+    if "hotel_code" in base_df.columns and shards:
+        keep = base_df[~base_df["hotel_code"].astype(object).isin(list(shards))]
+    else:
+        keep = base_df
+    combined = normalize_observations(_concat_typed([keep] + list(shards.values())))
+    if rows_df is not None and not rows_df.empty and "hotel_code" in rows_df.columns:
+        combined = upsert_observations(combined, rows_df[rows_df["hotel_code"].isna()])
+    return combined
+
+
+def load_hotel_observations(storage, hotel_code, known_revision=None):
+    """Like `load_observations_with_source`, for one hotel: its shard plus the pending segments
+    submitted for it. Returns (df, source, revision); df is None if `known_revision` is current.
+    Before the observations are sharded (or without storage) the hotel's rows of the shared
+    store are served instead.
+    """
+    hotel_code = str(hotel_code)
+
+    def _from_store():
+        store = get_observation_store()
+        df = store.get()
+        if not df.empty and "hotel_code" in df.columns:
+            df = df[df["hotel_code"].astype(object) == hotel_code].reset_index(drop=True)
+        return df, "master", f"store:{store.revision}"
+
+    if storage is None:
+        return _from_store()
+    try:
+        manifest_md = storage.get_metadata(SHARD_MANIFEST_PATH)
+    except Exception:
+        return _from_store()
+    try:
+        shard_md = storage.get_metadata(shard_path(hotel_code))
+        shard_rev = shard_md.rev
+    except StorageError:
+        # Sharded, but nothing was ever recorded for this hotel
+        shard_md, shard_rev = None, None
+    try:
+        segments_md = storage.get_metadata(SEGMENT_MANIFEST_PATH)
+        segments_rev = segments_md.rev
+    except Exception:
+        segments_md, segments_rev = None, None
+
+    revision = f"{shard_path(hotel_code)}@{shard_rev}+segments@{segments_rev}"
+    if known_revision is not None and revision == known_revision:
+        return None, "shard", revision
+    if read_shard_manifest(storage, md=manifest_md) is None:
+        return _from_store()
+    base, _ = read_shard(storage, hotel_code, md=shard_md) if shard_md is not None else (pd.DataFrame(), None)
+    if segments_md is not None:
+        segments, _ = read_remote_manifest(storage, md=segments_md)
+        names = [n for n in _pending_names(segments) if segment_hotel(n) == hotel_code]
+        base = _with_segments(base, read_segments(storage, names))
+    return base, "shard", revision
+
+
+# ---- Background compaction of legacy per-observation pieces ----
+# Older submissions were stored as one CSV per nest hole under /observations/csv. A worker folds
+# new pieces into the master using a persisted list_folder cursor, so only entries added since the
+# last run are fetched and a missing master is rebuilt off the request thread.
+
+def list_folder_changes(storage, folder_path, cursor=None):
+    """Return (entries, cursor): everything in `folder_path` when `cursor` is None, otherwise only
+    the changes since `cursor`. An expired cursor falls back to a full listing.
+    """
+    try:
+        if cursor:
+            res = storage.list_folder_continue(cursor)
+        else:
+            res = storage.list_folder(folder_path)
+    except StorageError:
+        if not cursor:
+            raise
+        # cursor expired; start over
+        res = storage.list_folder(folder_path)
+    entries = list(res.entries)
+    while res.has_more:
+        res = storage.list_folder_continue(res.cursor)
+        entries.extend(res.entries)
+    return entries, res.cursor
+
+
+def read_pieces_state(storage):
+    """Return the persisted compaction state: {"cursor": ..., "folded": [piece names]}."""
+    state = None
+    try:
+        local_path, _, _ = sync_file(storage, PIECES_STATE_PATH)
+        state = _read_json(local_path, None)
+    except Exception:
+        # Fall back to whatever this process last wrote
+        local_path, _ = _mirror_paths(PIECES_STATE_PATH)
+        state = _read_json(local_path, None)
+    if not isinstance(state, dict):
+        state = {}
+    state.setdefault("cursor", None)
+    state.setdefault("folded", [])
+    return state
+
+
+def write_pieces_state(storage, state):
+    data = json.dumps(state).encode("utf-8")
+    try:
+        upload_file(storage, PIECES_STATE_PATH, data)
+    except Exception:
+        # Keep at least a local copy; the next run re-lists from the remote state if it exists
+        local_path, _ = _mirror_paths(PIECES_STATE_PATH)
+        _write_atomic(local_path, data)
+
+
+def _observations_outside_master(storage):
+    """Every row stored somewhere other than the master: all hotel shards and every segment
+    (folded or still pending). Raises StorageError unless all of it could be read, so a partial
+    copy never stands in for a lost master.
+    """
+    frames = []
+    try:
+        manifest_md = storage.get_metadata(SHARD_MANIFEST_PATH)
+    except NotFound:
+        manifest_md = None
+    if manifest_md is not None:
+        local_path, _, _ = sync_file(storage, SHARD_MANIFEST_PATH, md=manifest_md)
+        with open(local_path) as f:
+            hotels = json.load(f).get("hotels", {})
+        for hotel in hotels:
+            try:
+                local_path, _, _ = sync_file(storage, shard_path(hotel))
+            except NotFound:
+                # listed, but never written
+                continue
+            frames.append(pd.read_csv(local_path))
+    try:
+        entries = list_folder_entries(storage, SEGMENTS_FOLDER)
+    except NotFound:
+        entries = []
+    paths = sorted(
+        e.path_lower for e in entries
+        if isinstance(e, FileInfo) and e.name.lower().endswith(".csv")
+    )
+    for path, content in download_many(storage, paths):
+        if content is None:
+            raise StorageError(f"Could not download {path}")
+        frames.append(pd.read_csv(BytesIO(content)))
+    if not frames:
+        return pd.DataFrame()
+    return dedupe_observations(normalize_observations(pd.concat(frames, ignore_index=True, sort=False)))
+
+
+def compact_pieces(storage):
+    """Fold per-observation CSVs added since the last run into the master. Returns the number
+    folded (at least 1 when a missing master was rebuilt).
+
+    If the master does not exist, the cursor is discarded and every piece is folded, together with
+    the hotel shards and segments, into a rebuilt master — in the caller's (background) thread,
+    never on a page load. The rebuilt master is only written if there still is none. Any other
+    failure to read the master leaves everything as it is until the next run.
+    """
+    if not _PIECES_LOCK.acquire(blocking=False):
+        return 0
+    try:
+        try:
+            master_md = storage.get_metadata(MASTER_PATH)
+        except NotFound:
+            master_md = None
+        except Exception:
+            # unreachable right now; a transient error must not look like a missing master
+            return 0
+        try:
+            if master_md is not None:
+                base, master_rev = load_master_snapshot(storage, MASTER_PATH, md=master_md)
+                state = read_pieces_state(storage)
+            else:
+                base, master_rev = _observations_outside_master(storage), None
+                state = {"cursor": None, "folded": []}
+        except Exception:
+            return 0
+
+        try:
+            entries, cursor = list_folder_changes(storage, PIECES_FOLDER, state["cursor"])
+        except StorageError:
+            # No pieces folder at all
+            if master_md is not None:
+                return 0
+            entries, cursor = [], None
+        folded = set(state["folded"])
+        new_names = sorted({
+            e.name for e in entries
+            if isinstance(e, FileInfo) and e.name.lower().endswith(".csv") and e.name not in folded
+        })
+
+        rebuilt = False
+        if new_names or master_md is None:
+            pieces_df = fetch_pieces(storage, new_names) if new_names else pd.DataFrame()
+            combined = _with_segments(base, pieces_df)
+            if not combined.empty:
+                try:
+                    upload_master(storage, combined, rev=master_rev, add=master_md is None)
+                except Conflict:
+                    # The master changed (or reappeared) meanwhile; fold on top of it next run
+                    return 0
+                rebuilt = master_md is None
+                if new_names and read_shard_manifest(storage) is not None:
+                    write_shards(storage, combined, hotels=_hotel_groups(pieces_df))
+            folded.update(new_names)
+
+        if cursor is not None:
+            write_pieces_state(storage, {"cursor": cursor, "folded": sorted(folded)})
+        return max(len(new_names), int(rebuilt))
+    finally:
+        _PIECES_LOCK.release()
+
+
+def start_piece_compaction(storage, force=False):
+    """Run `compact_pieces` in a background thread, at most once per PIECES_COMPACT_INTERVAL_SECONDS
+    unless `force` is set. Returns True if a run was started.
+    """
+    global _LAST_PIECES_RUN
+    if storage is None:
+        return False
+    now = time.monotonic()
+    if not force and _LAST_PIECES_RUN is not None and now - _LAST_PIECES_RUN < PIECES_COMPACT_INTERVAL_SECONDS:
+        return False
+    if _PIECES_LOCK.locked():
+        return False
+    _LAST_PIECES_RUN = now
+
+    def _run():
+        try:
+            if compact_pieces(storage):
+                invalidate_observation_stores()
+                # Folded pieces never went through the outbox, so recount the dashboard aggregates
+                from utils.aggregates import rebuild_aggregates
+                rebuild_aggregates(storage)
+        except Exception:
+            # The next run resumes from the last persisted cursor
+            pass
+
+    threading.Thread(target=_run, name="piece-compaction", daemon=True).start()
+    return True
+
+
+class ObservationStore:
+    """Process-wide, in-memory copy of the authoritative observations.
+
+    Every session shares one parsed DataFrame. When the copy is older than `ttl` seconds (or has
+    been invalidated), the next caller reloads it; concurrent callers wait for that single load
+    instead of each starting their own download. Callers must treat the returned frame as read-only.
+    """
+
+    def __init__(self, loader, ttl=OBSERVATION_TTL_SECONDS):
+        # loader(known_revision) -> (DataFrame or None if unchanged, source, revision)
+        self._loader = loader
+        self._ttl = ttl
+        self._df = None
+        self._source = None
+        self._loaded_at = 0.0
+        self._revision = None
+        self._loads = 0
+        self._generation = 0
+        self._stale = True
+        self._state_lock = threading.Lock()
+        self._load_lock = threading.Lock()
+
+    def _is_fresh(self):
+        return (
+            self._df is not None
+            and not self._stale
+            and (time.monotonic() - self._loaded_at) < self._ttl
+        )
+
+    @property
+    def revision(self):
+        """Identifies the data currently held (the master's Dropbox rev when it came from the master).
+        Changes whenever different data is loaded, so it can key derived caches."""
+        return self._revision
+
+    @property
+    def source(self):
+        return self._source
+
+    def get(self, columns=None):
+        """Return the shared (typed) observations, projected to `columns` if given."""
+        df = self._get_full()
+        if columns is None:
+            return df
+        return df[[c for c in columns if c in df.columns]]
+
+    def _get_full(self):
+        with self._state_lock:
+            if self._is_fresh():
+                return self._df
+
+        # Singleflight: only one caller loads; the rest block here and reuse its result
+        with self._load_lock:
+            with self._state_lock:
+                if self._is_fresh():
+                    return self._df
+                generation = self._generation
+                known_revision = self._revision if self._df is not None else None
+
+            try:
+                df, source, revision = self._loader(known_revision)
+            except Exception:
+                df, source, revision = None, None, None
+
+            with self._state_lock:
+                if isinstance(df, pd.DataFrame):
+                    self._loads += 1
+                    self._df = df
+                    self._source = source
+                    self._revision = revision or f"{source}#{self._loads}"
+                    # An invalidate() that raced with this load keeps the copy stale
+                    self._stale = generation != self._generation
+                elif df is None and revision is not None and revision == known_revision:
+                    # Remote rev unchanged: keep the parsed copy, only the freshness clock restarts
+                    self._stale = generation != self._generation
+                elif self._df is None:
+                    # First load failed; serve an empty frame until the TTL lets us retry
+                    self._df = pd.DataFrame()
+                    self._stale = False
+                self._loaded_at = time.monotonic()
+                return self._df
+
+    def invalidate(self):
+        """Force the next `get()` to reload, e.g. after a submission changed the master."""
+        with self._state_lock:
+            self._stale = True
+            self._generation += 1
+
+
+_STORE = None
+_STORE_LOCK = threading.Lock()
+
+
+def get_observation_store():
+    """Return the shared ObservationStore used by the dashboard and the data portal."""
+    global _STORE
+    with _STORE_LOCK:
+        if _STORE is None:
+            _STORE = ObservationStore(
+                lambda known_revision: load_observations_with_source(get_storage(), known_revision)
+            )
+        return _STORE
+
+
+_HOTEL_STORES = {}
+
+
+def get_hotel_store(hotel_code):
+    """Return the shared ObservationStore of one hotel's observations (its shard, see
+    `load_hotel_observations`)."""
+    hotel_code = str(hotel_code)
+    with _STORE_LOCK:
+        store = _HOTEL_STORES.get(hotel_code)
+        if store is None:
+            store = _HOTEL_STORES[hotel_code] = ObservationStore(
+                lambda known_revision: load_hotel_observations(get_storage(), hotel_code, known_revision)
+            )
+        return store
+
+
+def invalidate_observation_stores():
+    """Make the next read of the shared and every per-hotel store reload (after a write)."""
+    get_observation_store().invalidate()
+    with _STORE_LOCK:
+        stores = list(_HOTEL_STORES.values())
+    for store in stores:
+        store.invalidate()
@@ -0,0 +1,50 @@
+"""Dashboard Plotly figures, built once per data revision.
+
+Each figure is built from the pre-aggregated counts and kept as a plain figure spec (dict) for the
+revision it was built from, so a rerun that sees the same revision skips Plotly entirely.
+"""
+import threading
+
+from utils.lazy import LazyModule
+
+# Plotly is only imported once a figure actually has to be built
+px = LazyModule("plotly.express")
+
+
+# Bee-inspired palette (yellows and black)
+BEE_SCALE = ['#FFF1C9', '#F6C85F', '#E07A3C', '#B5651D', '#3A3A3A']
+
+_SPECS = {}  # figure name -> (revision, spec)
+_SPECS_LOCK = threading.Lock()
+
+
+def cached_figure(name, revision, build):
+    """Return the spec of figure `name` for `revision`, calling `build()` (which returns a Plotly
+    figure or None) only when the revision changed. Only the latest revision is kept per figure.
+    """
+    with _SPECS_LOCK:
+        cached = _SPECS.get(name)
+        if revision is not None and cached is not None and cached[0] == revision:
+            return cached[1]
+    fig = build()
+    spec = fig.to_dict() if fig is not None else None
+    with _SPECS_LOCK:
+        _SPECS[name] = (revision, spec)
+    return spec
+
+
+def count_bar(counts, label_col, value_col, value_label=None):
+    """Horizontal bar chart of a count table, largest at the top."""
+    labels = {value_col: value_label} if value_label else None
+    fig = px.bar(counts, x=value_col, y=label_col, orientation='h', color=value_col, color_continuous_scale=BEE_SCALE, labels=labels)
+    fig.update_layout(yaxis={'categoryorder': 'total ascending'}, coloraxis_showscale=False, plot_bgcolor='white', margin=dict(l=10, r=10, t=40, b=20))
+    return fig
+
+
+def share_pie(counts, label_col, value_col):
+    """Small donut chart of a count table."""
+    fig = px.pie(counts, names=label_col, values=value_col, hole=0.35, color=label_col, color_discrete_sequence=BEE_SCALE)
+    fig.update_traces(textposition='inside', textinfo='percent+label', hoverinfo='label+value')
+    fig.update_layout(margin=dict(l=10, r=10, t=10, b=10), showlegend=False)
+    return fig
+
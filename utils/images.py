@@ -0,0 +1,132 @@
+"""Image ingest for submission photos.
+
+Phone photos are converted (HEIC included), downscaled and recompressed into a size-capped
+archival JPEG before they are stored; the untouched original is kept alongside, together with
+small gallery thumbnails. Runs in the outbox worker, never on the request thread.
+"""
+import io
+import os
+
+_PILLOW = None
+
+
+def _pillow():
+    """Import Pillow (registering the HEIC opener) on first use; the pages only need the
+    constants and paths below. Returns (Image, ImageOps), or None if Pillow is missing.
+    """
+    global _PILLOW
+    if _PILLOW is None:
+        try:
+            from PIL import Image, ImageOps
+        except ImportError:  # Pillow missing: photos are stored exactly as uploaded
+            _PILLOW = False
+        else:
+            try:
+                from pillow_heif import register_heif_opener
+                register_heif_opener()
+            except ImportError:  # no HEIC decoding; HEIC photos are stored as uploaded
+                pass
+            _PILLOW = (Image, ImageOps)
+    return _PILLOW or None
+
+
+ORIGINALS_FOLDER = "/observations/originals"
+# File types accepted by the portal's photo uploader
+PHOTO_UPLOAD_TYPES = ["jpg", "jpeg", "png", "heic", "heif"]
+# Archival copy: long edge at most ARCHIVE_MAX_EDGE px; quality is lowered (down to
+# ARCHIVE_MIN_QUALITY) until the file fits ARCHIVE_MAX_BYTES
+ARCHIVE_MAX_EDGE = 2560
+ARCHIVE_MAX_BYTES = 1_500_000
+ARCHIVE_QUALITY = 85
+ARCHIVE_MIN_QUALITY = 60
+# Gallery thumbnails: one JPEG per width under THUMBS_FOLDER/w<width>/, named after the photo
+THUMBS_FOLDER = "/observations/thumbs"
+THUMB_WIDTHS = (320, 640)
+THUMB_QUALITY = 80
+
+
+def _open_upright(photo_bytes):
+    """Open an image, apply its EXIF orientation to the pixels and convert it to RGB."""
+    Image, ImageOps = _pillow()
+    img = Image.open(io.BytesIO(photo_bytes))
+    img = ImageOps.exif_transpose(img) or img
+    if img.mode != "RGB":
+        if img.mode in ("RGBA", "LA", "P"):
+            # flatten transparency onto white rather than black
+            rgba = img.convert("RGBA")
+            background = Image.new("RGB", rgba.size, (255, 255, 255))
+            background.paste(rgba, mask=rgba.getchannel("A"))
+            img = background
+        else:
+            img = img.convert("RGB")
+    return img
+
+
+def encode_jpeg(img, max_edge, max_bytes=None, quality=ARCHIVE_QUALITY, min_quality=ARCHIVE_MIN_QUALITY, exif=None):
+    """Downscale `img` to fit `max_edge` and encode it as JPEG, lowering the quality step by
+    step until the result fits `max_bytes` (if given). `exif` is written through unchanged.
+    """
+    Image, _ = _pillow()
+    img = img.copy()
+    img.thumbnail((max_edge, max_edge), Image.LANCZOS)
+    kwargs = {"exif": exif} if exif else {}
+    while True:
+        buf = io.BytesIO()
+        img.save(buf, format="JPEG", quality=quality, optimize=True, progressive=True, **kwargs)
+        data = buf.getvalue()
+        if max_bytes is None or len(data) <= max_bytes or quality <= min_quality:
+            return data
+        quality -= 5
+
+
+def _archival_from(img):
+    """An upright (see `_open_upright`), size-capped JPEG of `img` that keeps the original EXIF
+    (camera, timestamp, GPS) minus the orientation tag, which has been applied to the pixels.
+    """
+    exif = img.getexif()
+    return encode_jpeg(img, ARCHIVE_MAX_EDGE, ARCHIVE_MAX_BYTES, exif=exif.tobytes() if len(exif) else None)
+
+
+def thumbnail_path(photo_file_name, width):
+    """Dropbox path of the `width` px thumbnail for a file in the photos folder."""
+    return f"{THUMBS_FOLDER}/w{width}/{os.path.splitext(photo_file_name)[0]}.jpg"
+
+
+def _thumbnails_from(img, widths):
+    Image, _ = _pillow()
+    thumbs = {}
+    for width in widths:
+        thumb = img
+        if img.width > width:
+            thumb = img.resize((width, max(1, round(img.height * width / img.width))), Image.LANCZOS)
+        buf = io.BytesIO()
+        thumb.save(buf, format="JPEG", quality=THUMB_QUALITY, optimize=True, progressive=True)
+        thumbs[width] = buf.getvalue()
+    return thumbs
+
+
+def make_thumbnails(photo_bytes, widths=THUMB_WIDTHS):
+    """Return {width: JPEG bytes} of upright thumbnails no wider than each width (no EXIF)."""
+    return _thumbnails_from(_open_upright(photo_bytes), widths)
+
+
+def ingest_submission_photo(submission_id, photo_name, photo_bytes):
+    """Prepare a submission photo for upload.
+
+    Returns (display_name, display_bytes, extra_files): the archival JPEG that rows link to, and
+    the (path, bytes) of the original and the thumbnails to store next to it. If the image
+    cannot be decoded it is passed through unchanged and nothing extra is stored.
+    """
+    if _pillow() is None:
+        return photo_name, photo_bytes, []
+    try:
+        img = _open_upright(photo_bytes)
+        archival = _archival_from(img)
+        thumbs = _thumbnails_from(img, THUMB_WIDTHS)
+    except Exception:
+        return photo_name, photo_bytes, []
+    display_name = f"{os.path.splitext(photo_name)[0]}.jpg"
+    extra_files = [(f"{ORIGINALS_FOLDER}/{submission_id}_{photo_name}", photo_bytes)]
+    stored_name = f"{submission_id}_{display_name}"
+    extra_files += [(thumbnail_path(stored_name, width), data) for width, data in thumbs.items()]
+    return display_name, archival, extra_files
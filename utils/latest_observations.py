@@ -0,0 +1,102 @@
+"""Latest observation of every (hotel_code, nest_hole), for prefilling the portal's hole grid.
+
+The rows come from the observation database's (hotel_code, nest_hole, submission_time) index
+(see utils/observation_db.py). Whenever the selected hotel's shard (see `get_hotel_store`) changes
+revision, its rows are upserted into the database and that hotel's holes are looked up again, so
+the portal only ever reads one hotel's file, never the whole master. Submissions are applied as
+soon as they are enqueued, so the next visit prefills from them even while they are still waiting
+in the outbox; such rows are kept until the database holds them (or something newer).
+"""
+import threading
+
+import pandas as pd
+
+from utils.data_utils import get_hotel_store
+from utils.observation_db import get_observation_db
+
+
+def _submitted_at(row):
+    value = pd.to_datetime(row.get("submission_time"), errors="coerce")
+    return pd.Timestamp.min if pd.isna(value) else value
+
+
+class LatestObservationIndex:
+    """Process-wide index of the latest observation per hole, looked up again per hotel when that
+    hotel's shard or the database changes and updated in place on submit."""
+
+    def __init__(self):
+        self._by_hotel = {}
+        self._revisions = {}
+        # (hotel, hole) -> row submitted through this process, not yet in the database
+        self._submitted = {}
+        self._lock = threading.Lock()
+
+    def _put(self, hotel, hole, row):
+        # Latest submission_time wins; on a tie the row applied last does
+        current = self._by_hotel.get(hotel, {}).get(hole)
+        if current is not None and _submitted_at(current) > _submitted_at(row):
+            return False
+        self._by_hotel.setdefault(hotel, {})[hole] = row
+        return True
+
+    def _install(self, hotel, latest, revision):
+        """Make `latest` ({nest_hole: row}) the entry of `hotel`, keeping submitted rows it does
+        not cover yet."""
+        with self._lock:
+            self._by_hotel[hotel] = latest
+            self._revisions[hotel] = revision
+            for (submitted_hotel, hole), row in list(self._submitted.items()):
+                if submitted_hotel != hotel:
+                    continue
+                current = latest.get(hole)
+                if current is not None and _submitted_at(current) >= _submitted_at(row):
+                    # the database has caught up with this submission
+                    del self._submitted[(hotel, hole)]
+                else:
+                    latest[hole] = row
+
+    def sync(self, hotel_code, db=None):
+        """Look one hotel's holes up again if its shard or the database changed since; a new
+        shard revision is upserted into the database first."""
+        hotel_code = str(hotel_code)
+        db = db or get_observation_db(sync=False)
+        store = get_hotel_store(hotel_code)
+        df = store.get()
+        shard_revision = store.revision
+        with self._lock:
+            indexed = self._revisions.get(hotel_code)
+        if shard_revision is not None and indexed == (shard_revision, db.revision):
+            return
+        # Also after a rebuild of the database, which may predate the shard's rows
+        db.upsert(df)
+        self._install(hotel_code, db.latest_by_hole(hotel_code), (shard_revision, db.revision))
+
+    def apply_submission(self, rows):
+        """Apply submitted rows (a DataFrame or a list of dicts) straight away."""
+        records = rows.to_dict(orient="records") if isinstance(rows, pd.DataFrame) else list(rows)
+        with self._lock:
+            for row in records:
+                key = (str(row.get("hotel_code", "")), str(row.get("nest_hole", "")))
+                if self._put(*key, row):
+                    self._submitted[key] = row
+
+    def for_hotel(self, hotel_code, sync=True):
+        """{nest_hole: row} of the latest observation of every recorded hole of one hotel, first
+        brought up to the hotel's current shard unless `sync` is False."""
+        if sync:
+            self.sync(hotel_code)
+        with self._lock:
+            return dict(self._by_hotel.get(str(hotel_code), {}))
+
+
+_INDEX = None
+_INDEX_LOCK = threading.Lock()
+
+
+def get_latest_index():
+    """Return the shared LatestObservationIndex."""
+    global _INDEX
+    with _INDEX_LOCK:
+        if _INDEX is None:
+            _INDEX = LatestObservationIndex()
+        return _INDEX
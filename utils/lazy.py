@@ -0,0 +1,25 @@
+"""Deferred imports.
+
+Streamlit runs every page in one process, so whatever a module imports at the top is paid for on
+the first visit to *any* page that imports it. Heavy libraries that are only needed on some code
+paths (talking to Dropbox, writing Parquet, drawing charts) are bound to a `LazyModule` instead and
+imported the first time one of their attributes is used.
+"""
+import importlib
+
+
+class LazyModule:
+    """Stand-in for module `name`, imported on first attribute access.
+
+    The import goes through importlib (and its per-module locks), so concurrent first uses from
+    the page thread and a background worker are safe.
+    """
+
+    def __init__(self, name):
+        self._name = name
+
+    def __getattr__(self, attr):
+        return getattr(importlib.import_module(self._name), attr)
+
+    def __repr__(self):
+        return f"<lazy module {self._name!r}>"
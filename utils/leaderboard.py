@@ -0,0 +1,158 @@
+"""Observer activity leaderboard.
+
+Everything is derived from one table of distinct submissions per (observer, day), built once per
+data revision by a GROUP BY over the observation database's (observer, obs_date) index (or by
+`daily_submissions` from a DataFrame); each window (last 7 days, last 30 days, season to date) is a
+slice of that table, and streaks are computed once as runs of consecutive active days.
+"""
+import threading
+from datetime import date, timedelta
+from html import escape
+
+import pandas as pd
+
+
+# Window label -> number of days (None = season to date)
+LEADERBOARD_WINDOWS = {"Last 7 days": 7, "Last 30 days": 30, "Season to date": None}
+# The season runs July-June so a southern-hemisphere spring/summer is never split
+SEASON_START_MONTH = 7
+# Windows up to this many days get one star column per day
+MAX_DAY_COLUMNS = 31
+
+
+def daily_submissions(df):
+    """Distinct submissions per (observer, day) as a DataFrame with observer, day, submissions.
+    Rows without a submission_id are counted by obs_id.
+    """
+    if df.empty or "observer" not in df.columns or "obs_date" not in df.columns:
+        return pd.DataFrame(columns=["observer", "day", "submissions"])
+    ids = df["submission_id"] if "submission_id" in df.columns else pd.Series(None, index=df.index, dtype=object)
+    if "obs_id" in df.columns:
+        ids = ids.fillna(df["obs_id"])
+    frame = pd.DataFrame({
+        "observer": df["observer"].astype(object),
+        "day": pd.to_datetime(df["obs_date"], errors="coerce").dt.normalize(),
+        "submission": ids,
+    }).dropna()
+    return (
+        frame.groupby(["observer", "day"], sort=True)["submission"]
+        .nunique()
+        .rename("submissions")
+        .reset_index()
+    )
+
+
+def activity_runs(daily):
+    """Runs of consecutive active days per observer: observer, start, end, length."""
+    if daily.empty:
+        return pd.DataFrame(columns=["observer", "start", "end", "length"])
+    days = daily[["observer", "day"]].sort_values(["observer", "day"])
+    # a new run starts at an observer's first day or after any gap
+    new_run = (days["observer"] != days["observer"].shift()) | (days["day"].diff() != pd.Timedelta(days=1))
+    run_id = new_run.cumsum()
+    return (
+        days.groupby(run_id)
+        .agg(observer=("observer", "first"), start=("day", "min"), end=("day", "max"), length=("day", "size"))
+        .reset_index(drop=True)
+    )
+
+
+def window_start(window_days, today):
+    """First day of a window ending `today` (None = season to date)."""
+    if window_days is None:
+        year = today.year if today.month >= SEASON_START_MONTH else today.year - 1
+        return date(year, SEASON_START_MONTH, 1)
+    return today - timedelta(days=window_days - 1)
+
+
+def leaderboard_table(daily, runs, window_days, today):
+    """Leaderboard for the window ending `today`, sorted by submissions.
+
+    Columns: Total (distinct submissions), Active days, Current streak (consecutive active days
+    ending today or yesterday), Longest streak (within the window) and, for short windows, one
+    boolean column per day (oldest first) marking activity.
+    """
+    start = pd.Timestamp(window_start(window_days, today))
+    end = pd.Timestamp(today)
+    in_window = daily[(daily["day"] >= start) & (daily["day"] <= end)]
+    if in_window.empty:
+        return pd.DataFrame()
+    table = in_window.groupby("observer").agg(**{
+        "Total": ("submissions", "sum"),
+        "Active days": ("day", "size"),
+    })
+
+    # Days after `end` do not count: an obs_date can be ahead of the server's date (the portal
+    # takes the observer's local date), so cut every run off at `end`
+    runs = runs[runs["start"] <= end]
+    runs = runs.assign(end=runs["end"].clip(upper=end))
+    runs = runs.assign(length=(runs["end"] - runs["start"]).dt.days + 1)
+
+    # streaks: clip every run to the window, then take the longest per observer
+    overlap = runs[runs["end"] >= start]
+    clipped = (overlap["end"] - overlap["start"].clip(lower=start)).dt.days + 1
+    table["Longest streak"] = clipped.groupby(overlap["observer"]).max()
+    current = runs[runs["end"] >= end - pd.Timedelta(days=1)]
+    table["Current streak"] = current.groupby("observer")["length"].max()
+    table = table.fillna(0).astype(int)[["Total", "Active days", "Current streak", "Longest streak"]]
+
+    n_days = (end - start).days + 1
+    if n_days <= MAX_DAY_COLUMNS:
+        grid = in_window.pivot(index="observer", columns="day", values="submissions")
+        grid = grid.reindex(columns=pd.date_range(start, end, freq="D")).notna()
+        grid.columns = [d.strftime("%Y-%m-%d") for d in grid.columns]
+        table = table.join(grid)
+
+    return table.sort_values(["Total", "Active days"], ascending=False)
+
+
+_CACHE = {"key": None, "value": None}
+_CACHE_LOCK = threading.Lock()
+
+
+def get_activity(db):
+    """(daily, runs) from the observation database, computed once per data revision."""
+    revision = db.revision
+    with _CACHE_LOCK:
+        if revision is not None and _CACHE["key"] == revision:
+            return _CACHE["value"]
+    # the (observer, obs_date) index hands the rows over already grouped
+    daily = db.daily_submissions()
+    value = (daily, activity_runs(daily))
+    with _CACHE_LOCK:
+        _CACHE["key"], _CACHE["value"] = revision, value
+    return value
+
+
+def leaderboard_html(table):
+    """Render a leaderboard table as HTML: observer and stats columns, then a narrow star column
+    per day (full date shown on hover). Column widths follow Observer:stat:day = 5:2:1.
+    """
+    stat_cols = [c for c in ["Total", "Active days", "Current streak", "Longest streak"] if c in table.columns]
+    day_cols = [c for c in table.columns if c not in stat_cols]
+    total_ratio = 5 + 2 * len(stat_cols) + len(day_cols)
+    unit = 100.0 / total_ratio
+    obs_w = round(5 * unit, 2)
+    stat_w = round(2 * unit, 2)
+    day_w = round(1 * unit, 2)
+
+    html = ["<table style='width:100%;border-collapse:collapse;'>", "<thead><tr>"]
+    html.append(f"<th style='text-align:left;padding:8px;border-bottom:2px solid #ddd;width:{obs_w}%;'>Observer</th>")
+    for c in stat_cols:
+        html.append(f"<th style='text-align:center;padding:8px;border-bottom:2px solid #ddd;width:{stat_w}%;'>{c}</th>")
+    for c in day_cols:
+        # blank header, show full date on hover via title
+        html.append(f"<th title='{c}' style='text-align:center;padding:4px;border-bottom:2px solid #ddd;width:{day_w}%;'>&nbsp;</th>")
+    html.append("</tr></thead><tbody>")
+    star = "<span style='color:#FFD700;font-size:20px;line-height:1;'>★</span>"
+    for observer, row in zip(table.index, table.itertuples(index=False)):
+        html.append("<tr>")
+        html.append(f"<td style='text-align:left;padding:8px;border-bottom:1px solid #eee;font-weight:600;width:{obs_w}%;'>{escape(str(observer))}</td>")
+        values = dict(zip(table.columns, row))
+        for c in stat_cols:
+            html.append(f"<td style='text-align:center;padding:8px;border-bottom:1px solid #eee;width:{stat_w}%;'>{int(values[c])}</td>")
+        for c in day_cols:
+            html.append(f"<td style='text-align:center;padding:6px;border-bottom:1px solid #eee;width:{day_w}%;'>{star if values[c] else ''}</td>")
+        html.append("</tr>")
+    html.append("</tbody></table>")
+    return "".join(html)
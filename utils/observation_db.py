@@ -0,0 +1,311 @@
+"""Local SQLite copy of the observations, used as the query engine of the dashboard and portal.
+
+The table has one row per `obs_id` (a unique index), so writes are upserts: a row replaces the
+stored one only if its `submission_time` is not older, which is the same "latest submission wins"
+rule as `dedupe_observations`. Secondary indexes serve the questions the pages ask:
+
+    (hotel_code, nest_hole, submission_time)   latest observation of every hole of one hotel
+    (observer, obs_date)                       distinct submissions per observer and day
+    scientific_name                            the species recorded so far
+
+The database is a local cache. The shared copy stays the master CSV (and its Parquet snapshot)
+in storage, written periodically by segment compaction; `sync` keeps the database at the
+revision of the ObservationStore, upserting only pending segment rows when the master is unchanged.
+The portal also upserts the selected hotel's shard before asking for its holes (see
+utils/latest_observations.py), so it never has to wait for the whole master.
+"""
+import os
+import sqlite3
+import threading
+
+import pandas as pd
+
+from utils.data_utils import (
+    CACHE_DIR,
+    COUNT_COLUMNS,
+    _pending_names,
+    _is_datetime,
+    dedupe_observations,
+    get_observation_store,
+    normalize_observations,
+    read_remote_manifest,
+    read_segments,
+)
+from utils.storage import get_storage
+
+
+DB_PATH = os.path.join(CACHE_DIR, "observations.sqlite")
+# Bump when the table layout changes; an older database is rebuilt from the store
+SCHEMA_VERSION = "3"
+# Columns every database has (more are added as TEXT when a frame brings them)
+BASE_COLUMNS = [
+    "obs_id", "observer", "hotel_code", "obs_date", "obs_time", "nest_hole", "scientific_name",
+    "num_males", "num_females", "num_cells", "num_unknowns", "social_behaviour", "notes",
+    "submission_notes", "submission_id", "photo_link", "submission_time", "manually_checked",
+]
+INDEXES = {
+    "observations_obs_id": "UNIQUE INDEX IF NOT EXISTS observations_obs_id ON observations (obs_id)",
+    "observations_hotel_hole": "INDEX IF NOT EXISTS observations_hotel_hole ON observations (hotel_code, nest_hole, submission_time)",
+    "observations_observer_date": "INDEX IF NOT EXISTS observations_observer_date ON observations (observer, obs_date)",
+    "observations_species": "INDEX IF NOT EXISTS observations_species ON observations (scientific_name)",
+}
+
+
+def _quote(name):
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def _sql_values(df):
+    """Columns of `df` as lists of SQLite-storable values: dates and times as ISO text (so they
+    sort correctly), counts as integers, everything else as it is; missing values become NULL.
+    """
+    values = {}
+    for c in df.columns:
+        col = df[c]
+        if c == "obs_date" and _is_datetime(col):
+            col = col.dt.strftime("%Y-%m-%d")
+        elif c == "submission_time" and _is_datetime(col):
+            col = col.dt.strftime("%Y-%m-%d %H:%M:%S")
+        elif c == "obs_time":
+            # format each distinct time once
+            col = col.map({t: t.isoformat() if hasattr(t, "isoformat") else t for t in col.dropna().unique()})
+        col = col.astype(object)
+        values[c] = col.where(col.notna(), None).tolist()
+    return values
+
+
+def _master_part(revision):
+    # Store revisions look like "<master>@<rev>+segments@<manifest rev>"
+    return revision.split("+segments@", 1)[0] if revision else None
+
+
+def _persistable(revision):
+    # Revisions such as "local#3" are counters of this process and mean nothing after a restart
+    return revision if revision and "@" in revision else None
+
+
+class ObservationDB:
+    """The observations table in an SQLite file. Safe to share between threads: every thread gets
+    its own connection, writes are serialised, and readers see the last committed state (WAL), so
+    a rebuild never blocks the pages.
+    """
+
+    def __init__(self, path=DB_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._open()
+        self._revision = _persistable(self._get_meta("revision"))
+
+    # ---- connection & schema ----
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _open(self):
+        conn = self._conn()
+        with self._write_lock, conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            row = conn.execute("SELECT value FROM meta WHERE key = 'schema'").fetchone()
+            if row is None or row[0] != SCHEMA_VERSION:
+                conn.execute("DROP TABLE IF EXISTS observations")
+                conn.execute("DELETE FROM meta")
+            columns = ", ".join(
+                f"{_quote(c)} {'INTEGER' if c in COUNT_COLUMNS else 'TEXT'}" + (" NOT NULL" if c == "obs_id" else "")
+                for c in BASE_COLUMNS
+            )
+            conn.execute(f"CREATE TABLE IF NOT EXISTS observations ({columns})")
+            for ddl in INDEXES.values():
+                conn.execute(f"CREATE {ddl}")
+            conn.execute("INSERT OR REPLACE INTO meta VALUES ('schema', ?)", (SCHEMA_VERSION,))
+
+    def _columns(self, conn):
+        return [r[1] for r in conn.execute("PRAGMA table_info(observations)")]
+
+    def _add_columns(self, conn, columns):
+        known = self._columns(conn)
+        for c in columns:
+            if c not in known:
+                conn.execute(f"ALTER TABLE observations ADD COLUMN {_quote(c)} TEXT")
+
+    def _get_meta(self, key):
+        row = self._conn().execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    @property
+    def revision(self):
+        """The ObservationStore revision the table reflects (None before the first sync)."""
+        return self._revision
+
+    # ---- writes ----
+
+    def _upsert(self, conn, df):
+        self._add_columns(conn, df.columns)
+        columns = list(df.columns)
+        names = ", ".join(_quote(c) for c in columns)
+        updates = ", ".join(f"{_quote(c)} = excluded.{_quote(c)}" for c in columns if c != "obs_id")
+        # Same rule as dedupe_observations: the latest submission_time wins, a missing one loses,
+        # and between equal times the row written last wins
+        sql = (
+            f"INSERT INTO observations ({names}) VALUES ({', '.join('?' * len(columns))}) "
+            f"ON CONFLICT (obs_id) DO UPDATE SET {updates or 'obs_id = excluded.obs_id'}"
+        )
+        if "submission_time" in columns:
+            sql += " WHERE coalesce(excluded.submission_time, '') >= coalesce(observations.submission_time, '')"
+        values = _sql_values(df)
+        conn.executemany(sql, zip(*(values[c] for c in columns)))
+
+    def _bulk_insert(self, conn, df):
+        # Into an empty table: plain inserts without indexes, which are rebuilt once afterwards
+        # (much faster than maintaining every index row by row)
+        for name in INDEXES:
+            conn.execute(f"DROP INDEX IF EXISTS {name}")
+        self._add_columns(conn, df.columns)
+        columns = list(df.columns)
+        sql = f"INSERT INTO observations ({', '.join(_quote(c) for c in columns)}) VALUES ({', '.join('?' * len(columns))})"
+        values = _sql_values(df)
+        conn.executemany(sql, zip(*(values[c] for c in columns)))
+        for ddl in INDEXES.values():
+            conn.execute(f"CREATE {ddl}")
+
+    def _prepare(self, df):
+        if df is None or df.empty or "obs_id" not in df.columns:
+            return None
+        # Rows without an obs_id cannot be addressed by an upsert
+        df = normalize_observations(df[df["obs_id"].notna()])
+        return df if not df.empty else None
+
+    def _set_revision(self, conn, revision):
+        conn.execute("INSERT OR REPLACE INTO meta VALUES ('revision', ?)", (_persistable(revision),))
+        self._revision = revision
+
+    def upsert(self, df, revision=None):
+        """Insert or update the rows of `df` by obs_id. Records `revision` if given."""
+        df = self._prepare(df)
+        conn = self._conn()
+        with self._write_lock, conn:
+            if df is not None:
+                self._upsert(conn, df)
+            if revision is not None:
+                self._set_revision(conn, revision)
+
+    def replace(self, df, revision=None):
+        """Make the table hold exactly the rows of `df` (deduplicated by obs_id), in one transaction."""
+        df = self._prepare(df)
+        conn = self._conn()
+        with self._write_lock, conn:
+            conn.execute("DELETE FROM observations")
+            if df is not None:
+                self._bulk_insert(conn, dedupe_observations(df))
+            self._set_revision(conn, revision)
+
+    def sync(self, store=None, storage=None):
+        """Bring the table to the store's current revision. When only the pending segments changed,
+        just their rows are upserted; a new master (or local data) rebuilds the table, in a
+        background thread once there is a previous state to serve meanwhile. Only the very first
+        sync makes callers wait.
+        """
+        store = store or get_observation_store()
+        df = store.get()
+        revision = store.revision
+        if revision is not None and revision == self._revision:
+            return
+        if not self._sync_lock.acquire(blocking=False):
+            if self._revision is None:
+                with self._sync_lock:
+                    pass
+            return
+        background = False
+        try:
+            if (
+                storage is not None
+                and _persistable(revision)
+                and _master_part(revision) == _master_part(self._revision)
+            ):
+                manifest, _ = read_remote_manifest(storage)
+                self.upsert(read_segments(storage, _pending_names(manifest)), revision)
+            elif self._revision is not None:
+                # The rebuild thread releases the lock when it is done
+                threading.Thread(target=self._rebuild, args=(df, revision), name="observation-db-rebuild", daemon=True).start()
+                background = True
+            else:
+                self.replace(df, revision)
+        finally:
+            if not background:
+                self._sync_lock.release()
+
+    def _rebuild(self, df, revision):
+        try:
+            self.replace(df, revision)
+        except Exception:
+            # Keep serving the previous state; the next sync tries again
+            pass
+        finally:
+            self._sync_lock.release()
+
+    # ---- queries ----
+
+    def count(self):
+        return self._conn().execute("SELECT COUNT(*) FROM observations").fetchone()[0]
+
+    def latest_by_hole(self, hotel_code):
+        """{nest_hole: row dict} holding the most recent observation of every hole of one hotel.
+        Reads only that hotel's rows, through the (hotel_code, nest_hole, submission_time) index.
+        """
+        df = pd.read_sql_query(
+            "SELECT * FROM (SELECT *, ROW_NUMBER() OVER ("
+            "PARTITION BY nest_hole ORDER BY submission_time DESC, rowid DESC) AS _rank "
+            "FROM observations WHERE hotel_code = ?) WHERE _rank = 1",
+            self._conn(),
+            params=(str(hotel_code),),
+        )
+        if df.empty:
+            return {}
+        rows = normalize_observations(df.drop(columns="_rank")).to_dict(orient="records")
+        return {str(row["nest_hole"]): row for row in rows}
+
+    def species(self):
+        """Sorted distinct scientific names, read from the scientific_name index alone."""
+        rows = self._conn().execute(
+            "SELECT DISTINCT scientific_name FROM observations WHERE scientific_name IS NOT NULL"
+        )
+        return sorted({str(r[0]).strip() for r in rows} - {""})
+
+    def daily_submissions(self):
+        """Distinct submissions per (observer, day), like `leaderboard.daily_submissions`, grouped
+        in the (observer, obs_date) index order.
+        """
+        df = pd.read_sql_query(
+            "SELECT observer, obs_date AS day, COUNT(DISTINCT coalesce(submission_id, obs_id)) AS submissions "
+            "FROM observations WHERE observer IS NOT NULL AND obs_date IS NOT NULL "
+            "AND coalesce(submission_id, obs_id) IS NOT NULL "
+            "GROUP BY observer, obs_date ORDER BY observer, obs_date",
+            self._conn(),
+        )
+        df["observer"] = df["observer"].astype(object)
+        df["day"] = pd.to_datetime(df["day"], errors="coerce")
+        return df.dropna(subset=["day"]).reset_index(drop=True)
+
+
+_DB = None
+_DB_LOCK = threading.Lock()
+
+
+def get_observation_db(sync=True):
+    """Return the shared ObservationDB, first brought up to the store's revision unless `sync` is False."""
+    global _DB
+    with _DB_LOCK:
+        if _DB is None:
+            _DB = ObservationDB()
+    if sync:
+        _DB.sync(storage=get_storage())
+    return _DB
@@ -0,0 +1,210 @@
+"""Durable on-disk outbox for data-portal submissions.
+
+A submission is committed to `outbox/<submission_id>/` and acknowledged straight away. A background
+worker then uploads its photo and rows to Dropbox, retrying failures with exponential backoff, so
+what the observer waits for no longer depends on Dropbox latency.
+"""
+import os
+import json
+import random
+import shutil
+import threading
+import time
+
+import pandas as pd
+
+from utils.aggregates import apply_submission
+from utils.data_utils import (
+    invalidate_observation_stores,
+    maybe_compact_segments,
+    publish_segment,
+    segment_name,
+    upload_submission_photo,
+    write_local_segment,
+)
+from utils.images import ingest_submission_photo
+from utils.storage import get_storage
+
+
+OUTBOX_DIR = "outbox"
+# Retry delays grow as RETRY_BASE_SECONDS * 2**attempts (with jitter), capped at RETRY_MAX_SECONDS
+RETRY_BASE_SECONDS = 5
+RETRY_MAX_SECONDS = 15 * 60
+# After this many failed attempts a job is marked "failed" and waits for a manual retry
+MAX_ATTEMPTS = 10
+IDLE_POLL_SECONDS = 30
+
+_LOCK = threading.Lock()
+_WAKE = threading.Event()
+_WORKER = None
+
+
+def _job_dir(submission_id):
+    return os.path.join(OUTBOX_DIR, submission_id)
+
+
+def _read_meta(job_dir):
+    try:
+        with open(os.path.join(job_dir, "meta.json")) as f:
+            return json.load(f)
+    except Exception:
+        return None
+
+
+def _write_meta(job_dir, meta):
+    path = os.path.join(job_dir, "meta.json")
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(meta, f, indent=1)
+    os.replace(tmp, path)
+
+
+def _jobs():
+    """Yield (job_dir, meta) for every committed job in the outbox."""
+    try:
+        names = sorted(os.listdir(OUTBOX_DIR))
+    except FileNotFoundError:
+        return
+    for name in names:
+        job_dir = os.path.join(OUTBOX_DIR, name)
+        if name.endswith(".tmp") or not os.path.isdir(job_dir):
+            continue
+        meta = _read_meta(job_dir)
+        if meta:
+            yield job_dir, meta
+
+
+def enqueue_submission(rows, hotel_code, submission_id, photo_bytes=None, photo_name=None):
+    """Commit a submission to the outbox and wake the uploader. Returns once the job is on disk.
+
+    Everything that a retry needs is fixed here — obs_ids, the photo file name and the segment
+    name — so however often a job is retried it writes the same files and rows.
+    """
+    job_dir = _job_dir(submission_id)
+    staging = f"{job_dir}.tmp"
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+    pd.DataFrame(rows).to_csv(os.path.join(staging, "rows.csv"), index=False)
+    if photo_bytes:
+        with open(os.path.join(staging, "photo"), "wb") as f:
+            f.write(photo_bytes)
+    _write_meta(staging, {
+        "submission_id": submission_id,
+        "hotel_code": hotel_code,
+        "rows": len(rows),
+        "photo_name": photo_name if photo_bytes else None,
+        "photo_link": None,
+        "segment": segment_name(hotel_code, submission_id),
+        "status": "pending",
+        "attempts": 0,
+        "next_attempt_at": 0,
+        "last_error": None,
+    })
+    # Renaming the fully written directory is what commits the job
+    os.replace(staging, job_dir)
+    _WAKE.set()
+
+
+def outbox_status():
+    """Return {"pending": n, "failed": m} for the jobs still in the outbox."""
+    counts = {"pending": 0, "failed": 0}
+    for _, meta in _jobs():
+        counts["failed" if meta.get("status") == "failed" else "pending"] += 1
+    return counts
+
+
+def retry_failed():
+    """Put failed jobs back in the queue for immediate retry."""
+    with _LOCK:
+        for job_dir, meta in _jobs():
+            if meta.get("status") == "failed":
+                meta.update(status="pending", attempts=0, next_attempt_at=0)
+                _write_meta(job_dir, meta)
+    _WAKE.set()
+
+
+def process_job(storage, job_dir, meta):
+    """Upload one job: photo first (so rows can carry its link), then the submission segment,
+    then fold its rows into the dashboard aggregates.
+    """
+    photo_path = os.path.join(job_dir, "photo")
+    if storage is not None and meta.get("photo_name") and not meta.get("photo_link") and os.path.exists(photo_path):
+        with open(photo_path, "rb") as f:
+            photo_bytes = f.read()
+        # Convert/downscale here, in the worker, and keep the original next to the archival copy
+        name, data, extra_files = ingest_submission_photo(meta["submission_id"], meta["photo_name"], photo_bytes)
+        meta["photo_link"] = upload_submission_photo(storage, meta["submission_id"], name, data, extra_files)
+        # Remember the link so a later failure does not upload the photo again
+        _write_meta(job_dir, meta)
+
+    rows_df = pd.read_csv(os.path.join(job_dir, "rows.csv"), dtype=str, keep_default_na=False)
+    rows_df["photo_link"] = meta.get("photo_link") or ""
+    name = write_local_segment(rows_df, meta["hotel_code"], meta["submission_id"], name=meta["segment"])
+    if storage is not None:
+        publish_segment(storage, name)
+        apply_submission(storage, rows_df)
+
+
+def _backoff(attempts):
+    delay = min(RETRY_BASE_SECONDS * (2 ** attempts), RETRY_MAX_SECONDS)
+    return delay * random.uniform(0.8, 1.2)
+
+
+def drain_outbox(storage):
+    """Process every job that is due. Returns the number of seconds until the next job is due."""
+    next_due = IDLE_POLL_SECONDS
+    delivered = 0
+    for job_dir, meta in _jobs():
+        if meta.get("status") == "failed":
+            continue
+        wait = meta.get("next_attempt_at", 0) - time.time()
+        if wait > 0:
+            next_due = min(next_due, wait)
+            continue
+        try:
+            process_job(storage, job_dir, meta)
+        except Exception as e:
+            meta["attempts"] = meta.get("attempts", 0) + 1
+            meta["last_error"] = str(e)
+            if meta["attempts"] >= MAX_ATTEMPTS:
+                meta["status"] = "failed"
+            else:
+                # A rate-limited backend says how long to stay away
+                delay = max(_backoff(meta["attempts"]), getattr(e, "retry_after", None) or 0)
+                meta["next_attempt_at"] = time.time() + delay
+                next_due = min(next_due, delay)
+            _write_meta(job_dir, meta)
+            continue
+        shutil.rmtree(job_dir, ignore_errors=True)
+        delivered += 1
+
+    if delivered:
+        invalidate_observation_stores()
+        try:
+            maybe_compact_segments(storage)
+        except Exception:
+            pass
+    return next_due
+
+
+def _worker_loop():
+    while True:
+        # Clear before draining so an enqueue that lands mid-drain still wakes the next pass
+        _WAKE.clear()
+        try:
+            # Looked up every pass, so a backend rebuilt after a config change is picked up
+            wait = drain_outbox(get_storage())
+        except Exception:
+            wait = IDLE_POLL_SECONDS
+        _WAKE.wait(timeout=max(wait, 0.1))
+
+
+def start_outbox_worker():
+    """Start the process-wide uploader (once). Jobs left over from a previous process are resumed.
+    It uploads through `get_storage()`."""
+    global _WORKER
+    with _LOCK:
+        if _WORKER is None or not _WORKER.is_alive():
+            _WORKER = threading.Thread(target=_worker_loop, name="outbox-uploader", daemon=True)
+            _WORKER.start()
+    _WAKE.set()
@@ -0,0 +1,243 @@
+"""Catalog of submission photos in storage and a cache of their temporary links.
+
+Photos are stored as `{submission_id}_{file name}` (older ones as `{obs_id}_{file name}`), so the
+catalog indexes every file in the photos folder by the text before its first underscore. It is
+kept up to date from a stored list_folder cursor: after the first listing each refresh only
+fetches what changed. Temporary links (valid ~4 hours) are cached until shortly before they expire
+and are only requested for photos that are actually shown.
+"""
+import json
+import os
+import threading
+import time
+
+import pandas as pd
+
+from utils.data_utils import (
+    CACHE_DIR,
+    OBSERVATION_TTL_SECONDS,
+    PHOTOS_FOLDER,
+    _write_atomic,
+    list_folder_changes,
+    raw_link,
+)
+from utils.storage import DeletedInfo, FolderInfo, get_storage
+
+
+PHOTO_CATALOG_FILE = os.path.join(CACHE_DIR, "photo_catalog.json")
+# Dropbox temporary links last 4 hours; stop handing one out 10 minutes before that
+TEMP_LINK_TTL_SECONDS = 4 * 3600 - 600
+# Remember missing files (e.g. photos without thumbnails) for a while instead of asking every load
+MISSING_LINK_TTL_SECONDS = 600
+
+
+def photo_id(file_name):
+    """The submission_id/obs_id a photo file name starts with, or None."""
+    head, sep, _ = file_name.partition("_")
+    return head if sep and head else None
+
+
+class PhotoCatalog:
+    """Incrementally maintained index of the photos folder: id -> file name."""
+
+    def __init__(self, storage, folder=PHOTOS_FOLDER, state_file=PHOTO_CATALOG_FILE, ttl=OBSERVATION_TTL_SECONDS):
+        self._storage = storage
+        self._folder = folder
+        self._state_file = state_file
+        self._ttl = ttl
+        self._lock = threading.Lock()
+        self._names = {}  # path_lower -> file name
+        self._by_id = {}  # id -> file name
+        self._cursor = None
+        self._checked_at = None
+        self._links = {}  # path_lower -> (link or None, expires_at)
+        self.version = 0  # bumped whenever the index changes
+        self._load_state()
+
+    def _load_state(self):
+        try:
+            with open(self._state_file) as f:
+                state = json.load(f)
+            if state.get("folder") == self._folder:
+                self._cursor = state.get("cursor")
+                self._names = dict(state.get("names", {}))
+        except Exception:
+            pass
+        self._rebuild_index()
+
+    def _save_state(self):
+        state = {"folder": self._folder, "cursor": self._cursor, "names": self._names}
+        try:
+            _write_atomic(self._state_file, json.dumps(state).encode("utf-8"))
+        except Exception:
+            pass
+
+    def _rebuild_index(self):
+        self._by_id = {}
+        for name in sorted(self._names.values()):
+            key = photo_id(name)
+            if key is not None:
+                self._by_id.setdefault(key, name)
+
+    def refresh(self, force=False):
+        """Apply folder changes since the stored cursor (at most once per TTL unless `force`)."""
+        if self._storage is None:
+            return
+        with self._lock:
+            now = time.monotonic()
+            if not force and self._checked_at is not None and now - self._checked_at < self._ttl:
+                return
+            self._checked_at = now
+            try:
+                entries, cursor = list_folder_changes(self._storage, self._folder, self._cursor)
+            except Exception:
+                # No photos folder yet, or Dropbox unreachable: keep serving what we have
+                return
+            changed = False
+            for e in entries:
+                path = e.path_lower
+                if isinstance(e, DeletedInfo):
+                    changed |= self._names.pop(path, None) is not None
+                elif not isinstance(e, FolderInfo) and self._names.get(path) != e.name:
+                    self._names[path] = e.name
+                    changed = True
+            if changed:
+                self._rebuild_index()
+                self.version += 1
+            if changed or cursor != self._cursor:
+                self._cursor = cursor
+                self._save_state()
+
+    def ids(self):
+        """Every submission_id/obs_id that has a photo."""
+        return set(self._by_id)
+
+    def find(self, *ids):
+        """File name of the photo for the first of `ids` that has one, or None."""
+        for key in ids:
+            if isinstance(key, str) and key in self._by_id:
+                return self._by_id[key]
+        return None
+
+    def temporary_link(self, path):
+        """Cached direct link to the stored file at `path`, or None if it does not exist."""
+        key = path.lower()
+        cached = self._links.get(key)
+        now = time.time()
+        if cached is not None and cached[1] > now:
+            return cached[0]
+        link = None
+        try:
+            link = self._storage.temporary_link(path)
+        except Exception:
+            pass
+        self._links[key] = (link, now + (TEMP_LINK_TTL_SECONDS if link else MISSING_LINK_TTL_SECONDS))
+        return link
+
+    def resolve_photo_links(self, df):
+        """Fill in `photo_link` for the rows of `df` (only the rows about to be displayed).
+
+        Dropbox share links are made raw; rows without a link get a temporary link to the photo
+        stored under their submission_id/obs_id. Adds a `photo_name` column (None if not found).
+        """
+        df = df.copy()
+        if "photo_link" not in df.columns:
+            df["photo_link"] = None
+        names, links = [], []
+        for row in df.itertuples(index=False):
+            name = self.find(getattr(row, "submission_id", None), getattr(row, "obs_id", None))
+            link = getattr(row, "photo_link", None)
+            if not isinstance(link, str) or not link:
+                link = self.temporary_link(f"{self._folder}/{name}") if name and self._storage is not None else None
+            else:
+                link = raw_link(link)
+            names.append(name)
+            links.append(link)
+        df["photo_name"] = names
+        df["photo_link"] = links
+        return df
+
+
+# ---- Gallery index ----
+# One row per submission with a photo, newest first, so a gallery page is a slice of it.
+
+GALLERY_COLUMNS = ["submission_match_id", "submission_id", "obs_id", "photo_link", "observer",
+                   "hotel_code", "nest_hole", "obs_date", "submission_time"]
+
+
+def build_gallery_index(df, photo_ids=()):
+    """Return (index, species): `index` has one row per submission that has a photo link or a
+    catalogued photo (its latest row), sorted by submission_time descending; `species` holds the
+    distinct (submission_match_id, scientific_name) pairs for filtering by species.
+    """
+    if df.empty or "submission_id" not in df.columns:
+        return pd.DataFrame(columns=GALLERY_COLUMNS), pd.DataFrame(columns=["submission_match_id", "scientific_name"])
+    obs_ids = df["obs_id"] if "obs_id" in df.columns else pd.Series(None, index=df.index, dtype=object)
+    match_id = df["submission_id"].fillna(obs_ids)
+    photo_ids = list(photo_ids)
+    has_photo = df["submission_id"].isin(photo_ids) | obs_ids.isin(photo_ids)
+    if "photo_link" in df.columns:
+        has_photo |= df["photo_link"].notna()
+    rows = df[has_photo].assign(submission_match_id=match_id[has_photo])
+    rows = rows.sort_values("submission_time", ascending=False, kind="stable")
+    index = rows.drop_duplicates("submission_match_id", keep="first").reindex(columns=GALLERY_COLUMNS).reset_index(drop=True)
+    species = pd.DataFrame(columns=["submission_match_id", "scientific_name"])
+    if "scientific_name" in df.columns:
+        species = (
+            pd.DataFrame({"submission_match_id": match_id, "scientific_name": df["scientific_name"].astype(object)})
+            .dropna()
+            .drop_duplicates()
+        )
+        species = species[species["submission_match_id"].isin(index["submission_match_id"])]
+    return index, species
+
+
+def filter_gallery(index, species, hotels=None, observers=None, species_names=None, date_range=None):
+    """Rows of the gallery index matching every given filter (order is kept)."""
+    mask = pd.Series(True, index=index.index)
+    if hotels:
+        mask &= index["hotel_code"].isin(hotels)
+    if observers:
+        mask &= index["observer"].isin(observers)
+    if species_names:
+        matching = species.loc[species["scientific_name"].isin(species_names), "submission_match_id"]
+        mask &= index["submission_match_id"].isin(matching)
+    if date_range:
+        start, end = date_range
+        dates = pd.to_datetime(index["obs_date"], errors="coerce")
+        mask &= dates.between(pd.Timestamp(start), pd.Timestamp(end))
+    return index[mask]
+
+
+_GALLERY = {"key": None, "value": None}
+_GALLERY_LOCK = threading.Lock()
+
+
+def get_gallery_index(df, revision, catalog=None):
+    """`build_gallery_index` cached per (observations revision, catalog version)."""
+    key = (revision, catalog.version if catalog is not None else None)
+    with _GALLERY_LOCK:
+        if revision is not None and _GALLERY["key"] == key:
+            return _GALLERY["value"]
+    value = build_gallery_index(df, catalog.ids() if catalog is not None else ())
+    with _GALLERY_LOCK:
+        _GALLERY["key"], _GALLERY["value"] = key, value
+    return value
+
+
+_CATALOG = None
+_CATALOG_LOCK = threading.Lock()
+
+
+def get_photo_catalog():
+    """Return the shared, freshly refreshed PhotoCatalog (None when no storage is configured)."""
+    global _CATALOG
+    storage = get_storage()
+    if storage is None:
+        return None
+    with _CATALOG_LOCK:
+        if _CATALOG is None or _CATALOG._storage is not storage:
+            # first use, or the backend was rebuilt after a config change
+            _CATALOG = PhotoCatalog(storage)
+    _CATALOG.refresh()
+    return _CATALOG
@@ -0,0 +1,149 @@
+"""Observer → hotel → hole reference data (data/observer_hotel_holes.csv or its remote copy).
+
+The long-form CSV (observer, hotel, hole, holeSize, shape; column names matched loosely) is parsed
+with a few vectorized groupbys into a `ReferenceData`, once per revision of its source: the file's
+mtime and size, or the content hash of the cached copy of the URL. Every lookup afterwards is a
+dict access: the portal uses them for its selectors, the hole details in its grid and the check
+that a submission's observer, hotel and holes belong together.
+"""
+import hashlib
+import os
+import threading
+from collections import namedtuple
+from io import BytesIO
+
+import pandas as pd
+
+from utils.remote_files import fetch_remote
+
+
+OBSERVER_HOTEL_HOLES_CSV = os.path.join("data", "observer_hotel_holes.csv")
+
+# size: hole diameter in mm (None if not recorded); shape: e.g. "round", "square" (None if not recorded)
+HoleInfo = namedtuple("HoleInfo", ["hole", "size", "shape"])
+
+
+def _hole_sort_key(hole):
+    # "a" < "b" < ... < "aa": shorter labels first, then alphabetical
+    return (len(hole), hole)
+
+
+def _find_column(columns, exact, contains):
+    """The column named `exact` (any case), else the first whose name contains one of `contains`."""
+    lower = {c.lower(): c for c in columns}
+    if exact in lower:
+        return lower[exact]
+    return next((c for k, c in lower.items() if any(part in k for part in contains)), None)
+
+
+class ReferenceData:
+    """Parsed observer/hotel/hole mapping. Lists are sorted (holes as a, b, ..., aa) and must be
+    treated as read-only."""
+
+    def __init__(self, observer_hotels, hotel_holes, hole_info=None, revision=None):
+        self.observer_hotels = observer_hotels
+        self.hotel_holes = hotel_holes
+        # {hotel: {hole: HoleInfo}}
+        self.hole_info = hole_info or {h: {x: HoleInfo(x, None, None) for x in holes} for h, holes in hotel_holes.items()}
+        self.revision = revision
+
+    @classmethod
+    def from_frame(cls, df, revision=None):
+        """Parse a long-form frame. Raises ValueError if the observer/hotel/hole columns are missing."""
+        obs_col = _find_column(df.columns, "observer", ("observer",))
+        hotel_col = _find_column(df.columns, "hotel", ("hotel",))
+        hole_col = _find_column(df.columns, "hole", ("hole", "nest"))
+        if not (obs_col and hotel_col and hole_col):
+            raise ValueError("missing required columns (observer, hotel, hole)")
+        size_col = _find_column(df.columns, "holesize", ("size", "diameter"))
+        shape_col = _find_column(df.columns, "shape", ("shape",))
+
+        def _text(col):
+            return df[col].astype("string").str.strip().fillna("") if col else pd.Series("", index=df.index, dtype="string")
+
+        rows = pd.DataFrame({
+            "observer": _text(obs_col),
+            "hotel": _text(hotel_col),
+            "hole": _text(hole_col),
+            "size": pd.to_numeric(df[size_col], errors="coerce").round().astype("Int64") if size_col else pd.array([pd.NA] * len(df), dtype="Int64"),
+            "shape": _text(shape_col).str.lower().replace("", pd.NA),
+        })
+        rows = rows[(rows["observer"] != "") & (rows["hotel"] != "")]
+
+        pairs = rows[["observer", "hotel"]].drop_duplicates()
+        observer_hotels = {o: sorted(g.tolist()) for o, g in pairs.groupby("observer", sort=False)["hotel"]}
+
+        # One entry per (hotel, hole): the first row that mentions it
+        holes = rows[rows["hole"] != ""].drop_duplicates(["hotel", "hole"])
+        hotel_holes, hole_info = {}, {}
+        for hotel, g in holes.groupby("hotel", sort=False):
+            info = {
+                hole: HoleInfo(hole, None if pd.isna(size) else int(size), None if pd.isna(shape) else str(shape))
+                for hole, size, shape in zip(g["hole"].tolist(), g["size"].tolist(), g["shape"].tolist())
+            }
+            hotel_holes[hotel] = sorted(info, key=_hole_sort_key)
+            hole_info[hotel] = info
+        for hotel in pairs["hotel"].unique().tolist():
+            hotel_holes.setdefault(hotel, [])
+            hole_info.setdefault(hotel, {})
+        return cls(observer_hotels, hotel_holes, hole_info, revision)
+
+    # ---- lookups ----
+
+    def hotels_for(self, observer):
+        return self.observer_hotels.get(observer, [])
+
+    def holes_for(self, hotel):
+        return self.hotel_holes.get(hotel, [])
+
+    def hole(self, hotel, hole):
+        """HoleInfo of one hole, or None if the hotel has no such hole."""
+        return self.hole_info.get(hotel, {}).get(hole)
+
+    def is_known(self, observer=None, hotel=None, hole=None):
+        """Whether the given combination exists (only the arguments passed are checked)."""
+        if observer is not None and observer not in self.observer_hotels:
+            return False
+        if hotel is not None:
+            if hotel not in self.hole_info:
+                return False
+            if observer is not None and hotel not in self.hotels_for(observer):
+                return False
+            if hole is not None and hole not in self.hole_info[hotel]:
+                return False
+        return True
+
+
+# ---- Loading (cached per source revision) ----
+
+_CACHE = {}  # source -> ReferenceData
+_CACHE_LOCK = threading.Lock()
+
+
+def _parse_cached(source, revision, read):
+    with _CACHE_LOCK:
+        cached = _CACHE.get(source)
+        if cached is not None and cached.revision == revision:
+            return cached
+    ref = ReferenceData.from_frame(read(), revision)
+    with _CACHE_LOCK:
+        _CACHE[source] = ref
+    return ref
+
+
+def load_reference_data(url=None, token=None, path=OBSERVER_HOTEL_HOLES_CSV):
+    """Return the ReferenceData from `url` if given and reachable, else from the local `path`.
+    Parsed only when the source's revision changed. Raises if neither source can be parsed.
+    """
+    # The remote copy comes from the on-disk cache in utils/remote_files.py (revalidated in the
+    # background, and fetched in the background on a cold start); None until it has been fetched
+    content = fetch_remote(url, token)
+    if content is not None:
+        try:
+            revision = hashlib.sha256(content).hexdigest()
+            return _parse_cached(url, revision, lambda: pd.read_csv(BytesIO(content), dtype=str))
+        except Exception:
+            # fall back to the local copy
+            pass
+    stat = os.stat(path)
+    return _parse_cached(path, f"{stat.st_mtime_ns}:{stat.st_size}", lambda: pd.read_csv(path, dtype=str))
@@ -0,0 +1,201 @@
+"""Remote reference files (e.g. the observer and species CSVs on GitHub), cached on disk.
+
+Every URL's last good body is kept under .cache/remote together with its ETag/Last-Modified.
+A cached copy is returned straight away; once it is older than REVALIDATE_SECONDS a background
+thread asks the server whether it changed (If-None-Match / If-Modified-Since), so a 304 costs one
+small request and a slow server never blocks a rerun. A URL with nothing cached yet (e.g. right
+after a restart on a host with an empty .cache) is fetched in the background too; until that
+lands callers use their local data/*.csv copy.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from io import BytesIO
+
+import pandas as pd
+
+from utils.data_utils import CACHE_DIR, _write_atomic
+from utils.lazy import LazyModule
+
+requests = LazyModule("requests")
+
+
+REMOTE_CACHE_DIR = os.path.join(CACHE_DIR, "remote")
+REVALIDATE_SECONDS = 300
+URL_TIMEOUT_SECONDS = 15
+
+
+class RemoteFileCache:
+    """On-disk cache of remote files with conditional revalidation in the background."""
+
+    def __init__(self, cache_dir=REMOTE_CACHE_DIR, max_age=REVALIDATE_SECONDS, timeout=URL_TIMEOUT_SECONDS):
+        self._cache_dir = cache_dir
+        self._max_age = max_age
+        self._timeout = timeout
+        self._lock = threading.Lock()
+        # url -> {"content", "etag", "last_modified", "checked_at"}
+        self._entries = {}
+        self._refreshing = set()
+        # url -> time of the last failed fetch of a URL with nothing cached
+        self._failed_at = {}
+
+    def _paths(self, url):
+        key = hashlib.sha1(url.encode("utf-8")).hexdigest()
+        base = os.path.join(self._cache_dir, key)
+        return base, f"{base}.meta.json"
+
+    def _load(self, url):
+        body_path, meta_path = self._paths(url)
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+            with open(body_path, "rb") as f:
+                content = f.read()
+        except Exception:
+            return None
+        return {
+            "content": content,
+            "etag": meta.get("etag"),
+            "last_modified": meta.get("last_modified"),
+            "checked_at": meta.get("checked_at", 0),
+        }
+
+    def _store(self, url, entry, content_changed):
+        body_path, meta_path = self._paths(url)
+        try:
+            if content_changed:
+                _write_atomic(body_path, entry["content"])
+            meta = {"url": url, "etag": entry["etag"], "last_modified": entry["last_modified"], "checked_at": entry["checked_at"]}
+            _write_atomic(meta_path, json.dumps(meta).encode("utf-8"))
+        except Exception:
+            # the in-memory copy still serves this process
+            pass
+
+    def _fetch(self, url, token, entry):
+        """Fetch `url` (conditionally if `entry` is cached) and return the new entry."""
+        headers = {"Authorization": f"token {token}"} if token else {}
+        if entry is not None:
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+        resp = requests.get(url, headers=headers, timeout=self._timeout)
+        if resp.status_code == 304 and entry is not None:
+            fresh = dict(entry, checked_at=time.time())
+            changed = False
+        else:
+            resp.raise_for_status()
+            fresh = {
+                "content": resp.content,
+                "etag": resp.headers.get("ETag"),
+                "last_modified": resp.headers.get("Last-Modified"),
+                "checked_at": time.time(),
+            }
+            changed = entry is None or resp.content != entry["content"]
+        with self._lock:
+            self._entries[url] = fresh
+            self._failed_at.pop(url, None)
+        self._store(url, fresh, changed)
+        return fresh
+
+    def _revalidate(self, url, token):
+        try:
+            with self._lock:
+                entry = self._entries.get(url)
+            self._fetch(url, token, entry)
+        except Exception:
+            # keep serving the cached copy; try again after another max_age
+            with self._lock:
+                if url in self._entries:
+                    self._entries[url] = dict(self._entries[url], checked_at=time.time())
+                else:
+                    self._failed_at[url] = time.time()
+        finally:
+            with self._lock:
+                self._refreshing.discard(url)
+
+    def _revalidate_async(self, url, token):
+        with self._lock:
+            if url in self._refreshing:
+                return
+            self._refreshing.add(url)
+        threading.Thread(target=self._revalidate, args=(url, token), daemon=True).start()
+
+    def get(self, url, token=None):
+        """Return the cached content of `url` (bytes), or None if nothing has been fetched yet."""
+        with self._lock:
+            entry = self._entries.get(url)
+        if entry is None:
+            entry = self._load(url)
+            if entry is not None:
+                with self._lock:
+                    entry = self._entries.setdefault(url, entry)
+        if entry is not None:
+            if time.time() - entry["checked_at"] >= self._max_age:
+                self._revalidate_async(url, token)
+            return entry["content"]
+
+        # Nothing cached: fetch in the background (unless that just failed) and let the caller
+        # fall back to its local copy meanwhile
+        with self._lock:
+            failed_at = self._failed_at.get(url)
+        if failed_at is None or time.time() - failed_at >= self._max_age:
+            self._revalidate_async(url, token)
+        return None
+
+
+_CACHE = None
+_CACHE_LOCK = threading.Lock()
+
+
+def get_remote_cache():
+    """Return the shared RemoteFileCache."""
+    global _CACHE
+    with _CACHE_LOCK:
+        if _CACHE is None:
+            _CACHE = RemoteFileCache()
+        return _CACHE
+
+
+def fetch_remote(url, token=None):
+    """Content of `url` from the shared cache (see RemoteFileCache.get)."""
+    if not url:
+        return None
+    return get_remote_cache().get(url, token)
+
+
+# source -> (revision, DataFrame)
+_FRAMES = {}
+_FRAMES_LOCK = threading.Lock()
+
+
+def _parsed(source, revision, read):
+    with _FRAMES_LOCK:
+        cached = _FRAMES.get(source)
+        if cached is not None and cached[0] == revision:
+            return cached[1]
+    df = read()
+    with _FRAMES_LOCK:
+        _FRAMES[source] = (revision, df)
+    return df
+
+
+def read_remote_csv(url=None, token=None, fallback_path=None):
+    """DataFrame of the CSV at `url`, else of the local `fallback_path`, else None.
+
+    Parsed once per content revision; the frame is shared and must be treated as read-only.
+    """
+    content = fetch_remote(url, token)
+    if content is not None:
+        try:
+            revision = hashlib.sha256(content).hexdigest()
+            return _parsed(url, revision, lambda: pd.read_csv(BytesIO(content)))
+        except Exception:
+            # unparseable remote copy: fall back to the local file
+            pass
+    if fallback_path and os.path.exists(fallback_path):
+        stat = os.stat(fallback_path)
+        return _parsed(fallback_path, f"{stat.st_mtime_ns}:{stat.st_size}", lambda: pd.read_csv(fallback_path))
+    return None
@@ -0,0 +1,95 @@
+"""Responsive versions of the images shipped with the app (assets/, pageAssets/).
+
+tools/build_image_variants.py pre-generates WebP and JPEG copies of each image at a few fixed
+widths under static/img/, with the content hash in every file name, and records them in
+static/img/manifest.json. Pages call `responsive_image`, which emits a <picture> pointing at
+those files through Streamlit's static file serving (the browser downloads only the smallest
+variant that covers the displayed size, and a changed image always gets a new URL). Images that
+have not been built are shown with st.image as before.
+"""
+import json
+import os
+import threading
+from html import escape
+
+import streamlit as st
+
+
+STATIC_DIR = "static"
+VARIANTS_SUBDIR = "img"
+VARIANTS_DIR = os.path.join(STATIC_DIR, VARIANTS_SUBDIR)
+MANIFEST_FILE = os.path.join(VARIANTS_DIR, "manifest.json")
+# URL prefix of files under static/ when server.enableStaticServing is on
+STATIC_URL = "app/static"
+
+_MANIFEST = {"mtime": None, "entries": {}}
+_MANIFEST_LOCK = threading.Lock()
+
+
+def _manifest():
+    """The variant manifest, re-read only when the file changes."""
+    try:
+        mtime = os.path.getmtime(MANIFEST_FILE)
+    except OSError:
+        return {}
+    with _MANIFEST_LOCK:
+        if _MANIFEST["mtime"] != mtime:
+            try:
+                with open(MANIFEST_FILE, encoding="utf-8") as f:
+                    _MANIFEST["entries"] = json.load(f).get("images", {})
+            except Exception:
+                _MANIFEST["entries"] = {}
+            _MANIFEST["mtime"] = mtime
+        return _MANIFEST["entries"]
+
+
+def image_variants(source_path):
+    """Manifest entry for an image ({"width", "height", "variants": [{"width", "webp", "jpeg"}]}),
+    or None if no variants were built for it.
+    """
+    return _manifest().get(os.path.normpath(source_path).replace(os.sep, "/"))
+
+
+def variant_url(file_name):
+    return f"{STATIC_URL}/{VARIANTS_SUBDIR}/{file_name}"
+
+
+def pick_variant(entry, display_width, density=2):
+    """Smallest variant at least `display_width * density` px wide (else the largest one)."""
+    variants = sorted(entry["variants"], key=lambda v: v["width"])
+    needed = display_width * density
+    return next((v for v in variants if v["width"] >= needed), variants[-1])
+
+
+def responsive_image(source_path, caption=None, width=None):
+    """Show an image from assets/ or pageAssets/ at `width` px (default: its natural width, up to
+    the largest variant, shrunk to fit the column), served as pre-built WebP/JPEG variants when
+    available.
+    """
+    entry = image_variants(source_path)
+    if not entry or not entry.get("variants"):
+        if width:
+            st.image(source_path, caption=caption, width=width)
+        else:
+            st.image(source_path, caption=caption)
+        return
+
+    variants = sorted(entry["variants"], key=lambda v: v["width"])
+    display_width = width or min(entry["width"], variants[-1]["width"])
+    sizes = f"{display_width}px" if width else f"(max-width: {display_width}px) 100vw, {display_width}px"
+    webp_srcset = ", ".join(f"{variant_url(v['webp'])} {v['width']}w" for v in variants)
+    jpeg_srcset = ", ".join(f"{variant_url(v['jpeg'])} {v['width']}w" for v in variants)
+    fallback = pick_variant(entry, display_width, density=1)
+    height = round(entry["height"] * display_width / entry["width"])
+    alt = escape(caption or os.path.basename(source_path))
+    st.markdown(
+        f"<picture>"
+        f"<source type='image/webp' srcset='{escape(webp_srcset)}' sizes='{sizes}'>"
+        f"<img src='{escape(variant_url(fallback['jpeg']))}' srcset='{escape(jpeg_srcset)}' sizes='{sizes}' "
+        f"width='{display_width}' height='{height}' alt='{alt}' loading='lazy' "
+        f"style='max-width:100%;height:auto'>"
+        f"</picture>",
+        unsafe_allow_html=True,
+    )
+    if caption:
+        st.caption(caption)
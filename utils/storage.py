@@ -0,0 +1,571 @@
+"""Where the app's remote files live.
+
+Every read and write of the shared files (observations master, segments, photos, manifests, ...)
+goes through a StorageBackend, so the data code does not care where the files are:
+
+- DropboxBackend: the shared Dropbox app folder (production)
+- LocalBackend: a directory on this machine (development and offline use)
+- MemoryBackend: a dict in this process, with injectable latency, failures, rate limiting and
+  small listing pages, for benchmarks and load tests of the sync code
+
+Paths are Dropbox-style ("/observations/observations.csv"); every file has a `rev` that changes
+on each write and a Dropbox-compatible `content_hash`, which is what the mirror and the
+conditional (rev-checked) writes rely on. `get_storage()` returns the process-wide backend
+chosen by the STORAGE_BACKEND setting ("dropbox" by default), or None when nothing is configured.
+"""
+import hashlib
+import itertools
+import os
+import random
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.config import get_config
+from utils.lazy import LazyModule
+
+dropbox = LazyModule("dropbox")
+# Transport errors of the Dropbox SDK (which is built on requests)
+requests = LazyModule("requests")
+
+
+DROPBOX_HASH_BLOCK_SIZE = 4 * 1024 * 1024
+LIST_PAGE_SIZE = 2000  # entries per listing page, like Dropbox's default limit
+LOCAL_STORAGE_DIR = "storage"
+UPLOAD_CONCURRENCY = 8
+
+# Listing entries and results
+FileInfo = namedtuple("FileInfo", "name path_lower rev content_hash size")
+FolderInfo = namedtuple("FolderInfo", "name path_lower")
+DeletedInfo = namedtuple("DeletedInfo", "name path_lower")
+ListResult = namedtuple("ListResult", "entries cursor has_more")
+
+
+class StorageError(Exception):
+    """A storage call failed."""
+
+
+class NotFound(StorageError):
+    """The file or folder does not exist."""
+
+
+class Conflict(StorageError):
+    """A conditional write lost: the file changed (or already existed) since it was read."""
+
+
+class CursorExpired(StorageError):
+    """A listing cursor can no longer be continued; list the folder again."""
+
+
+class RateLimited(StorageError):
+    """Too many calls; try again after `retry_after` seconds."""
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def dropbox_content_hash(data):
+    """Compute Dropbox's `content_hash` for `data`: the SHA-256 of the concatenated
+    SHA-256 digests of each 4 MB block.
+    """
+    block_digests = b"".join(
+        hashlib.sha256(data[i:i + DROPBOX_HASH_BLOCK_SIZE]).digest()
+        for i in range(0, len(data), DROPBOX_HASH_BLOCK_SIZE)
+    )
+    return hashlib.sha256(block_digests).hexdigest()
+
+
+def _name(path):
+    return path.rstrip("/").rsplit("/", 1)[-1]
+
+
+def _folder_key(path):
+    return "/" + path.strip("/").lower() if path.strip("/") else ""
+
+
+class StorageBackend:
+    """Interface of a file store. Methods raise NotFound, Conflict, CursorExpired or RateLimited
+    where those apply and StorageError for anything else.
+    """
+
+    def get_metadata(self, path):
+        """FileInfo of the file at `path`."""
+        raise NotImplementedError
+
+    def download(self, path):
+        """(FileInfo, bytes) of the file at `path`."""
+        raise NotImplementedError
+
+    def upload(self, path, data, rev=None, add=False):
+        """Write `data` to `path` and return its FileInfo. With `rev` the write only succeeds while
+        the file is still at that rev; with `add` only if the file does not exist yet.
+        """
+        raise NotImplementedError
+
+    def upload_many(self, files):
+        """Overwrite several (path, bytes) pairs; returns {path: FileInfo}."""
+        return {path: self.upload(path, data) for path, data in files}
+
+    def list_folder(self, path):
+        """First page of the files and folders directly in `path` (ListResult)."""
+        raise NotImplementedError
+
+    def list_folder_continue(self, cursor):
+        """Next page of a listing, or (once a listing is complete) what changed since: new or
+        modified files and DeletedInfo entries for removed ones.
+        """
+        raise NotImplementedError
+
+    def temporary_link(self, path):
+        """Short-lived direct download URL of the file at `path`."""
+        raise NotImplementedError
+
+    def shared_link(self, path):
+        """Permanent URL of the file at `path`."""
+        raise NotImplementedError
+
+
+# ---- Dropbox ----
+
+def _translate(e):
+    """StorageError for a Dropbox SDK exception or a network error (connection, timeout, ...)."""
+    if isinstance(e, dropbox.exceptions.RateLimitError):
+        return RateLimited(str(e), retry_after=getattr(e, "backoff", None))
+    if isinstance(e, dropbox.exceptions.ApiError):
+        error = repr(getattr(e, "error", ""))
+        if "not_found" in error:
+            return NotFound(error)
+        if "conflict" in error:
+            return Conflict(error)
+        if "'reset'" in error:
+            return CursorExpired(error)
+        return StorageError(error)
+    return StorageError(f"{type(e).__name__}: {e}")
+
+
+class DropboxBackend(StorageBackend):
+    def __init__(self, client):
+        self.client = client
+
+    def _call(self, method, *args, **kwargs):
+        try:
+            return getattr(self.client, method)(*args, **kwargs)
+        except (dropbox.exceptions.DropboxException, requests.exceptions.RequestException) as e:
+            raise _translate(e) from e
+
+    @staticmethod
+    def _info(md):
+        if isinstance(md, dropbox.files.DeletedMetadata):
+            return DeletedInfo(md.name, md.path_lower)
+        if isinstance(md, dropbox.files.FolderMetadata):
+            return FolderInfo(md.name, md.path_lower)
+        return FileInfo(md.name, md.path_lower, md.rev, md.content_hash, md.size)
+
+    def get_metadata(self, path):
+        return self._info(self._call("files_get_metadata", path))
+
+    def download(self, path):
+        md, res = self._call("files_download", path)
+        try:
+            # the body is streamed, so reading it can fail too
+            return self._info(md), res.content
+        except requests.exceptions.RequestException as e:
+            raise _translate(e) from e
+
+    def upload(self, path, data, rev=None, add=False):
+        if rev:
+            mode = dropbox.files.WriteMode.update(rev)
+        elif add:
+            mode = dropbox.files.WriteMode.add
+        else:
+            mode = dropbox.files.WriteMode.overwrite
+        return self._info(self._call("files_upload", data, path, mode=mode))
+
+    def upload_many(self, files):
+        """Each file's bytes go up in its own upload session (the sessions are started in parallel)
+        and all files are committed with a single finish_batch call, so the number of sequential
+        round trips stays flat however many files there are. A single file is sent with a plain
+        upload, which is cheaper.
+        """
+        if len(files) <= 1:
+            return super().upload_many(files)
+
+        def _start(data):
+            return self._call("files_upload_session_start", data, close=True).session_id
+
+        with ThreadPoolExecutor(max_workers=min(UPLOAD_CONCURRENCY, len(files))) as pool:
+            session_ids = list(pool.map(_start, [data for _, data in files]))
+
+        entries = [
+            dropbox.files.UploadSessionFinishArg(
+                cursor=dropbox.files.UploadSessionCursor(session_id=session_id, offset=len(data)),
+                commit=dropbox.files.CommitInfo(path=path, mode=dropbox.files.WriteMode.overwrite),
+            )
+            for (path, data), session_id in zip(files, session_ids)
+        ]
+        result = self._call("files_upload_session_finish_batch_v2", entries)
+        uploaded = {}
+        for (path, _), entry in zip(files, result.entries):
+            if not entry.is_success():
+                raise StorageError(f"Upload of {path} failed: {entry.get_failure()}")
+            uploaded[path] = self._info(entry.get_success())
+        return uploaded
+
+    def _listing(self, res):
+        return ListResult([self._info(e) for e in res.entries], res.cursor, res.has_more)
+
+    def list_folder(self, path):
+        return self._listing(self._call("files_list_folder", path))
+
+    def list_folder_continue(self, cursor):
+        return self._listing(self._call("files_list_folder_continue", cursor))
+
+    def temporary_link(self, path):
+        return self._call("files_get_temporary_link", path).link
+
+    def shared_link(self, path):
+        try:
+            return self._call("sharing_create_shared_link_with_settings", path).url
+        except StorageError as e:
+            if "shared_link_already_exists" not in str(e):
+                raise
+            links = self._call("sharing_list_shared_links", path=path, direct_only=True).links
+            if not links:
+                raise
+            return links[0].url
+
+
+# ---- Snapshot-based listings (local and in-memory backends) ----
+
+class _SnapshotListing:
+    """Pagination and change cursors for backends that can only list a folder's current state.
+    Each complete listing keeps a snapshot {path_lower: entry}; continuing its cursor diffs the
+    folder against it. Only the most recent MAX_SNAPSHOTS are kept, older cursors expire.
+    """
+
+    MAX_SNAPSHOTS = 64
+
+    def __init__(self, page_size=LIST_PAGE_SIZE):
+        self.page_size = page_size
+        self._snapshots = OrderedDict()  # id -> (folder, {path_lower: entry})
+        self._pages = OrderedDict()      # id -> (folder, entries, snapshot)
+        self._lock = threading.Lock()
+
+    def _remember(self, store, key, value):
+        with self._lock:
+            store[key] = value
+            while len(store) > self.MAX_SNAPSHOTS:
+                store.popitem(last=False)
+
+    def page(self, folder, entries, snapshot, offset=0, pages_id=None):
+        end = offset + self.page_size
+        if end < len(entries):
+            if pages_id is None:
+                pages_id = uuid.uuid4().hex
+                self._remember(self._pages, pages_id, (folder, entries, snapshot))
+            return ListResult(entries[offset:end], f"page:{pages_id}:{end}", True)
+        snapshot_id = uuid.uuid4().hex
+        self._remember(self._snapshots, snapshot_id, (folder, snapshot))
+        return ListResult(entries[offset:], f"delta:{snapshot_id}", False)
+
+    def start(self, folder, current):
+        return self.page(folder, [current[k] for k in sorted(current)], current)
+
+    def resume(self, cursor, list_current):
+        kind, _, rest = cursor.partition(":")
+        with self._lock:
+            if kind == "page":
+                pages_id, _, offset = rest.partition(":")
+                found = self._pages.get(pages_id)
+            else:
+                found = self._snapshots.get(rest)
+        if found is None:
+            raise CursorExpired(cursor)
+        if kind == "page":
+            folder, entries, snapshot = found
+            return self.page(folder, entries, snapshot, int(offset), pages_id)
+        folder, before = found
+        current = list_current(folder)
+        changed = [current[k] for k in sorted(current) if before.get(k) != current[k]]
+        deleted = [DeletedInfo(before[k].name, k) for k in sorted(before) if k not in current]
+        return self.page(folder, changed + deleted, current)
+
+
+# ---- Local directory ----
+
+class LocalBackend(StorageBackend):
+    """Files under a local directory; "/a/b.csv" is `root`/a/b.csv. Unlike Dropbox, paths are as
+    case-sensitive as the local file system. Revs come from the file's modification time and size,
+    so they also change when the file is edited by hand.
+    """
+
+    def __init__(self, root=LOCAL_STORAGE_DIR, page_size=LIST_PAGE_SIZE):
+        self.root = os.path.abspath(root)
+        self._listing = _SnapshotListing(page_size)
+        self._lock = threading.Lock()
+        self._hashes = {}  # local path -> (rev, content_hash)
+
+    def _local(self, path):
+        parts = [p for p in path.strip("/").split("/") if p]
+        if any(p in (".", "..") for p in parts):
+            raise StorageError(f"Invalid path {path!r}")
+        return os.path.join(self.root, *parts)
+
+    def _info(self, path, local):
+        try:
+            st_ = os.stat(local)
+        except FileNotFoundError:
+            raise NotFound(path) from None
+        if os.path.isdir(local):
+            return FolderInfo(_name(path), path.lower())
+        rev = f"{st_.st_mtime_ns:x}{st_.st_size:08x}"
+        cached = self._hashes.get(local)
+        if cached is None or cached[0] != rev:
+            with open(local, "rb") as f:
+                cached = (rev, dropbox_content_hash(f.read()))
+            self._hashes[local] = cached
+        return FileInfo(_name(path), path.lower(), rev, cached[1], st_.st_size)
+
+    def get_metadata(self, path):
+        return self._info(path, self._local(path))
+
+    def download(self, path):
+        local = self._local(path)
+        info = self._info(path, local)
+        if isinstance(info, FolderInfo):
+            raise StorageError(f"{path} is a folder")
+        with open(local, "rb") as f:
+            return info, f.read()
+
+    def upload(self, path, data, rev=None, add=False):
+        local = self._local(path)
+        with self._lock:
+            previous = self._info(path, local).rev if os.path.isfile(local) else None
+            if add and previous is not None:
+                raise Conflict(path)
+            if rev and previous != rev:
+                raise Conflict(path)
+            os.makedirs(os.path.dirname(local), exist_ok=True)
+            tmp = f"{local}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, local)
+            info = self._info(path, local)
+            if info.rev == previous:
+                # same size within the clock's resolution: bump the mtime so the rev still changes
+                os.utime(local, ns=(time.time_ns(), os.stat(local).st_mtime_ns + 1))
+                info = self._info(path, local)
+            return info
+
+    def _current(self, folder):
+        local = self._local(folder)
+        if not os.path.isdir(local):
+            raise NotFound(folder)
+        current = {}
+        for entry in os.scandir(local):
+            if entry.name.endswith(".tmp"):
+                continue
+            path = f"{folder.rstrip('/')}/{entry.name}"
+            current[path.lower()] = self._info(path, entry.path)
+        return current
+
+    def list_folder(self, path):
+        folder = _folder_key(path)
+        return self._listing.start(folder, self._current(folder))
+
+    def list_folder_continue(self, cursor):
+        return self._listing.resume(cursor, self._current)
+
+    def temporary_link(self, path):
+        return self.shared_link(path)
+
+    def shared_link(self, path):
+        local = self._local(path)
+        if not os.path.isfile(local):
+            raise NotFound(path)
+        return f"file://{local}"
+
+
+# ---- In memory ----
+
+class MemoryBackend(StorageBackend):
+    """Files in a dict, for benchmarks and load tests. Every call first waits `latency` seconds
+    (a number, or a (low, high) range drawn uniformly), then fails with RateLimited once more than
+    `max_calls_per_second` calls were made in the last second, then fails with StorageError with
+    probability `failure_rate`. `page_size` sets the listing page size. Calls are counted per
+    method in `calls`.
+    """
+
+    def __init__(self, latency=0.0, failure_rate=0.0, max_calls_per_second=None, page_size=LIST_PAGE_SIZE, seed=None):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.max_calls_per_second = max_calls_per_second
+        self.files = {}  # path_lower -> (name, data, rev, content_hash)
+        self.calls = Counter()
+        self._random = random.Random(seed)
+        self._revs = itertools.count(1)
+        self._recent = []  # monotonic times of the calls in the last second
+        self._listing = _SnapshotListing(page_size)
+        self._lock = threading.Lock()
+
+    def _call(self, method):
+        with self._lock:
+            self.calls[method] += 1
+            latency = self.latency
+            if isinstance(latency, (tuple, list)):
+                latency = self._random.uniform(*latency)
+            fail = self.failure_rate and self._random.random() < self.failure_rate
+        if latency:
+            time.sleep(latency)
+        if self.max_calls_per_second:
+            with self._lock:
+                now = time.monotonic()
+                self._recent = [t for t in self._recent if now - t < 1.0]
+                if len(self._recent) >= self.max_calls_per_second:
+                    raise RateLimited(f"{method}: too many requests", retry_after=1.0 - (now - self._recent[0]))
+                self._recent.append(now)
+        if fail:
+            raise StorageError(f"{method}: injected failure")
+
+    def _info(self, key):
+        name, data, rev, content_hash = self.files[key]
+        return FileInfo(name, key, rev, content_hash, len(data))
+
+    def get_metadata(self, path):
+        self._call("get_metadata")
+        with self._lock:
+            if path.lower() not in self.files:
+                raise NotFound(path)
+            return self._info(path.lower())
+
+    def download(self, path):
+        self._call("download")
+        with self._lock:
+            if path.lower() not in self.files:
+                raise NotFound(path)
+            return self._info(path.lower()), self.files[path.lower()][1]
+
+    def upload(self, path, data, rev=None, add=False):
+        self._call("upload")
+        key = path.lower()
+        with self._lock:
+            current = self.files.get(key)
+            if (add and current is not None) or (rev and (current is None or current[2] != rev)):
+                raise Conflict(path)
+            self.files[key] = (_name(path), bytes(data), f"{next(self._revs):09x}", dropbox_content_hash(data))
+            return self._info(key)
+
+    def upload_many(self, files):
+        self._call("upload_many")
+        uploaded = {}
+        with self._lock:
+            for path, data in files:
+                key = path.lower()
+                self.files[key] = (_name(path), bytes(data), f"{next(self._revs):09x}", dropbox_content_hash(data))
+                uploaded[path] = self._info(key)
+        return uploaded
+
+    def _current(self, folder):
+        prefix = folder + "/"
+        current = {}
+        with self._lock:
+            for key in self.files:
+                if not key.startswith(prefix):
+                    continue
+                rest = key[len(prefix):]
+                if "/" in rest:
+                    sub = prefix + rest.split("/", 1)[0]
+                    current[sub] = FolderInfo(_name(sub), sub)
+                else:
+                    current[key] = self._info(key)
+        if not current:
+            raise NotFound(folder)
+        return current
+
+    def list_folder(self, path):
+        self._call("list_folder")
+        folder = _folder_key(path)
+        return self._listing.start(folder, self._current(folder))
+
+    def list_folder_continue(self, cursor):
+        self._call("list_folder_continue")
+        return self._listing.resume(cursor, self._current)
+
+    def temporary_link(self, path):
+        self._call("temporary_link")
+        with self._lock:
+            if path.lower() not in self.files:
+                raise NotFound(path)
+        return f"https://storage.invalid/tmp{path.lower()}"
+
+    def shared_link(self, path):
+        self._call("shared_link")
+        with self._lock:
+            if path.lower() not in self.files:
+                raise NotFound(path)
+        return f"https://storage.invalid/s{path.lower()}?dl=0"
+
+
+# ---- Process-wide backend ----
+
+def init_dropbox(config=None):
+    """A Dropbox client from the DROPBOX_APP_KEY / _APP_SECRET / _REFRESH_TOKEN settings, or None."""
+    config = config or get_config()
+    try:
+        if config.dropbox_app_key and config.dropbox_app_secret and config.dropbox_refresh_token:
+            return dropbox.Dropbox(
+                app_key=config.dropbox_app_key,
+                app_secret=config.dropbox_app_secret,
+                oauth2_refresh_token=config.dropbox_refresh_token,
+            )
+    except Exception:
+        pass
+    return None
+
+
+def init_storage(config=None):
+    """The backend named by the STORAGE_BACKEND setting ("dropbox", "local" or "memory"), or None
+    if it cannot be set up (e.g. no Dropbox credentials). The local backend's directory is the
+    STORAGE_DIR setting.
+    """
+    config = config or get_config()
+    if config.storage_backend == "local":
+        return LocalBackend(config.storage_dir or LOCAL_STORAGE_DIR)
+    if config.storage_backend == "memory":
+        return MemoryBackend()
+    client = init_dropbox(config)
+    return DropboxBackend(client) if client is not None else None
+
+
+_STORAGE = None
+_STORAGE_SETTINGS = None
+_STORAGE_LOCK = threading.Lock()
+
+
+def _storage_settings(config):
+    return (
+        config.storage_backend,
+        config.storage_dir,
+        config.dropbox_app_key,
+        config.dropbox_app_secret,
+        config.dropbox_refresh_token,
+    )
+
+
+def get_storage():
+    """Return the process-wide storage backend (or None if none is configured). The Dropbox client
+    refreshes its own access token, so one instance is shared by every session. When a reloaded
+    config changes the storage settings (STORAGE_BACKEND, STORAGE_DIR or the Dropbox credentials),
+    the backend is built again, so the change takes effect on the next call.
+    """
+    global _STORAGE, _STORAGE_SETTINGS
+    config = get_config()
+    settings = _storage_settings(config)
+    with _STORAGE_LOCK:
+        if settings != _STORAGE_SETTINGS:
+            _STORAGE = init_storage(config)
+            _STORAGE_SETTINGS = settings
+        return _STORAGE